@@ -0,0 +1,177 @@
+import json
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import quote
+
+from app.core.config import settings
+from app.core.hotlinks import hot_links
+from app.core.rate_limit import check_rate_limit
+from app.core.redirects import PERMANENT_TYPES, SHORT_CODE_PATTERN, Redirect, cache_control, is_reserved_code
+from app.core.tenants import host_table
+from app.crud import link as link_crud
+from app.db.base import async_session
+from app.db import link_cache
+from app.db.edge_store import edge_store
+from app.workers.clicks import click_buffer
+from app.workers.edge_sync import edge_sync
+
+logger = logging.getLogger(__name__)
+
+# Короткий код (SHORT_CODE_PATTERN). Все остальное (включая кастомные алиасы
+# с другими символами) обрабатывает обычный роутер FastAPI
+_match_short_code_path = re.compile(f"/({SHORT_CODE_PATTERN})").fullmatch
+
+_NOT_FOUND_BODY = json.dumps(
+    {"detail": "Ссылка не найдена или срок ее действия истек"}, ensure_ascii=False
+).encode("utf-8")
+
+_NOT_FOUND_START = {
+    "type": "http.response.start",
+    "status": 404,
+    "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(_NOT_FOUND_BODY)).encode("latin-1")),
+    ],
+}
+_NOT_FOUND_BODY_MESSAGE = {"type": "http.response.body", "body": _NOT_FOUND_BODY}
+_TOO_MANY_BODY = json.dumps(
+    {"detail": "Слишком много запросов, попробуйте позже"}, ensure_ascii=False
+).encode("utf-8")
+_TOO_MANY_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(_TOO_MANY_BODY)).encode("latin-1")),
+]
+_EMPTY_BODY_MESSAGE = {"type": "http.response.body", "body": b""}
+_REDIRECT_HEADERS = [(b"content-length", b"0")]
+_NO_STORE_HEADER = (b"cache-control", b"no-store")
+
+
+@lru_cache(maxsize=4096)
+def _location_header(url: str) -> tuple:
+    # То же экранирование, что и в starlette.responses.RedirectResponse
+    return (b"location", quote(url, safe=":/%#?=@[]!$&'()*+,;").encode("latin-1"))
+
+
+def _cache_control_header(redirect: Redirect) -> tuple:
+    if redirect.status not in PERMANENT_TYPES:
+        return _NO_STORE_HEADER
+    return (b"cache-control", cache_control(redirect.status, redirect.expires_at).encode("latin-1"))
+
+
+def target_redirect(target: link_crud.RedirectTarget) -> Redirect:
+    return Redirect(target.original_url, target.redirect_type, link_cache.expires_timestamp(target.expires_at))
+
+
+async def _send_redirect(send, redirect: Redirect) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": redirect.status,
+        "headers": [*_REDIRECT_HEADERS, _location_header(redirect.url), _cache_control_header(redirect)],
+    })
+    await send(_EMPTY_BODY_MESSAGE)
+
+
+class RedirectMiddleware:
+    """
+    Облегченный ASGI-обработчик для `GET /{short_code}`.
+
+    Стоит перед роутером FastAPI и CORS: не использует систему зависимостей,
+    берет соединение с БД только при промахе кэша, а счетчик кликов обновляет
+    уже после отправки ответа. Горячие ссылки отдаются из памяти процесса,
+    а их клики копятся в буфере и сбрасываются в БД пачками.
+    Пространство кодов выбирается по заголовку Host (см. app.core.tenants).
+    Статус и Cache-Control ответа зависят от типа редиректа ссылки (см. app.core.redirects).
+    Запросы, которые не похожи на короткий код, передаются дальше без изменений.
+
+    На edge-узле (EDGE_MODE) ссылки берутся из локального снимка, а клики
+    копятся и отправляются на основной сервис синхронизацией.
+    """
+
+    def __init__(self, app, store: Optional[link_crud.LinkStore] = None):
+        self.app = app
+        if store is None:
+            store = edge_store if settings.EDGE_MODE else link_crud.DatabaseLinkStore()
+        self.store = store
+        self.local = settings.EDGE_MODE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        match = _match_short_code_path(scope["path"])
+        if match is None or is_reserved_code(match.group(1)):
+            await self.app(scope, receive, send)
+            return
+
+        allowed, retry_after = await check_rate_limit("redirect", scope)
+        if not allowed:
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [*_TOO_MANY_HEADERS, (b"retry-after", str(math.ceil(retry_after)).encode("latin-1"))],
+            })
+            await send({"type": "http.response.body", "body": _TOO_MANY_BODY})
+            return
+
+        short_code = match.group(1)
+        domain_id = host_table.resolve_scope(scope)
+
+        if self.local:
+            target = await self.store.get_redirect_target(short_code, domain_id)
+            if target is None:
+                await send(_NOT_FOUND_START)
+                await send(_NOT_FOUND_BODY_MESSAGE)
+                return
+            await _send_redirect(send, target_redirect(target))
+            edge_sync.add_click(short_code, domain_id)
+            return
+
+        is_hot = hot_links.record(short_code, domain_id)
+        if is_hot:
+            pinned = hot_links.get_pinned(short_code, domain_id)
+            if pinned:
+                await _send_redirect(send, pinned)
+                click_buffer.add(short_code, domain_id)
+                return
+
+        cached = await link_cache.get(short_code, domain_id)
+        if cached:
+            await _send_redirect(send, cached)
+            if is_hot:
+                hot_links.pin(short_code, cached, domain_id=domain_id)
+                click_buffer.add(short_code, domain_id)
+            else:
+                await _record_click(short_code, domain_id)
+            return
+
+        target = await self.store.get_redirect_target(short_code, domain_id)
+        if target is None:
+            await send(_NOT_FOUND_START)
+            await send(_NOT_FOUND_BODY_MESSAGE)
+            return
+
+        redirect = target_redirect(target)
+        await _send_redirect(send, redirect)
+
+        await link_cache.store(
+            short_code, target.original_url,
+            link_cache.version_of(target.changed_at), target.expires_at, domain_id, target.redirect_type,
+        )
+        if is_hot:
+            hot_links.pin(short_code, redirect, link_cache.ttl_seconds(target.expires_at), domain_id)
+            click_buffer.add(short_code, domain_id)
+        else:
+            await _record_click(short_code, domain_id)
+
+
+async def _record_click(short_code: str, domain_id: Optional[int] = None) -> None:
+    # Ответ уже отправлен, поэтому ошибки здесь только логируем
+    try:
+        async with async_session() as db:
+            await link_crud.increment_clicks_by_short_code(db, short_code=short_code, domain_id=domain_id)
+    except Exception as e:
+        logger.error(f"Ошибка обновления счетчика кликов для {short_code}: {e}")
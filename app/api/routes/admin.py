@@ -0,0 +1,218 @@
+import asyncio
+from datetime import timedelta
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.deps import get_current_active_superuser
+from app.core.hotlinks import hot_links
+from app.core.profiling import folded, profile_store
+from app.crud import link as link_crud
+from app.crud import link_stats as link_stats_crud
+from app.db.session import get_db
+from app.db import probes
+from app.db.redis import redis_client
+
+router = APIRouter(dependencies=[Depends(get_current_active_superuser)])
+
+
+# Горячие ссылки текущего воркера
+@router.get("/hot-links",
+          summary="Горячие ссылки",
+          description="Возвращает самые популярные короткие коды по оценке Space-Saving (только для администраторов)")
+async def get_hot_links(
+    limit: int = Query(20, ge=1, le=1000, description="Сколько кодов вернуть"),
+) -> Any:
+    """
+    Топ коротких кодов по частоте редиректов в текущем процессе.
+    
+    - **count**: оценка числа запросов за последние окна (старые окна затухают вдвое)
+    - **error**: максимальная переоценка `count`
+    - **hot**: превышен ли порог горячей ссылки
+    - **pinned**: закреплен ли URL в памяти процесса
+    
+    Статистика локальна для воркера, который обработал запрос.
+    """
+    return {
+        "threshold": hot_links.threshold,
+        "window_seconds": hot_links.window,
+        "links": hot_links.top(limit),
+    }
+
+
+# Недоступные адреса назначения по результатам фоновой проверки
+@router.get("/probes/failing",
+          summary="Недоступные адреса ссылок",
+          description="Ссылки, адрес назначения которых не отвечает несколько проверок подряд (только для администраторов)")
+async def get_failing_links(
+    limit: int = Query(100, ge=1, le=1000, description="Сколько ссылок вернуть"),
+) -> Any:
+    """
+    Ссылки с недоступным адресом назначения, начиная с давно недоступных.
+    
+    - **failing_since**: время проверки, после которой адрес признан недоступным
+    - **failures**: число неудачных проверок подряд
+    - **status** / **error**: HTTP-статус или ошибка последней проверки
+    
+    Проверку выполняет фоновая задача (PROBE_ENABLED=true).
+    """
+    if redis_client is None:
+        raise HTTPException(status_code=503, detail="Результаты проверок хранятся в Valkey, он недоступен")
+    return {"links": await probes.failing(limit)}
+
+
+async def _stats_snapshot(db: AsyncSession = Depends(get_db)):
+    """Строка общих счетчиков: по ней видно, что агрегаты уже собраны и когда"""
+    try:
+        summary = await link_stats_crud.get_summary(db)
+    except DBAPIError:
+        raise HTTPException(status_code=503, detail="Статистика временно недоступна")
+    if summary is None:
+        raise HTTPException(status_code=503, detail="Статистика еще не собрана")
+    return summary
+
+
+async def _read_stats(query):
+    # Запросы ограничены ADMIN_STATS_TIMEOUT_MS: при превышении - 503, а не долгий ответ
+    try:
+        return await query
+    except DBAPIError:
+        raise HTTPException(status_code=503, detail="Статистика временно недоступна")
+
+
+# Общая статистика ссылок
+@router.get("/stats/summary",
+          summary="Общая статистика ссылок",
+          description="Число ссылок (всего, активных, истекших, анонимных) и кликов (только для администраторов)")
+async def get_stats_summary(summary=Depends(_stats_snapshot)) -> Any:
+    """
+    Общие счетчики ссылок по всем доменам (и шардам).
+    
+    Данные берутся из агрегатов, которые фоновая задача пересчитывает раз в
+    AGGREGATES_REFRESH_INTERVAL секунд; время пересчета - в **refreshed_at**.
+    """
+    return {
+        "refreshed_at": summary.refreshed_at,
+        "refresh_ms": summary.refresh_ms,
+        "total": summary.total,
+        "active": summary.active,
+        "expired": summary.expired,
+        "anonymous": summary.anonymous,
+        "clicks": summary.clicks,
+    }
+
+
+# Созданные ссылки по часам
+@router.get("/stats/created",
+          summary="Созданные ссылки по часам",
+          description="Число созданных ссылок за каждый час (UTC) за последние часы (только для администраторов)")
+async def get_stats_created(
+    hours: int = Query(48, ge=1, le=settings.AGGREGATES_HOURS, description="За сколько последних часов"),
+    summary=Depends(_stats_snapshot),
+    db: AsyncSession = Depends(get_db),
+) -> Any:
+    """
+    Созданные ссылки по часам. Часы без новых ссылок в ответ не попадают.
+    """
+    since = (link_crud.utcnow() - timedelta(hours=hours)).replace(minute=0, second=0, microsecond=0)
+    rows = await _read_stats(link_stats_crud.get_created_per_hour(db, since=since))
+    return {
+        "refreshed_at": summary.refreshed_at,
+        "hours": [{"hour": hour, "created": created} for hour, created in rows],
+    }
+
+
+# Самые популярные ссылки
+@router.get("/stats/top-links",
+          summary="Популярные ссылки",
+          description="Ссылки с наибольшим числом кликов (только для администраторов)")
+async def get_stats_top_links(
+    limit: int = Query(20, ge=1, le=settings.AGGREGATES_TOP, description="Сколько ссылок вернуть"),
+    summary=Depends(_stats_snapshot),
+    db: AsyncSession = Depends(get_db),
+) -> Any:
+    rows = await _read_stats(link_stats_crud.get_top_links(db, limit=limit))
+    return {
+        "refreshed_at": summary.refreshed_at,
+        "links": [
+            {
+                "short_code": row.short_code,
+                "domain_id": row.domain_id,
+                "original_url": row.original_url,
+                "clicks": row.clicks,
+            }
+            for row in rows
+        ],
+    }
+
+
+# Самые частые домены адресов назначения
+@router.get("/stats/top-domains",
+          summary="Популярные домены назначения",
+          description="Домены адресов назначения с наибольшим числом ссылок (только для администраторов)")
+async def get_stats_top_domains(
+    limit: int = Query(20, ge=1, le=settings.AGGREGATES_TOP, description="Сколько доменов вернуть"),
+    summary=Depends(_stats_snapshot),
+    db: AsyncSession = Depends(get_db),
+) -> Any:
+    """
+    Домены (хост без www.) адресов назначения: число ссылок и сумма их кликов.
+    """
+    rows = await _read_stats(link_stats_crud.get_top_domains(db, limit=limit))
+    return {
+        "refreshed_at": summary.refreshed_at,
+        "domains": [{"host": row.host, "links": row.links, "clicks": row.clicks} for row in rows],
+    }
+
+
+# Профили запросов (PROFILING_ENABLED=true)
+@router.get("/profiles",
+          summary="Профили запросов",
+          description="Последние сохраненные профили запросов этого инстанса (только для администраторов)")
+async def get_profiles(
+    limit: int = Query(50, ge=1, le=500, description="Сколько профилей вернуть"),
+) -> Any:
+    """
+    Профили запросов, новые первыми, без подробностей.
+    
+    - **reason**: `sample` - запрос попал в выборку, `slow` - превышен порог PROFILING_SLOW_MS
+    - **duration_ms**, **sql_ms**, **valkey_ms**: время запроса и ожидания БД и Valkey
+    - **concurrency**: сколько профилируемых запросов выполнялось одновременно
+    
+    Профили хранятся в локальном каталоге PROFILING_DIR инстанса, обработавшего запрос.
+    """
+    return {
+        "enabled": settings.PROFILING_ENABLED,
+        "profiles": await asyncio.to_thread(profile_store.recent, limit),
+    }
+
+
+async def _load_profile(profile_id: str) -> dict:
+    profile = await asyncio.to_thread(profile_store.load, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return profile
+
+
+@router.get("/profiles/{profile_id}",
+          summary="Профиль запроса",
+          description="SQL-запросы, команды Valkey и стеки одного запроса (только для администраторов)")
+async def get_profile(profile_id: str) -> Any:
+    """
+    Профиль целиком: **sql** и **valkey** - запросы в порядке выполнения со смещением
+    от начала запроса (`at_ms`) и длительностью, **stacks** - стеки event loop,
+    снятые во время запроса, с числом попаданий.
+    """
+    return await _load_profile(profile_id)
+
+
+@router.get("/profiles/{profile_id}/folded",
+          summary="Стеки профиля для flame graph",
+          description="Стеки профиля в формате flamegraph.pl / speedscope (только для администраторов)",
+          response_class=PlainTextResponse)
+async def get_profile_folded(profile_id: str) -> Any:
+    return folded(await _load_profile(profile_id))
@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.core.config import settings
 from app.core.security import create_access_token
+from app.core.rate_limit import rate_limit
 from app.schemas.token import Token
 from app.schemas.user import UserCreate
 from app.crud import user as user_crud
@@ -17,7 +18,8 @@ router = APIRouter()
 
 @router.post("/register", response_model=Token, status_code=status.HTTP_201_CREATED,
             summary="Регистрация нового пользователя",
-            description="Создает нового пользователя и возвращает токен доступа")
+            description="Создает нового пользователя и возвращает токен доступа",
+            dependencies=[Depends(rate_limit("auth"))])
 async def register(
     user_in: UserCreate = Body(..., example={
         "email": "user@example.com",
@@ -69,7 +71,8 @@ async def register(
 
 @router.post("/login", response_model=Token,
             summary="Авторизация пользователя",
-            description="Получение JWT токена для аутентификации в API")
+            description="Получение JWT токена для аутентификации в API",
+            dependencies=[Depends(rate_limit("auth"))])
 async def login_access_token(
     db: AsyncSession = Depends(get_db),
     form_data: OAuth2PasswordRequestForm = Depends(),
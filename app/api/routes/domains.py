@@ -0,0 +1,146 @@
+from typing import Any, List
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import get_db
+from app.core.deps import get_current_active_user
+from app.core import tenants
+from app.core.tenants import default_host, host_table
+from app.models.user import User
+from app.schemas.domain import Domain, DomainCreate
+from app.crud import domain as domain_crud
+from app.crud import link as link_crud
+
+router = APIRouter()
+
+
+@router.post("", response_model=Domain, status_code=status.HTTP_201_CREATED,
+          summary="Добавление собственного домена",
+          description="Регистрирует домен, на котором пользователь сможет создавать короткие ссылки")
+async def create_domain(
+    domain_in: DomainCreate = Body(..., example={"host": "go.example.com"}),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Добавление собственного домена.
+    
+    - **host**: имя хоста, DNS-запись которого указывает на сервис
+    
+    Домен начинает работать после подтверждения владения: создайте TXT-запись
+    `verification_record` со значением `verification_token` из ответа и вызовите
+    `POST /domains/{domain_id}/verify`. Пока владение не подтверждено, заявку
+    на тот же хост могут оставить и другие пользователи.
+
+    Короткие коды уникальны в пределах домена. Ссылки на домене создаются и
+    управляются запросами к API через этот домен (по заголовку Host).
+    """
+    if domain_in.host == default_host():
+        raise HTTPException(
+            status_code=400,
+            detail="Нельзя зарегистрировать основной домен сервиса",
+        )
+    try:
+        domain = await domain_crud.create(db, host=domain_in.host, user=current_user)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e),
+        )
+    
+    return domain
+
+
+@router.post("/{domain_id}/verify", response_model=Domain,
+          summary="Подтверждение владения доменом",
+          description="Проверяет TXT-запись домена и включает его")
+async def verify_domain(
+    domain_id: int = Path(..., description="ID домена"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Подтверждение владения доменом.
+    
+    - **domain_id**: ID домена
+    
+    Ищет TXT-запись `verification_record` со значением `verification_token`.
+    Если она есть, домен становится активным, а заявки других пользователей
+    на этот хост удаляются. Иначе возвращается 400 - повторите после
+    обновления DNS.
+    """
+    domain = await domain_crud.get(db, domain_id)
+    if not domain or domain.user_id != current_user.id:
+        raise HTTPException(
+            status_code=404,
+            detail="Домен не найден",
+        )
+    if domain.verified_at is not None:
+        return domain
+
+    record = tenants.verification_record(domain.host)
+    if domain.verification_token not in await tenants.lookup_txt(record):
+        raise HTTPException(
+            status_code=400,
+            detail=f"TXT-запись {record} со значением {domain.verification_token} не найдена",
+        )
+    try:
+        domain = await domain_crud.verify(db, domain)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e),
+        )
+    
+    await host_table.notify_changed()
+    return domain
+
+
+@router.get("", response_model=List[Domain],
+          summary="Список доменов",
+          description="Возвращает собственные домены текущего пользователя")
+async def list_domains(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Any:
+    """
+    Список собственных доменов текущего пользователя.
+    """
+    return await domain_crud.get_multi_by_user(db, user_id=current_user.id)
+
+
+@router.delete("/{domain_id}", status_code=status.HTTP_204_NO_CONTENT,
+             summary="Удаление домена",
+             description="Удаляет собственный домен, на котором нет ссылок")
+async def delete_domain(
+    domain_id: int = Path(..., description="ID домена"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+) -> Response:
+    """
+    Удаление собственного домена.
+    
+    - **domain_id**: ID домена
+    
+    Домен можно удалить только после удаления всех его ссылок.
+    """
+    # Строка домена заблокирована до удаления: ссылка, которую создают сейчас,
+    # либо уже видна в подсчете, либо будет создаваться после удаления домена (403)
+    domain = await domain_crud.get(db, domain_id, for_update=True)
+    if not domain or domain.user_id != current_user.id:
+        raise HTTPException(
+            status_code=404,
+            detail="Домен не найден",
+        )
+    
+    if await link_crud.count_links(db, domain_id=domain_id):
+        raise HTTPException(
+            status_code=400,
+            detail="Сначала удалите ссылки этого домена",
+        )
+    
+    await domain_crud.remove(db, domain_id=domain_id, user_id=current_user.id)
+    if domain.verified_at is not None:
+        await host_table.notify_changed()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,99 @@
+import hmac
+from datetime import datetime
+from typing import Any, Optional
+
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import outbox
+from app.db.session import get_db
+from app.core.config import settings
+from app.schemas.edge import EdgeClicks
+from app.crud import domain as domain_crud
+from app.crud import link as link_crud
+
+
+def verify_edge_token(x_edge_token: Optional[str] = Header(None)) -> None:
+    # Без EDGE_SYNC_SECRET репликация на edge-узлы выключена
+    if not settings.EDGE_SYNC_SECRET or not x_edge_token or not hmac.compare_digest(
+        x_edge_token.encode(), settings.EDGE_SYNC_SECRET.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Неверный токен edge-узла",
+        )
+
+
+router = APIRouter(default_response_class=ORJSONResponse, dependencies=[Depends(verify_edge_token)])
+
+
+# Изменения ссылок для снимка edge-узла
+@router.get("/links/delta",
+          summary="Изменения ссылок",
+          description="Возвращает ссылки, измененные после курсора, для локального снимка edge-узла")
+async def get_links_delta(
+    since: Optional[datetime] = Query(None, description="Время изменения из курсора (пусто - с начала)"),
+    since_id: int = Query(0, description="ID ссылки из курсора"),
+    limit: int = Query(1000, ge=1, le=50000, description="Размер страницы"),
+    db: AsyncSession = Depends(get_db),
+) -> Any:
+    """
+    Страница изменений ссылок по возрастанию (время изменения, id).
+    
+    - **links**: строки в порядке полей `fields`; неактивные ссылки edge-узел удаляет
+    - **domains**: все активные собственные домены [id, host]
+    - **next**: курсор следующей страницы
+    - **cursor**: позиция ленты изменений до чтения страницы - с нее edge-узел
+      продолжает после полной синхронизации (GET /edge/links/changes)
+    """
+    # Позиция ленты берется до чтения ссылок: события после нее перекроют снимок
+    cursor = await outbox.head() if outbox.enabled() else None
+    changes = await link_crud.get_changed_since(db, since=since, since_id=since_id, limit=limit)
+    last = changes[-1] if changes else None
+    return ORJSONResponse({
+        "fields": link_crud.LinkChange._fields,
+        "links": [tuple(change) for change in changes],
+        "domains": await domain_crud.get_active_hosts(db),
+        "next": {"since": last.changed_at, "since_id": last.id} if last else None,
+        "cursor": cursor,
+    })
+
+
+# Лента изменений для edge-узлов
+@router.get("/links/changes",
+          summary="Лента изменений ссылок",
+          description="События изменений ссылок после курсора (long-poll), как GET /links/changes",
+          responses={410: {"description": "Курсор устарел, нужна полная синхронизация"}})
+async def get_links_changes(
+    since: str = Query(..., description="Курсор из /edge/links/delta или прошлого ответа"),
+    timeout: float = Query(0, ge=0, description="Сколько ждать новых событий (секунды)"),
+    limit: int = Query(1000, ge=1, le=50000, description="Максимум событий в ответе"),
+) -> Any:
+    if not outbox.enabled():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Лента изменений недоступна")
+    try:
+        events, cursor = await outbox.read(
+            since, timeout=min(timeout, settings.LINK_CHANGES_MAX_WAIT), limit=limit
+        )
+    except outbox.CursorExpired:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Курсор устарел")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return ORJSONResponse({"events": events, "cursor": cursor})
+
+
+# Клики, обслуженные edge-узлом
+@router.post("/links/clicks", status_code=status.HTTP_204_NO_CONTENT,
+           summary="Клики edge-узла",
+           description="Прибавляет клики, накопленные edge-узлом, одним пакетным обновлением")
+async def add_edge_clicks(
+    clicks_in: EdgeClicks = Body(...),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    clicks = {}
+    for domain_id, short_code, count in clicks_in.clicks:
+        key = (domain_id, short_code)
+        clicks[key] = clicks.get(key, 0) + count
+    await link_crud.add_clicks_bulk(db, clicks)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,78 +1,93 @@
-from typing import Any, List, Optional
+from typing import Any, List, Literal, Optional, Tuple
 import logging
-from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query, Request, Response, status
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import ORJSONResponse, RedirectResponse, StreamingResponse
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
-import valkey.asyncio as redis
 
 from app.db.session import get_db
-from app.db.redis import get_redis
 from app.core.config import settings
-from app.core.deps import get_current_active_user, get_optional_current_user
+from app.core.deps import (
+    get_current_active_superuser, get_current_active_user, get_optional_current_user,
+    get_request_domain_id, get_token_user_id
+)
+from app.core import qr
+from app.core.tenants import host_table
+from app.core.rate_limit import rate_limit
+from app.core.redirects import Redirect, cache_control
+from app.api.redirect import target_redirect
 from app.models.user import User
-from app.schemas.link import Link, LinkCreate, LinkUpdate, LinkStats, LinkSearch
+from app.schemas.link import Link, LinkCreate, LinkWithPreview, LinkUpdate, LinkStats, LinkSearch, LinkStatsBatchRequest
+from app.api.serializers import json_response, link_json, link_search_json, link_stats_json
+from app.crud import domain as domain_crud
 from app.crud import link as link_crud
+from app.crud import user as user_crud
+from app.db import link_cache, outbox, probes, response_cache
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 logger = logging.Logger('links_api')
 
 
 # Редирект по короткой ссылке (публичный доступ)
 @router.get("/{short_code}", 
           summary="Переход по короткой ссылке",
-          description="Перенаправляет на оригинальный URL по короткому коду")
+          description="Перенаправляет на оригинальный URL по короткому коду",
+          dependencies=[Depends(rate_limit("redirect"))])
 async def redirect_to_original_url(
     short_code: str = Path(..., description="Короткий код ссылки (например, 'abc123')"),
     request: Request = None,
     db: AsyncSession = Depends(get_db),
-    redis_client: redis.Redis = Depends(get_redis),
+    domain_id: Optional[int] = Depends(get_request_domain_id),
 ) -> Any:
     """
     Перенаправление на оригинальный URL по короткому коду.
     
     - **short_code**: короткий код ссылки, созданной ранее
     
-    При успешном поиске перенаправляет на оригинальный URL. Увеличивает счетчик кликов.
+    При успешном поиске перенаправляет на оригинальный URL со статусом типа редиректа
+    ссылки (301/308 - с Cache-Control: max-age, 302/307 - no-store). Увеличивает счетчик кликов.
     Если ссылка не найдена или срок ее действия истек, возвращает ошибку 404.
     """
     # Сначала проверяем кэш Redis
-    if redis_client:
-        cached_url = await redis_client.get(f"link:{short_code}")
-    else:
-        cached_url == None
-    if cached_url:
-        logger.info(f'Найден url в кэше: {cached_url}')
-        link = await link_crud.get_by_short_code(db, short_code=short_code)
-        if link:
-            # Инкрементируем счетчик переходов и обновляем дату последнего использования
-            await link_crud.increment_clicks(db, link)
-        
-        # Декодируем URL, если он в байтах, или используем как есть, если он уже строка
-        url = cached_url.decode() if isinstance(cached_url, bytes) else cached_url
-        return RedirectResponse(url=url)
+    cached = await link_cache.get(short_code, domain_id)
+    if cached:
+        logger.info(f'Найден url в кэше: {cached.url}')
+        # Инкрементируем счетчик переходов и обновляем дату последнего использования
+        await link_crud.increment_clicks_by_short_code(db, short_code=short_code, domain_id=domain_id)
+        return _redirect_response(cached)
     
     # Если нет в кэше, ищем в БД
-    link = await link_crud.get_by_short_code(db, short_code=short_code)
-    if not link:
+    target = await link_crud.get_redirect_target(db, short_code=short_code, domain_id=domain_id)
+    if not target:
         raise HTTPException(
             status_code=404,
             detail="Ссылка не найдена или срок ее действия истек",
         )
     
     # Инкрементируем счетчик переходов и обновляем дату последнего использования
-    await link_crud.increment_clicks(db, link)
+    await link_crud.increment_clicks_by_short_code(db, short_code=short_code, domain_id=domain_id)
     
-    # Кэшируем URL в Redis на 1 час
-    if redis_client:
-        await redis_client.setex(f"link:{short_code}", 3600, link.original_url)
+    # Кэшируем URL (не дольше срока действия ссылки)
+    await link_cache.store(
+        short_code, target.original_url,
+        link_cache.version_of(target.changed_at), target.expires_at, domain_id, target.redirect_type,
+    )
     
-    return RedirectResponse(url=link.original_url)
+    return _redirect_response(target_redirect(target))
+
+
+def _redirect_response(redirect: Redirect) -> RedirectResponse:
+    return RedirectResponse(
+        url=redirect.url, status_code=redirect.status,
+        headers={"Cache-Control": cache_control(redirect.status, redirect.expires_at)},
+    )
 
 
 # Создание короткой ссылки (публичный доступ)
 @router.post("/links/shorten", response_model=Link,
           summary="Создание короткой ссылки (доступно без авторизации)",
-          description="Создаёт короткую ссылку для оригинального URL. Можно указать срок действия ссылки.")
+          description="Создаёт короткую ссылку для оригинального URL. Можно указать срок действия ссылки.",
+          dependencies=[Depends(rate_limit("shorten"))])
 async def create_short_link(
     link_in: LinkCreate = Body(..., example={
         "original_url": "https://tenor.com/en-GB/view/дон-симон-сергей-симонов-охота-gif-5491422726335977617",
@@ -81,6 +96,7 @@ async def create_short_link(
     }),
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_current_user),
+    domain_id: Optional[int] = Depends(get_request_domain_id),
 ) -> Any:
     """
     Создание короткой ссылки для оригинального URL.
@@ -88,22 +104,35 @@ async def create_short_link(
     - **original_url**: исходный URL, который нужно сократить (обязательно)
     - **custom_alias**: пользовательский алиас для короткой ссылки (опционально)
     - **expires_at**: дата и время истечения срока действия ссылки в формате ISO 8601 (опционально)
-    
+    - **redirect_type**: 301/308 - постоянный редирект, кэшируется CDN (клики дополняются из логов CDN),
+      302/307 - без кэширования, каждый клик учитывается сразу (опционально)
+
     **Авторизация не требуется** - вы можете создавать короткие ссылки без регистрации и авторизации.
     Если вы авторизованы, ссылка будет привязана к вашему аккаунту.
+
+    Частота запросов ограничена: для анонимных пользователей по IP, для авторизованных по аккаунту.
+    При превышении лимита возвращается 429 с заголовком Retry-After.
     
     Если custom_alias не указан, будет сгенерирован случайный короткий код.
     
     Если expires_at не указан, срок действия ссылки будет установлен в {settings.LINK_EXPIRATION_DAYS} дней 
     с момента создания (глобальная настройка). После истечения срока действия ссылка автоматически станет недоступной.
+
+    Запрос через собственный домен (заголовок Host) создает ссылку на этом домене;
+    это доступно только владельцу домена.
     """
+    if domain_id is not None:
+        # Блокировка держится до конца запроса: домен не удалят, пока создается ссылка
+        domain = await domain_crud.get(db, domain_id, for_share=True)
+        if not current_user or not domain or domain.user_id != current_user.id:
+            raise HTTPException(
+                status_code=403,
+                detail="Создавать ссылки на этом домене может только его владелец",
+            )
     try:
-        link = await link_crud.create(db=db, obj_in=link_in, user=current_user)
+        link = await link_crud.create(db=db, obj_in=link_in, user=current_user, domain_id=domain_id)
         
-        # Добавляем полный URL в ответ
-        setattr(link, "short_url", f"{settings.BASE_URL}/{link.short_code}")
-        
-        return link
+        return json_response(link_json(link))
     except ValueError as e:
         raise HTTPException(
             status_code=400,
@@ -111,80 +140,192 @@ async def create_short_link(
         )
 
 
-# Поиск ссылки по оригинальному URL
+# Поиск ссылок по оригинальному URL
 @router.get("/links/search", response_model=List[LinkSearch],
-          summary="Поиск ссылки по URL",
-          description="Ищет короткие ссылки по оригинальному URL")
+          summary="Поиск ссылок по URL",
+          description="Ищет короткие ссылки по оригинальному URL: точно, по префиксу, подстроке или домену")
 async def search_link(
-    original_url: str = Query(..., description="Оригинальный URL для поиска"),
+    original_url: Optional[str] = Query(None, description="Оригинальный URL для точного поиска"),
+    q: Optional[str] = Query(None, min_length=1, max_length=2048, description="Строка поиска для режима `mode`"),
+    mode: Literal["exact", "prefix", "substring", "domain"] = Query("substring", description="Режим поиска по `q`"),
+    cursor: int = Query(0, ge=0, description="Курсор из заголовка X-Next-Cursor прошлой страницы"),
+    limit: int = Query(100, ge=1, le=1000, description="Размер страницы"),
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_optional_current_user),
+    domain_id: Optional[int] = Depends(get_request_domain_id),
 ) -> Any:
     """
-    Поиск короткой ссылки по оригинальному URL.
+    Поиск коротких ссылок по оригинальному URL.
     
-    - **original_url**: оригинальный URL для поиска
+    - **original_url**: точное совпадение URL (как раньше)
+    - **q** и **mode**: `exact`, `prefix` (начало URL), `substring` (от 3 символов)
+      или `domain` (хост URL, например `example.com`)
+    - **cursor**, **limit**: постраничный вывод; если есть следующая страница,
+      ее курсор возвращается в заголовке `X-Next-Cursor`
     
-    Возвращает список всех коротких ссылок, созданных для указанного оригинального URL.
-    Если пользователь не авторизован, возвращает только анонимные ссылки.
+    Авторизованный пользователь ищет среди своих ссылок, неавторизованный - среди анонимных.
     """
-    links = await link_crud.search_by_original_url(
-        db, original_url=original_url, 
-        user_id=current_user.id if current_user else None
+    if original_url is not None:
+        value, mode = original_url, "exact"
+    elif q is not None:
+        value = q
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите original_url или q",
+        )
+    if mode == "substring" and len(value) < 3:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Для поиска по подстроке нужно не меньше 3 символов",
+        )
+
+    links = await link_crud.search(
+        db, value=value, mode=mode, user_id=current_user.id if current_user else None,
+        domain_id=domain_id, after_id=cursor, limit=limit
     )
+    response = json_response(link_search_json(links))
+    if len(links) == limit:
+        response.headers["X-Next-Cursor"] = str(links[-1].id)
+    return response
+
+
+# Статистика по множеству ссылок одним запросом
+@router.post("/links/stats/batch",
+          summary="Статистика по списку ссылок",
+          description="Возвращает статистику сразу по многим коротким кодам в колоночном JSON или NDJSON",
+          responses={200: {"content": {"application/json": {}, "application/x-ndjson": {}}}})
+async def get_links_stats_batch(
+    batch_in: LinkStatsBatchRequest = Body(..., example={"short_codes": ["abc123", "mylink"]}),
+    format: Literal["columnar", "ndjson"] = Query("columnar", description="Формат ответа"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_optional_current_user),
+    domain_id: Optional[int] = Depends(get_request_domain_id),
+) -> Any:
+    """
+    Получение статистики по списку коротких кодов.
     
-    # Если пользователь не авторизован, возвращаем только анонимные ссылки
-    if not current_user:
-        links = [link for link in links if link.is_anonymous]
+    - **short_codes**: список коротких кодов (до {settings.BATCH_STATS_MAX_CODES} штук)
+    - **format**: `columnar` - объект, где каждому полю соответствует массив значений;
+      `ndjson` - поток, по одной ссылке в строке
     
-    return links
+    Все ссылки загружаются одним запросом к БД. Коды ссылок, которые не найдены,
+    истекли или недоступны текущему пользователю, возвращаются в поле `not_found`
+    (в NDJSON - отдельной последней строкой).
+    """
+    short_codes = list(dict.fromkeys(batch_in.short_codes))
+    rows = await link_crud.get_stats_by_short_codes(
+        db, short_codes=short_codes,
+        user_id=current_user.id if current_user else None, domain_id=domain_id
+    )
+    found = {row.short_code for row in rows}
+    not_found = [code for code in short_codes if code not in found]
+
+    if format == "ndjson":
+        def stream():
+            for row in rows:
+                yield orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE)
+            yield orjson.dumps({"not_found": not_found}, option=orjson.OPT_APPEND_NEWLINE)
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    columns = list(zip(*rows)) if rows else [()] * 6
+    return ORJSONResponse({
+        "base_url": host_table.base_url(domain_id),
+        "short_code": columns[0],
+        "original_url": columns[1],
+        "clicks": columns[2],
+        "created_at": columns[3],
+        "last_used_at": columns[4],
+        "expires_at": columns[5],
+        "not_found": not_found,
+    })
+
+
+# Лента изменений ссылок (long-poll)
+@router.get("/links/changes",
+          summary="Лента изменений ссылок",
+          description="Возвращает события создания, изменения, удаления и истечения ссылок после курсора "
+                      "(только для администраторов)",
+          responses={410: {"description": "Курсор устарел, нужна полная пересинхронизация"}})
+async def get_link_changes(
+    since: Optional[str] = Query(None, description="Курсор из прошлого ответа (пусто - только новые события, 0-0 - с начала)"),
+    timeout: float = Query(0, ge=0, description="Сколько ждать новых событий, если их нет (секунды)"),
+    limit: int = Query(1000, ge=1, le=10000, description="Максимум событий в ответе"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    События изменений ссылок по порядку публикации.
+    
+    - **events**: события `create`, `update`, `delete` и `expire` с состоянием ссылки
+    - **cursor**: курсор для следующего запроса
+    
+    Если событий нет, запрос ждет их до `timeout` секунд (не дольше LINK_CHANGES_MAX_WAIT).
+    Доставка "хотя бы один раз": событие идентифицируется парой (`shard`, `id`).
+    """
+    # Соединение с БД было нужно только для проверки пользователя - не держим его во время ожидания
+    await db.rollback()
+    if not outbox.enabled():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Лента изменений недоступна")
+    try:
+        events, cursor = await outbox.read(
+            since, timeout=min(timeout, settings.LINK_CHANGES_MAX_WAIT), limit=limit
+        )
+    except outbox.CursorExpired:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Курсор устарел")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return ORJSONResponse({"events": events, "cursor": cursor})
 
 
 # Получение информации о ссылке
-@router.get("/links/{short_code}", response_model=Link,
+@router.get("/links/{short_code}", response_model=LinkWithPreview,
           summary="Получение информации о ссылке",
-          description="Возвращает детальную информацию о короткой ссылке")
+          description="Возвращает детальную информацию о короткой ссылке",
+          responses={304: {"description": "Ссылка не изменилась (If-None-Match)"}})
 async def get_link_info(
     short_code: str = Path(..., description="Короткий код ссылки"),
+    preview: bool = Query(False, description="Добавить результат последней проверки адреса назначения"),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_current_user),
+    user_id: Optional[int] = Depends(get_token_user_id),
+    domain_id: Optional[int] = Depends(get_request_domain_id),
 ) -> Any:
     """
     Получение информации о короткой ссылке.
     
     - **short_code**: короткий код ссылки
+    - **preview**: добавить поле `preview` - статус и заголовок страницы назначения
+      по последней фоновой проверке (сама проверка в запросе не выполняется)
     
     Возвращает полную информацию о ссылке: оригинальный URL, дату создания,
     количество кликов и другие параметры.
+
+    Ответ содержит ETag: при совпадении заголовка If-None-Match возвращается 304.
     """
-    link = await link_crud.get_by_short_code(db, short_code=short_code)
-    if not link:
-        raise HTTPException(
-            status_code=404,
-            detail="Ссылка не найдена",
-        )
-    
-    # Проверяем, принадлежит ли ссылка текущему пользователю
-    if link.user_id and current_user and link.user_id != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="У вас нет доступа к этой ссылке",
-        )
-    
-    # Добавляем полный URL в ответ
-    setattr(link, "short_url", f"{settings.BASE_URL}/{link.short_code}")
-    
-    return link
+    etag, body = await _cached_link_body(
+        "info", short_code, db, user_id, domain_id, _build_link_info
+    )
+    if preview:
+        result = await probes.get_preview(short_code, domain_id)
+        body = orjson.dumps({**orjson.loads(body), "preview": result})
+        # Новая проверка меняет ответ так же, как изменение ссылки
+        etag = response_cache.make_etag(etag, "preview", result and result["checked_at"])
+    return _etag_response(etag, body, if_none_match)
 
 
 # Получение статистики по ссылке
 @router.get("/links/{short_code}/stats", response_model=LinkStats,
           summary="Статистика по ссылке",
-          description="Возвращает статистику использования короткой ссылки")
+          description="Возвращает статистику использования короткой ссылки",
+          responses={304: {"description": "Статистика не изменилась (If-None-Match)"}})
 async def get_link_stats(
     short_code: str = Path(..., description="Короткий код ссылки"),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db),
-    current_user: Optional[User] = Depends(get_optional_current_user),
+    user_id: Optional[int] = Depends(get_token_user_id),
+    domain_id: Optional[int] = Depends(get_request_domain_id),
 ) -> Any:
     """
     Получение статистики использования короткой ссылки.
@@ -193,14 +334,77 @@ async def get_link_stats(
     
     Возвращает статистику по ссылке: количество переходов, дату создания, 
     дату последнего использования и другие параметры.
+
+    Ответ содержит ETag: при совпадении заголовка If-None-Match возвращается 304.
     """
-    link = await link_crud.get_by_short_code(db, short_code=short_code)
-    if not link:
+    return await _cached_link_response(
+        "stats", short_code, if_none_match, db, user_id, domain_id, _build_link_stats
+    )
+
+
+# QR-код короткой ссылки
+@router.get("/links/{short_code}/qr.{fmt}",
+          summary="QR-код ссылки",
+          description="Возвращает QR-код короткой ссылки в формате PNG или SVG",
+          response_class=Response,
+          responses={
+              200: {"content": {"image/png": {}, "image/svg+xml": {}}},
+              304: {"description": "Картинка не изменилась (If-None-Match)"},
+          },
+          dependencies=[Depends(rate_limit("qr"))])
+async def get_link_qr(
+    short_code: str = Path(..., description="Короткий код ссылки"),
+    fmt: Literal["png", "svg"] = Path(..., description="Формат картинки"),
+    scale: int = Query(settings.QR_DEFAULT_SCALE, description=f"Размер модуля в пикселях: {', '.join(map(str, qr.SCALES))}"),
+    border: int = Query(settings.QR_DEFAULT_BORDER, description=f"Ширина поля в модулях: {', '.join(map(str, qr.BORDERS))}"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db),
+    domain_id: Optional[int] = Depends(get_request_domain_id),
+) -> Any:
+    """
+    QR-код с полным коротким URL ссылки.
+
+    - **short_code**: короткий код ссылки
+    - **scale**, **border**: размер модуля и ширина белого поля
+
+    Картинка зависит только от короткого URL и параметров, поэтому кэшируется
+    (в памяти, на диске и у клиента - `immutable`); ETag - хэш содержимого.
+    Параметры принимают только значения из небольшого набора, чтобы число
+    картинок одной ссылки (и объем кэша) было ограничено.
+    """
+    if scale not in qr.SCALES or border not in qr.BORDERS:
         raise HTTPException(
-            status_code=404,
-            detail="Ссылка не найдена",
+            status_code=422,
+            detail=f"Допустимые значения: scale - {', '.join(map(str, qr.SCALES))}, "
+                   f"border - {', '.join(map(str, qr.BORDERS))}",
+        )
+    if not await link_cache.get_url(short_code, domain_id):
+        if not await link_crud.get_redirect_target(db, short_code=short_code, domain_id=domain_id):
+            raise HTTPException(
+                status_code=404,
+                detail="Ссылка не найдена или срок ее действия истек",
+            )
+    content = f"{host_table.base_url(domain_id)}/{short_code}"
+    etag = f'"{qr.asset_key(content, fmt, scale, border)}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.QR_MAX_AGE}, immutable"}
+    if response_cache.etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    _, image = await qr.qr_cache.get(content, fmt, scale, border)
+    return Response(content=image, media_type=qr.FORMATS[fmt], headers=headers)
+
+
+def _build_link_info(link: link_crud.LinkRecord, current_user: Optional[User]) -> str:
+    # Проверяем, принадлежит ли ссылка текущему пользователю
+    if link.user_id and current_user and link.user_id != current_user.id:
+        raise HTTPException(
+            status_code=403,
+            detail="У вас нет доступа к этой ссылке",
         )
     
+    return link_json(link).decode()
+
+
+def _build_link_stats(link: link_crud.LinkRecord, current_user: Optional[User]) -> str:
     # Анонимные пользователи могут получать статистику только по анонимным ссылкам
     if not current_user and not link.is_anonymous:
         raise HTTPException(
@@ -215,15 +419,56 @@ async def get_link_stats(
             detail="У вас нет доступа к статистике этой ссылки",
         )
     
-    return {
-        "original_url": link.original_url,
-        "short_code": link.short_code,
-        "short_url": f"{settings.BASE_URL}/{link.short_code}",
-        "clicks": link.clicks,
-        "created_at": link.created_at,
-        "last_used_at": link.last_used_at,
-        "expires_at": link.expires_at,
-    }
+    return link_stats_json(link).decode()
+
+
+async def _cached_link_response(
+    kind: str, short_code: str, if_none_match: Optional[str],
+    db: AsyncSession, user_id: Optional[int], domain_id: Optional[int], build,
+) -> Response:
+    etag, body = await _cached_link_body(kind, short_code, db, user_id, domain_id, build)
+    return _etag_response(etag, body, if_none_match)
+
+
+async def _cached_link_body(
+    kind: str, short_code: str, db: AsyncSession,
+    user_id: Optional[int], domain_id: Optional[int], build,
+) -> Tuple[str, str]:
+    """
+    Отдает (ETag, тело) из кэша по (код, пользователь) без обращения к БД.
+    При промахе загружает пользователя и ссылку, проверяет доступ и кэширует результат.
+    Ошибки (403/404) не кэшируются.
+    """
+    viewer = str(user_id) if user_id is not None else "anon"
+    cached = await response_cache.get(short_code, kind, viewer, domain_id)
+    if cached:
+        etag, body = cached
+    else:
+        current_user = await user_crud.get(db, user_id) if user_id is not None else None
+        if current_user is not None and not current_user.is_active:
+            current_user = None
+        
+        link = await link_crud.get_record_by_short_code(db, short_code=short_code, domain_id=domain_id)
+        if not link:
+            raise HTTPException(
+                status_code=404,
+                detail="Ссылка не найдена",
+            )
+        
+        body = build(link, current_user)
+        # ETag - от самого тела: updated_at на SQLite с точностью до миллисекунды и
+        # не различает изменения в одну миллисекунду
+        etag = response_cache.make_etag(kind, link.id, body)
+        version = link_cache.version_of(link.updated_at or link.created_at)
+        await response_cache.store(short_code, kind, viewer, etag, body, version, domain_id)
+    return etag, body
+
+
+def _etag_response(etag: str, body, if_none_match: Optional[str]) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if response_cache.etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 # Обновление ссылки (только для авторизованных пользователей)
@@ -235,41 +480,38 @@ async def update_link(
     link_in: LinkUpdate = Body(..., example={
                                "original_url": "https://tenor.com/en-GB/view/дон-симон-сергей-симонов-охота-gif-5491422726335977617"}),
     db: AsyncSession = Depends(get_db),
-    redis_client: redis.Redis = Depends(get_redis),
     current_user: User = Depends(get_current_active_user),
+    domain_id: Optional[int] = Depends(get_request_domain_id),
 ) -> Any:
     """
     Обновление оригинального URL для короткой ссылки.
     
     - **short_code**: короткий код ссылки, которую нужно обновить
     - **original_url**: новый оригинальный URL
+    - **redirect_type**: новый тип редиректа. Постоянный редирект (301/308), уже закэшированный
+      CDN и браузерами, продолжит отдаваться до REDIRECT_PERMANENT_MAX_AGE секунд
     
     Доступно только для авторизованных пользователей, которые являются владельцами ссылки.
     """
-    link = await link_crud.get_by_short_code(db, short_code=short_code)
+    link = await link_crud.update_by_short_code(
+        db, short_code=short_code, user_id=current_user.id, obj_in=link_in, domain_id=domain_id
+    )
     if not link:
-        raise HTTPException(
-            status_code=404,
-            detail="Ссылка не найдена",
-        )
-    
-    # Проверяем, принадлежит ли ссылка текущему пользователю
-    if link.user_id != current_user.id:
+        # Владелец проверяется в самом UPDATE - отличаем "нет ссылки" от "чужая ссылка"
+        if not await link_crud.get_record_by_short_code(db, short_code=short_code, domain_id=domain_id):
+            raise HTTPException(
+                status_code=404,
+                detail="Ссылка не найдена",
+            )
         raise HTTPException(
             status_code=403,
             detail="У вас нет прав для обновления этой ссылки",
         )
     
-    link = await link_crud.update(db=db, db_obj=link, obj_in=link_in)
-    
-    # Обновляем кэш в Redis
-    if link_in.original_url and redis_client:
-        await redis_client.setex(f"link:{short_code}", 3600, link.original_url)
+    # Сбрасываем кэш с версией обновления: устаревший URL туда уже не попадет
+    await link_cache.invalidate(short_code, link_cache.version_of(link.updated_at), domain_id)
     
-    # Добавляем полный URL в ответ
-    setattr(link, "short_url", f"{settings.BASE_URL}/{link.short_code}")
-    
-    return link
+    return json_response(link_json(link))
 
 
 # Удаление ссылки (только для авторизованных пользователей)
@@ -279,8 +521,8 @@ async def update_link(
 async def delete_link(
     short_code: str = Path(..., description="Короткий код ссылки для удаления"),
     db: AsyncSession = Depends(get_db),
-    redis_client: redis.Redis = Depends(get_redis),
     current_user: User = Depends(get_current_active_user),
+    domain_id: Optional[int] = Depends(get_request_domain_id),
 ) -> Response:
     """
     Удаление короткой ссылки.
@@ -290,24 +532,23 @@ async def delete_link(
     Доступно только для авторизованных пользователей, которые являются владельцами ссылки.
     При успешном удалении возвращает статус 204 No Content.
     """
-    link = await link_crud.get_by_short_code(db, short_code=short_code)
+    link = await link_crud.remove_by_short_code(
+        db, short_code=short_code, user_id=current_user.id, domain_id=domain_id
+    )
     if not link:
-        raise HTTPException(
-            status_code=404,
-            detail="Ссылка не найдена",
-        )
-    
-    # Проверяем, принадлежит ли ссылка текущему пользователю
-    if link.user_id != current_user.id:
+        if not await link_crud.get_record_by_short_code(db, short_code=short_code, domain_id=domain_id):
+            raise HTTPException(
+                status_code=404,
+                detail="Ссылка не найдена",
+            )
         raise HTTPException(
             status_code=403,
             detail="У вас нет прав для удаления этой ссылки",
         )
     
-    await link_crud.remove_by_short_code(db, short_code=short_code)
-    
-    # Удаляем из кэша Redis
-    if redis_client:
-        await redis_client.delete(f"link:{short_code}")
+    # Сбрасываем кэш: версия старше любой прочитанной до удаления
+    await link_cache.invalidate(
+        short_code, link_cache.version_of(link.updated_at or link.created_at) + 1, domain_id
+    )
     
     return Response(status_code=status.HTTP_204_NO_CONTENT)
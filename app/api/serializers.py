@@ -0,0 +1,42 @@
+from typing import Any, Iterable, List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from app.schemas.link import Link, LinkSearch, LinkStats
+
+# Быстрая сериализация ответов по ссылкам: модели собираются через model_construct
+# напрямую из ORM-объектов или строк select(...) без повторной валидации,
+# а JSON пишет сериализатор pydantic-core. `short_url` - вычисляемое поле схем.
+
+_LINK_FIELDS = tuple(Link.model_fields)
+_LINK_STATS_FIELDS = tuple(LinkStats.model_fields)
+_LINK_SEARCH_FIELDS = tuple(LinkSearch.model_fields)
+
+_link_adapter = TypeAdapter(Link)
+_link_stats_adapter = TypeAdapter(LinkStats)
+_link_search_list_adapter = TypeAdapter(List[LinkSearch])
+
+
+def _construct(model, fields, obj: Any):
+    # Подходит и для ORM-объекта, и для строки результата (Row)
+    return model.model_construct(**{name: getattr(obj, name) for name in fields})
+
+
+def link_json(obj: Any) -> bytes:
+    return _link_adapter.dump_json(_construct(Link, _LINK_FIELDS, obj))
+
+
+def link_stats_json(obj: Any) -> bytes:
+    return _link_stats_adapter.dump_json(_construct(LinkStats, _LINK_STATS_FIELDS, obj))
+
+
+def link_search_json(rows: Iterable[Any]) -> bytes:
+    return _link_search_list_adapter.dump_json(
+        [_construct(LinkSearch, _LINK_SEARCH_FIELDS, row) for row in rows]
+    )
+
+
+def json_response(content: bytes, status_code: int = 200) -> Response:
+    return Response(content=content, status_code=status_code, media_type="application/json")
+
@@ -21,8 +21,10 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = os.getenv("POSTGRES_DB", "url_cutter")
     POSTGRES_PORT: int = int(os.getenv("POSTGRES_PORT", "5432"))
     SQLALCHEMY_DATABASE_URI: Optional[str] = os.getenv("DATABASE_URL")
+    # Логировать SQL-запросы
+    DATABASE_ECHO: bool = os.getenv("DATABASE_ECHO", "true").lower() == "true"
     
-    # Подключение к reidis
+    # Подключение к reidis. memory:// - Valkey в памяти процесса (fakeredis, для тестов)
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://valkey:6379/0")
 
 
@@ -30,6 +32,164 @@ class Settings(BaseSettings):
     LINK_EXPIRATION_DAYS: int = 180
     SHORT_CODE_LENGTH: int = 6
     
+    # Ограничение частоты запросов. Формат лимита: "<количество>/<second|minute|hour|day>",
+    # пустая строка отключает правило
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    # Алгоритм: "sliding_window" (журнал запросов в окне) или "token_bucket"
+    RATE_LIMIT_ALGORITHM: str = os.getenv("RATE_LIMIT_ALGORITHM", "sliding_window")
+    RATE_LIMIT_SHORTEN_ANON: str = os.getenv("RATE_LIMIT_SHORTEN_ANON", "20/minute")
+    RATE_LIMIT_SHORTEN_USER: str = os.getenv("RATE_LIMIT_SHORTEN_USER", "200/minute")
+    RATE_LIMIT_AUTH: str = os.getenv("RATE_LIMIT_AUTH", "10/minute")
+    # QR-коды: отрисовка нагружает пул процессов, а эндпоинт доступен без входа
+    RATE_LIMIT_QR_ANON: str = os.getenv("RATE_LIMIT_QR_ANON", "60/minute")
+    RATE_LIMIT_QR_USER: str = os.getenv("RATE_LIMIT_QR_USER", "600/minute")
+    # Редиректы по умолчанию не ограничиваются: за общим прокси или NAT один IP у многих клиентов
+    RATE_LIMIT_REDIRECT: str = os.getenv("RATE_LIMIT_REDIRECT", "")
+    # Сколько разрешений процесс забирает из Valkey за один запрос и расходует локально
+    RATE_LIMIT_LOCAL_BATCH: int = int(os.getenv("RATE_LIMIT_LOCAL_BATCH", "10"))
+    # Сколько доверенных прокси (балансировщик Render и т.п.) стоит перед сервисом. Каждый
+    # дописывает адрес своего клиента в конец X-Forwarded-For, поэтому IP клиента - адрес,
+    # записанный самым внешним доверенным прокси; левее него - значения, присланные клиентом.
+    # 0 - X-Forwarded-For не используется, IP берется из соединения
+    RATE_LIMIT_TRUSTED_PROXIES: int = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+
+    # Кэш редиректов: максимальное время жизни записи и время жизни "надгробия"
+    # после изменения/удаления ссылки (секунды)
+    LINK_CACHE_TTL: int = int(os.getenv("LINK_CACHE_TTL", "3600"))
+    LINK_CACHE_TOMBSTONE_TTL: int = int(os.getenv("LINK_CACHE_TOMBSTONE_TTL", "60"))
+
+    # Тип редиректа новых ссылок (301, 302, 307 или 308) и Cache-Control постоянных
+    # редиректов 301/308 (секунды): их кэширует CDN, а клики учитываются из логов CDN
+    REDIRECT_DEFAULT_TYPE: int = int(os.getenv("REDIRECT_DEFAULT_TYPE", "307"))
+    REDIRECT_PERMANENT_MAX_AGE: int = int(os.getenv("REDIRECT_PERMANENT_MAX_AGE", "86400"))
+
+    # Горячие ссылки: сколько кодов отслеживать, сколько запросов за окно (секунды)
+    # делает ссылку горячей, на сколько секунд закреплять ее URL в памяти процесса
+    # и как часто сбрасывать накопленные клики горячих ссылок в БД
+    HOT_LINK_CAPACITY: int = int(os.getenv("HOT_LINK_CAPACITY", "256"))
+    HOT_LINK_THRESHOLD: int = int(os.getenv("HOT_LINK_THRESHOLD", "100"))
+    HOT_LINK_WINDOW: int = int(os.getenv("HOT_LINK_WINDOW", "10"))
+    HOT_LINK_PIN_TTL: int = int(os.getenv("HOT_LINK_PIN_TTL", "30"))
+    HOT_LINK_FLUSH_INTERVAL: float = float(os.getenv("HOT_LINK_FLUSH_INTERVAL", "1.0"))
+
+    # Время жизни кэша ответов /links/{short_code} и /links/{short_code}/stats (секунды)
+    LINK_RESPONSE_CACHE_TTL: int = int(os.getenv("LINK_RESPONSE_CACHE_TTL", "10"))
+
+    # Максимальное количество кодов в одном запросе POST /links/stats/batch
+    BATCH_STATS_MAX_CODES: int = int(os.getenv("BATCH_STATS_MAX_CODES", "5000"))
+
+    # Собственные домены: как часто проверять изменения таблицы доменов (секунды)
+    # и схема для коротких ссылок на собственных доменах
+    DOMAIN_RELOAD_INTERVAL: float = float(os.getenv("DOMAIN_RELOAD_INTERVAL", "5"))
+    CUSTOM_DOMAIN_SCHEME: str = os.getenv("CUSTOM_DOMAIN_SCHEME", "https")
+
+    # Секционирование таблицы link в PostgreSQL: число HASH-секций по short_code
+    # (0 - обычная таблица). Менять на существующей БД - через app.tools.partition_links
+    LINK_PARTITIONS: int = int(os.getenv("LINK_PARTITIONS", "0"))
+    # Переносить деактивированные истекшие ссылки в архив link_archive (секции по месяцам
+    # expires_at) - это делает проход фоновой задачи истечения раз в EXPIRY_SWEEP_INTERVAL
+    LINK_ARCHIVE_EXPIRED: bool = os.getenv("LINK_ARCHIVE_EXPIRED", "false").lower() == "true"
+
+    # Шардирование ссылок: адреса БД шардов через запятую (пусто - все в основной БД).
+    # Пользователи и домены остаются в основной БД
+    SHARD_DATABASE_URLS: str = os.getenv("SHARD_DATABASE_URLS", "")
+
+    # Edge-узел редиректов: отвечает на GET /{short_code} из локального снимка ссылок
+    # (SQLite) без обращений к Postgres и Valkey. Снимок обновляется лентой изменений
+    # основного сервиса EDGE_PRIMARY_URL, клики отправляются раз в EDGE_SYNC_INTERVAL секунд.
+    # EDGE_SYNC_SECRET - общий секрет edge-узлов и основного сервиса (пусто - /edge отключен)
+    EDGE_MODE: bool = os.getenv("EDGE_MODE", "false").lower() == "true"
+    EDGE_STORE_PATH: str = os.getenv("EDGE_STORE_PATH", "edge_links.db")
+    EDGE_PRIMARY_URL: str = os.getenv("EDGE_PRIMARY_URL", "")
+    EDGE_SYNC_SECRET: str = os.getenv("EDGE_SYNC_SECRET", "")
+    EDGE_SYNC_INTERVAL: float = float(os.getenv("EDGE_SYNC_INTERVAL", "2.0"))
+    EDGE_SYNC_BATCH: int = int(os.getenv("EDGE_SYNC_BATCH", "5000"))
+    # Как часто перечитывать снимок целиком (секунды). Изменения между полными
+    # синхронизациями приходят из ленты изменений, так что это лишь страховка
+    EDGE_FULL_SYNC_INTERVAL: float = float(os.getenv("EDGE_FULL_SYNC_INTERVAL", "3600"))
+
+    # Лента изменений ссылок: события из outbox (таблица link_event) реле публикует
+    # в поток Valkey OUTBOX_STREAM (не длиннее OUTBOX_STREAM_MAXLEN записей).
+    # Опубликованные события удаляются из таблицы через OUTBOX_RETENTION_HOURS часов
+    OUTBOX_STREAM: str = os.getenv("OUTBOX_STREAM", "links:changes")
+    OUTBOX_STREAM_MAXLEN: int = int(os.getenv("OUTBOX_STREAM_MAXLEN", "1000000"))
+    OUTBOX_RELAY_INTERVAL: float = float(os.getenv("OUTBOX_RELAY_INTERVAL", "0.2"))
+    OUTBOX_RELAY_BATCH: int = int(os.getenv("OUTBOX_RELAY_BATCH", "500"))
+    OUTBOX_RETENTION_HOURS: int = int(os.getenv("OUTBOX_RETENTION_HOURS", "72"))
+    # Максимальное ожидание long-poll запроса GET /links/changes (секунды)
+    LINK_CHANGES_MAX_WAIT: float = float(os.getenv("LINK_CHANGES_MAX_WAIT", "25"))
+
+    # Истечение ссылок (app.workers.expiry): как часто проверять расписание (секунды),
+    # на сколько вперед держать сроки в расписании Valkey, как часто искать
+    # пропущенные истекшие ссылки в БД и сколько ссылок обрабатывать за раз
+    EXPIRY_TICK: float = float(os.getenv("EXPIRY_TICK", "0.5"))
+    EXPIRY_HORIZON: float = float(os.getenv("EXPIRY_HORIZON", "3600"))
+    EXPIRY_SWEEP_INTERVAL: float = float(os.getenv("EXPIRY_SWEEP_INTERVAL", "60"))
+    EXPIRY_BATCH: int = int(os.getenv("EXPIRY_BATCH", "1000"))
+
+    # Проверка адресов назначения ссылок (app.workers.probe), по умолчанию выключена.
+    # Базовый интервал проверки (секунды) уменьшается с числом кликов до PROBE_MIN_INTERVAL;
+    # неудачная проверка повторяется через PROBE_RETRY_INTERVAL, после PROBE_DEAD_AFTER
+    # неудач подряд адрес считается недоступным и проверяется реже, до PROBE_MAX_INTERVAL.
+    # PROBE_CONCURRENCY - одновременных запросов всего, PROBE_PER_HOST - к одному хосту.
+    # Адреса во внутренних сетях не проверяются без PROBE_ALLOW_PRIVATE=true
+    PROBE_ENABLED: bool = os.getenv("PROBE_ENABLED", "false").lower() == "true"
+    PROBE_INTERVAL: float = float(os.getenv("PROBE_INTERVAL", "21600"))
+    PROBE_MIN_INTERVAL: float = float(os.getenv("PROBE_MIN_INTERVAL", "600"))
+    PROBE_MAX_INTERVAL: float = float(os.getenv("PROBE_MAX_INTERVAL", "86400"))
+    PROBE_RETRY_INTERVAL: float = float(os.getenv("PROBE_RETRY_INTERVAL", "300"))
+    PROBE_DEAD_AFTER: int = int(os.getenv("PROBE_DEAD_AFTER", "3"))
+    PROBE_CONCURRENCY: int = int(os.getenv("PROBE_CONCURRENCY", "20"))
+    PROBE_PER_HOST: int = int(os.getenv("PROBE_PER_HOST", "2"))
+    PROBE_TIMEOUT: float = float(os.getenv("PROBE_TIMEOUT", "10"))
+    PROBE_BATCH: int = int(os.getenv("PROBE_BATCH", "200"))
+    PROBE_DISCOVER_INTERVAL: float = float(os.getenv("PROBE_DISCOVER_INTERVAL", "3600"))
+    PROBE_ALLOW_PRIVATE: bool = os.getenv("PROBE_ALLOW_PRIVATE", "false").lower() == "true"
+    PROBE_USER_AGENT: str = os.getenv("PROBE_USER_AGENT", "url-cutter-probe/1.0")
+
+    # Статистика для администраторов (app.workers.aggregates): как часто пересчитывать
+    # агрегаты (секунды), сколько часов истории созданий хранить, размер топов,
+    # ограничение времени запроса пересчета и запроса эндпоинтов /admin/stats (мс)
+    AGGREGATES_REFRESH_INTERVAL: float = float(os.getenv("AGGREGATES_REFRESH_INTERVAL", "300"))
+    AGGREGATES_HOURS: int = int(os.getenv("AGGREGATES_HOURS", str(24 * 30)))
+    AGGREGATES_TOP: int = int(os.getenv("AGGREGATES_TOP", "1000"))
+    AGGREGATES_QUERY_TIMEOUT_MS: int = int(os.getenv("AGGREGATES_QUERY_TIMEOUT_MS", "60000"))
+    ADMIN_STATS_TIMEOUT_MS: int = int(os.getenv("ADMIN_STATS_TIMEOUT_MS", "200"))
+
+    # QR-коды коротких ссылок (app.core.qr): каталог дискового кэша (пусто - только память)
+    # и его предельный объем (байты; при превышении удаляются давно не читавшиеся картинки),
+    # объем кэша в памяти процесса (байты), число процессов отрисовки,
+    # параметры картинки по умолчанию (из qr.SCALES и qr.BORDERS) и max-age ответа
+    # (картинка по URL не меняется)
+    QR_CACHE_DIR: str = os.getenv("QR_CACHE_DIR", "qr_cache")
+    QR_CACHE_DIR_BYTES: int = int(os.getenv("QR_CACHE_DIR_BYTES", str(256 * 1024 * 1024)))
+    QR_MEMORY_CACHE_BYTES: int = int(os.getenv("QR_MEMORY_CACHE_BYTES", str(32 * 1024 * 1024)))
+    QR_RENDER_WORKERS: int = int(os.getenv("QR_RENDER_WORKERS", "2"))
+    QR_DEFAULT_SCALE: int = int(os.getenv("QR_DEFAULT_SCALE", "8"))
+    QR_DEFAULT_BORDER: int = int(os.getenv("QR_DEFAULT_BORDER", "4"))
+    QR_MAX_AGE: int = int(os.getenv("QR_MAX_AGE", str(365 * 24 * 3600)))
+
+    # Профилирование запросов (app.core.profiling): сохраняется доля PROFILING_SAMPLE_RATE
+    # запросов и все запросы дольше PROFILING_SLOW_MS (0 - без порога)
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+    PROFILING_SLOW_MS: float = float(os.getenv("PROFILING_SLOW_MS", "500"))
+    # Период снятия стека event loop
+    PROFILING_STACK_INTERVAL_MS: float = float(os.getenv("PROFILING_STACK_INTERVAL_MS", "5"))
+    # Каталог с профилями и сколько последних профилей в нем хранить
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", "profiles")
+    PROFILING_MAX_FILES: int = int(os.getenv("PROFILING_MAX_FILES", "500"))
+    # Сколько SQL-запросов и команд Valkey одного запроса сохранять подробно
+    PROFILING_MAX_EVENTS: int = int(os.getenv("PROFILING_MAX_EVENTS", "500"))
+
+    # Запускать фоновые задачи по расписанию (реле outbox, истечение ссылок, статистика,
+    # проверка адресов). Тесты выключают их и вызывают проходы задач сами
+    BACKGROUND_WORKERS: bool = os.getenv("BACKGROUND_WORKERS", "true").lower() == "true"
+
+    # Создавать таблицы при старте приложения. По умолчанию выключено: таблицы
+    # создает шаг деплоя `python -m app.db.init_db`, а инстанс стартует без DDL
+    INIT_DB_ON_STARTUP: bool = os.getenv("INIT_DB_ON_STARTUP", "false").lower() == "true"
+
     # Основной URL
     BASE_URL: str = os.getenv("BASE_URL", "http://localhost:8000")
     
@@ -39,6 +199,10 @@ class Settings(BaseSettings):
             return self.SQLALCHEMY_DATABASE_URI
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
     
+    @property
+    def SHARD_URLS(self) -> List[str]:
+        return [url.strip() for url in self.SHARD_DATABASE_URLS.split(",") if url.strip()]
+    
     class Config:
         case_sensitive = True
 
@@ -2,15 +2,14 @@ from typing import Generator, Optional
 
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.db.session import get_db
 from app.db.redis import get_redis
-from app.core.config import settings
-from app.core.security import pwd_context
+from app.core.security import decode_access_token
+from app.core.tenants import host_table
 from app.models.user import User
 from app.schemas.token import TokenPayload
 
@@ -33,11 +32,9 @@ async def get_current_user(
         )
     
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
+        payload = decode_access_token(token)
         token_data = TokenPayload(**payload)
-    except (jwt.JWTError, ValidationError):
+    except (ValueError, ValidationError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
@@ -72,6 +69,20 @@ def get_current_active_superuser(
     return current_user
 
 
+# ID пользователя из токена без обращения к БД - для ключей лимитов и кэшей
+def get_token_user_id(
+    token: Optional[str] = Depends(reusable_oauth2),
+) -> Optional[int]:
+    if not token:
+        return None
+
+    try:
+        payload = decode_access_token(token)
+        return TokenPayload(**payload).sub
+    except (ValueError, ValidationError):
+        return None
+
+
 # Опциональная зависимость текущего пользователя - для ссылок, которые могут создаваться анонимно
 async def get_optional_current_user(
     db: AsyncSession = Depends(get_db),
@@ -81,11 +92,9 @@ async def get_optional_current_user(
         return None
         
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
+        payload = decode_access_token(token)
         token_data = TokenPayload(**payload)
-    except (jwt.JWTError, ValidationError):
+    except (ValueError, ValidationError):
         return None
     
     result = await db.execute(select(User).where(User.id == token_data.sub))
@@ -95,3 +104,8 @@ async def get_optional_current_user(
         return None
     
     return user
+
+
+def get_request_domain_id(request: Request) -> Optional[int]:
+    """ID собственного домена по заголовку Host (None - основной домен)"""
+    return host_table.resolve(request.headers.get("host"))
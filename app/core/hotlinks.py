@@ -0,0 +1,221 @@
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.redirects import Redirect
+
+
+class _Bucket:
+    """Корзина Stream-Summary: элементы с одинаковым счетчиком"""
+
+    __slots__ = ("count", "items", "prev", "next")
+
+    def __init__(self, count: int, prev: Optional["_Bucket"], next: Optional["_Bucket"]):
+        self.count = count
+        # dict как упорядоченное множество: вытесняется элемент, дольше всех бывший в корзине
+        self.items: Dict[Hashable, None] = {}
+        self.prev = prev
+        self.next = next
+
+
+class SpaceSaving:
+    """
+    Алгоритм Space-Saving для поиска самых частых элементов потока в памяти O(capacity).
+
+    Для каждого отслеживаемого кода хранится счетчик и верхняя граница ошибки:
+    новый код вытесняет код с минимальным счетчиком и наследует его значение.
+    Гарантированное число появлений кода - `count - error`.
+
+    Счетчики хранятся в структуре Stream-Summary: двусвязный список корзин по
+    возрастанию счетчика. Увеличение счетчика переносит элемент в соседнюю корзину,
+    а кандидат на вытеснение берется из первой - обе операции O(1), без поиска
+    минимума среди всех отслеживаемых кодов.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.errors: Dict[Hashable, int] = {}
+        self._buckets: Dict[Hashable, _Bucket] = {}
+        # Корзины с минимальным и максимальным счетчиком
+        self._head: Optional[_Bucket] = None
+        self._tail: Optional[_Bucket] = None
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self._buckets
+
+    def count(self, item: Hashable) -> int:
+        bucket = self._buckets.get(item)
+        return bucket.count if bucket is not None else 0
+
+    def offer(self, item: Hashable) -> int:
+        """Учитывает появление элемента и возвращает гарантированное число его появлений"""
+        bucket = self._buckets.get(item)
+        if bucket is not None:
+            return self._increment(item, bucket) - self.errors[item]
+        if len(self._buckets) < self.capacity:
+            head = self._head
+            if head is None or head.count != 1:
+                head = self._link(1, None, head)
+            head.items[item] = None
+            self._buckets[item] = head
+            self.errors[item] = 0
+            return 1
+        # Новый элемент занимает место элемента с минимальным счетчиком
+        head = self._head
+        victim = next(iter(head.items))
+        del head.items[victim]
+        del self._buckets[victim]
+        del self.errors[victim]
+        head.items[item] = None
+        self._buckets[item] = head
+        self.errors[item] = head.count
+        self._increment(item, head)
+        return 1
+
+    def _increment(self, item: Hashable, bucket: _Bucket) -> int:
+        count = bucket.count + 1
+        target = bucket.next
+        if target is None or target.count != count:
+            target = self._link(count, bucket, target)
+        del bucket.items[item]
+        target.items[item] = None
+        self._buckets[item] = target
+        if not bucket.items:
+            self._unlink(bucket)
+        return count
+
+    def _link(self, count: int, prev: Optional[_Bucket], next: Optional[_Bucket]) -> _Bucket:
+        bucket = _Bucket(count, prev, next)
+        if prev is None:
+            self._head = bucket
+        else:
+            prev.next = bucket
+        if next is None:
+            self._tail = bucket
+        else:
+            next.prev = bucket
+        return bucket
+
+    def _unlink(self, bucket: _Bucket) -> None:
+        if bucket.prev is None:
+            self._head = bucket.next
+        else:
+            bucket.prev.next = bucket.next
+        if bucket.next is None:
+            self._tail = bucket.prev
+        else:
+            bucket.next.prev = bucket.prev
+
+    def decay(self) -> None:
+        """Делит все счетчики пополам, чтобы старые всплески постепенно забывались"""
+        bucket = self._head
+        self._head = self._tail = None
+        self._buckets = {}
+        while bucket is not None:
+            count = bucket.count // 2
+            if count:
+                # Соседние счетчики 2k и 2k+1 попадают в одну корзину
+                target = self._tail
+                if target is None or target.count != count:
+                    target = self._link(count, target, None)
+                for item in bucket.items:
+                    target.items[item] = None
+                    self._buckets[item] = target
+                    self.errors[item] //= 2
+            else:
+                for item in bucket.items:
+                    del self.errors[item]
+            bucket = bucket.next
+
+    def top(self, limit: int) -> List[Tuple[Hashable, int, int]]:
+        """Топ элементов: (элемент, оценка, ошибка)"""
+        result = []
+        bucket = self._tail
+        while bucket is not None and len(result) < limit:
+            for item in bucket.items:
+                result.append((item, bucket.count, self.errors[item]))
+                if len(result) == limit:
+                    break
+            bucket = bucket.prev
+        return result
+
+
+class HotLinkTracker:
+    """
+    Отслеживает частоту редиректов по кодам и держит редиректы популярных ссылок
+    (URL и тип) в памяти процесса. Ссылки различаются парой (domain_id, short_code).
+
+    Состояние локально для воркера: закрепленная запись может пережить
+    изменение ссылки в другом процессе не дольше HOT_LINK_PIN_TTL секунд.
+    """
+
+    def __init__(self, capacity: int, threshold: int, window: float, pin_ttl: float):
+        self.sketch = SpaceSaving(capacity)
+        self.threshold = threshold
+        self.window = window
+        self.pin_ttl = pin_ttl
+        self._pinned: Dict[Tuple[Optional[int], str], Tuple[Redirect, float]] = {}
+        self._next_decay = time.monotonic() + window
+
+    def record(self, short_code: str, domain_id: Optional[int] = None) -> bool:
+        """Учитывает запрос к коду и возвращает, является ли ссылка горячей"""
+        now = time.monotonic()
+        if now >= self._next_decay:
+            self.sketch.decay()
+            self._next_decay = now + self.window
+            # Заодно выбрасываем просроченные и остывшие закрепления
+            sketch = self.sketch
+            self._pinned = {
+                link: entry for link, entry in self._pinned.items()
+                if entry[1] > now and link in sketch
+            }
+        return self.sketch.offer((domain_id, short_code)) >= self.threshold
+
+    def get_pinned(self, short_code: str, domain_id: Optional[int] = None) -> Optional[Redirect]:
+        entry = self._pinned.get((domain_id, short_code))
+        if entry is None:
+            return None
+        redirect, expires = entry
+        if expires <= time.monotonic():
+            del self._pinned[(domain_id, short_code)]
+            return None
+        return redirect
+
+    def pin(
+        self, short_code: str, redirect: Redirect, ttl: Optional[float] = None, domain_id: Optional[int] = None
+    ) -> None:
+        ttl = self.pin_ttl if ttl is None else min(ttl, self.pin_ttl)
+        if ttl > 0:
+            self._pinned[(domain_id, short_code)] = (redirect, time.monotonic() + ttl)
+
+    def unpin(self, short_code: str, domain_id: Optional[int] = None) -> None:
+        self._pinned.pop((domain_id, short_code), None)
+
+    def clear(self) -> None:
+        """Забывает все счетчики и закрепления (между тестами)"""
+        self.sketch = SpaceSaving(self.sketch.capacity)
+        self._pinned = {}
+
+    def top(self, limit: int = 20) -> List[dict]:
+        return [
+            {
+                "short_code": link[1],
+                "domain_id": link[0],
+                "count": count,
+                "error": error,
+                "hot": count - error >= self.threshold,
+                "pinned": link in self._pinned,
+            }
+            for link, count, error in self.sketch.top(limit)
+        ]
+
+
+hot_links = HotLinkTracker(
+    capacity=settings.HOT_LINK_CAPACITY,
+    threshold=settings.HOT_LINK_THRESHOLD,
+    window=settings.HOT_LINK_WINDOW,
+    pin_ttl=settings.HOT_LINK_PIN_TTL,
+)
@@ -0,0 +1,387 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Профилирование отдельных запросов в продакшене. ProfilingMiddleware сохраняет
+# долю запросов (PROFILING_SAMPLE_RATE) и все запросы дольше PROFILING_SLOW_MS:
+# время запроса, его SQL-запросы и команды Valkey с длительностью и стеки event loop,
+# снятые во время запроса. Профили пишутся в каталог PROFILING_DIR (хранятся
+# последние PROFILING_MAX_FILES) и доступны через /admin/profiles.
+#
+# Запросы в воркере выполняются в одном event loop, поэтому стеки за время запроса
+# включают и работу параллельных запросов - их максимальное число сохраняется в
+# профиле (concurrency). SQL и команды Valkey привязаны к запросу точно (contextvar).
+
+_PROFILE_ID = re.compile(r"[0-9]+-[0-9a-f]+").fullmatch
+_STACK_DEPTH = 64
+
+
+class Capture:
+    """SQL-запросы и команды Valkey одного запроса"""
+
+    __slots__ = ("started", "sql", "valkey", "sql_count", "sql_ms", "valkey_count", "valkey_ms", "concurrency")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.sql: List[Dict[str, Any]] = []
+        self.valkey: List[Dict[str, Any]] = []
+        self.sql_count = 0
+        self.sql_ms = 0.0
+        self.valkey_count = 0
+        self.valkey_ms = 0.0
+        self.concurrency = 1
+
+    def add_sql(self, statement: str, started: float, elapsed_ms: float, rows: int) -> None:
+        self.sql_count += 1
+        self.sql_ms += elapsed_ms
+        if len(self.sql) < settings.PROFILING_MAX_EVENTS:
+            self.sql.append({
+                "at_ms": round((started - self.started) * 1000, 3),
+                "ms": round(elapsed_ms, 3),
+                "statement": statement[:1000],
+                "rows": rows,
+            })
+
+    def add_valkey(self, commands: List[str], started: float, elapsed_ms: float) -> None:
+        self.valkey_count += 1
+        self.valkey_ms += elapsed_ms
+        if len(self.valkey) < settings.PROFILING_MAX_EVENTS:
+            self.valkey.append({
+                "at_ms": round((started - self.started) * 1000, 3),
+                "ms": round(elapsed_ms, 3),
+                "commands": commands,
+            })
+
+
+_capture: ContextVar[Optional[Capture]] = ContextVar("profiling_capture", default=None)
+
+
+# SQL: события курсора любого движка (основная БД и шарды). Параметры запросов не сохраняются
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _capture.get() is not None:
+        conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    capture = _capture.get()
+    if capture is None:
+        return
+    stack = conn.info.get("profiling_started")
+    if not stack:
+        return
+    started = stack.pop()
+    rows = cursor.rowcount if cursor.rowcount is not None else -1
+    capture.add_sql(statement, started, (time.perf_counter() - started) * 1000, rows)
+
+
+def _command_name(args: tuple) -> str:
+    # Имя команды и первый аргумент (обычно ключ); значения не сохраняются
+    if not args:
+        return ""
+    if len(args) == 1:
+        return str(args[0])
+    return f"{args[0]} {str(args[1])[:100]}"
+
+
+def instrument_valkey(client) -> None:
+    """
+    Замеряет команды и конвейеры клиента Valkey, выполненные внутри профилируемого
+    запроса. `client` - сам клиент valkey, а не обертка ValkeyClient: его команды
+    (get, set, evalsha Lua-скриптов...) вызывают execute_command экземпляра
+    """
+    if getattr(client, "_profiling_instrumented", False):
+        return
+    execute_command = client.execute_command
+    pipeline = client.pipeline
+
+    async def timed_execute_command(*args, **options):
+        capture = _capture.get()
+        if capture is None:
+            return await execute_command(*args, **options)
+        started = time.perf_counter()
+        try:
+            return await execute_command(*args, **options)
+        finally:
+            capture.add_valkey([_command_name(args)], started, (time.perf_counter() - started) * 1000)
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        async def timed_execute(*execute_args, **execute_kwargs):
+            capture = _capture.get()
+            if capture is None:
+                return await execute(*execute_args, **execute_kwargs)
+            commands = [_command_name(command_args) for command_args, _ in pipe.command_stack]
+            started = time.perf_counter()
+            try:
+                return await execute(*execute_args, **execute_kwargs)
+            finally:
+                capture.add_valkey(commands, started, (time.perf_counter() - started) * 1000)
+
+        pipe.execute = timed_execute
+        return pipe
+
+    client.execute_command = timed_execute_command
+    client.pipeline = timed_pipeline
+    client._profiling_instrumented = True
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename
+    marker = path.rfind("site-packages" + os.sep)
+    if marker >= 0:
+        path = path[marker + len("site-packages") + 1:]
+    elif path.startswith(os.getcwd()):
+        path = os.path.relpath(path)
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Снимает стек потока event loop каждые `interval_ms` из отдельного потока, пока
+    идет хотя бы один профилируемый запрос. Стеки хранятся в кольцевом буфере с
+    временем снятия, профиль запроса забирает стеки своего интервала.
+    """
+
+    def __init__(self, interval_ms: float, history_seconds: float = 60):
+        self.interval = interval_ms / 1000
+        self._samples: deque = deque(maxlen=max(int(history_seconds / self.interval), 1))
+        self._labels: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+        self._active = 0
+        self._target: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def enter(self) -> int:
+        self._active += 1
+        return self._active
+
+    def leave(self) -> None:
+        self._active -= 1
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def _stack(self, frame) -> str:
+        labels = []
+        while frame is not None and len(labels) < _STACK_DEPTH:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return ";".join(labels)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            if self._active <= 0:
+                continue
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                stack = self._stack(frame)
+                with self._lock:
+                    self._samples.append((time.perf_counter(), stack, self._active))
+            del frame
+
+    def collect(self, started: float, finished: float) -> Tuple[Counter, int]:
+        """
+        Стеки, снятые в интервале [started, finished], в свернутом виде (стек -> число)
+        и наибольшее число одновременных профилируемых запросов в этом интервале
+        """
+        stacks: Counter = Counter()
+        peak = 0
+        with self._lock:
+            for at, stack, active in reversed(self._samples):
+                if at < started:
+                    break
+                if at <= finished:
+                    stacks[stack] += 1
+                    peak = max(peak, active)
+        return stacks, peak
+
+    def start(self) -> None:
+        # Вызывается из потока event loop: его стек и снимается
+        if self._thread is None:
+            self._target = threading.get_ident()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+
+class ProfileStore:
+    """Профили в каталоге, по файлу на запрос; хранятся последние `max_files`"""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+
+    def _files(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+    def save(self, profile: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{profile['id']}.json")
+        with open(path + ".tmp", "wb") as file:
+            file.write(orjson.dumps(profile))
+        os.replace(path + ".tmp", path)
+        files = self._files()
+        for name in files[:max(len(files) - self.max_files, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # Тот же каталог чистит другой воркер
+                pass
+
+    def load(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if not _PROFILE_ID(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.json"), "rb") as file:
+                return orjson.loads(file.read())
+        except FileNotFoundError:
+            return None
+
+    def recent(self, limit: int) -> List[Dict[str, Any]]:
+        """Последние профили без подробностей, новые первыми"""
+        summaries = []
+        for name in reversed(self._files()):
+            if len(summaries) >= limit:
+                break
+            profile = self.load(name[:-len(".json")])
+            if profile is not None:
+                summaries.append({
+                    key: value for key, value in profile.items() if key not in ("sql", "valkey", "stacks")
+                })
+        return summaries
+
+
+def folded(profile: Dict[str, Any]) -> str:
+    """Стеки профиля в формате flamegraph.pl / speedscope (строка "стек число")"""
+    return "".join(f"{stack} {count}\n" for stack, count in profile.get("stacks", {}).items())
+
+
+class ProfilingMiddleware:
+    """
+    ASGI-обработчик, профилирующий запросы. Стоит первым, чтобы учитывать время
+    всех остальных обработчиков (включая быстрые редиректы).
+    """
+
+    def __init__(self, app, sampler: Optional[StackSampler] = None, store: Optional[ProfileStore] = None):
+        self.app = app
+        self.sampler = sampler or stack_sampler
+        self.store = store or profile_store
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.slow_seconds = settings.PROFILING_SLOW_MS / 1000
+        self._pending = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        sampled = random.random() < self.sample_rate
+        if not sampled and self.slow_seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        status = 0
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        capture = Capture(time.perf_counter())
+        token = _capture.set(capture)
+        capture.concurrency = self.sampler.enter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            finished = time.perf_counter()
+            capture.concurrency = max(capture.concurrency, self.sampler.active)
+            self.sampler.leave()
+            _capture.reset(token)
+            duration = finished - capture.started
+            if sampled or duration >= self.slow_seconds:
+                self._save(scope, status, capture, finished, "sample" if sampled else "slow")
+
+    def _save(self, scope, status: int, capture: Capture, finished: float, reason: str) -> None:
+        stacks, peak = self.sampler.collect(capture.started, finished)
+        profile = {
+            "id": f"{time.time_ns() // 1000}-{uuid.uuid4().hex[:8]}",
+            "at": time.time(),
+            "reason": reason,
+            "pid": os.getpid(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round((finished - capture.started) * 1000, 3),
+            "concurrency": max(capture.concurrency, peak),
+            "sql_count": capture.sql_count,
+            "sql_ms": round(capture.sql_ms, 3),
+            "valkey_count": capture.valkey_count,
+            "valkey_ms": round(capture.valkey_ms, 3),
+            "stack_interval_ms": self.sampler.interval * 1000,
+            "stack_samples": sum(stacks.values()),
+            "sql": capture.sql,
+            "valkey": capture.valkey,
+            "stacks": dict(stacks.most_common()),
+        }
+        # Запись на диск не задерживает ответ и не блокирует event loop
+        task = asyncio.create_task(asyncio.to_thread(self._write, profile))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _write(self, profile: Dict[str, Any]) -> None:
+        try:
+            self.store.save(profile)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить профиль запроса {profile['path']}: {e}")
+
+
+def install() -> None:
+    """Подключает замеры SQL и Valkey (вызывается один раз при PROFILING_ENABLED)"""
+    from app.db.redis import redis_client
+
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    if redis_client is not None:
+        # Клиент, подставленный позже через use_client, замеряется так же
+        redis_client.instrument(instrument_valkey)
+
+
+stack_sampler = StackSampler(settings.PROFILING_STACK_INTERVAL_MS)
+profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# QR-коды коротких ссылок. Картинка полностью определяется содержимым (короткий URL)
+# и параметрами отрисовки, поэтому кэш адресуется хэшем от них: запись никогда не
+# устаревает, а хэш служит и ETag. Кэш двухуровневый - LRU в памяти процесса
+# (не больше QR_MEMORY_CACHE_BYTES) и каталог QR_CACHE_DIR на диске, общий для воркеров
+# (не больше QR_CACHE_DIR_BYTES: вытесняются картинки, которые дольше всех не читали).
+# Отрисовка (segno, чистый Python) выполняется в пуле процессов, чтобы не занимать
+# event loop и GIL воркера.
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+# Допустимые размер модуля (пиксели) и ширина поля (модули): у ссылки не больше
+# len(FORMATS) * len(SCALES) * len(BORDERS) разных картинок
+SCALES = (4, 8, 16)
+BORDERS = (0, 2, 4)
+
+# Меняется вместе с параметрами отрисовки, чтобы не отдавать из кэша картинки старого вида
+_RENDER_VERSION = "1"
+
+
+def asset_key(content: str, fmt: str, scale: int, border: int) -> str:
+    return hashlib.blake2b(
+        f"{_RENDER_VERSION}|{fmt}|{scale}|{border}|{content}".encode(), digest_size=16
+    ).hexdigest()
+
+
+def render_sync(content: str, fmt: str, scale: int, border: int) -> bytes:
+    """Отрисовка QR-кода (выполняется в процессе пула)"""
+    import io
+
+    import segno
+
+    buffer = io.BytesIO()
+    # Уровень коррекции M: код остается читаемым при печати и небольших повреждениях
+    segno.make_qr(content, error="m").save(buffer, kind=fmt, scale=scale, border=border)
+    return buffer.getvalue()
+
+
+class QRCache:
+    def __init__(self, directory: str, memory_bytes: int, workers: int, disk_bytes: int = 0):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.workers = workers
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        # Сколько байт процесс записал на диск с последней проверки объема каталога;
+        # первая запись проверяет каталог сразу
+        self._written = disk_bytes
+        self._pruning = False
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._pool: Optional["ProcessPoolExecutor"] = None
+
+    def _path(self, key: str, fmt: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{fmt}")
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.memory_bytes:
+            return
+        if key not in self._memory:
+            self._memory_size += len(data)
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _read_file(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        # mtime файла - время последнего чтения, по нему _prune выбирает, что удалить
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write_file(self, path: str, data: bytes) -> None:
+        # Запись через временный файл: другой воркер не прочитает недописанную картинку
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _prune(self) -> int:
+        """
+        Если каталог больше disk_bytes, удаляет файлы с самым старым mtime, пока он
+        не уменьшится до 90% предела. Возвращает число удаленных файлов
+        """
+        files, total = [], 0
+        try:
+            subdirs = [entry.path for entry in os.scandir(self.directory) if entry.is_dir()]
+        except FileNotFoundError:
+            return 0
+        for subdir in subdirs:
+            try:
+                entries = list(os.scandir(subdir))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total <= self.disk_bytes:
+            return 0
+        files.sort()
+        target = self.disk_bytes * 0.9
+        removed = 0
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
+
+    async def _store(self, path: str, data: bytes) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_file, path, data)
+        if not self.disk_bytes:
+            return
+        self._written += len(data)
+        # Каталог общий для воркеров: каждый пересчитывает его, записав десятую часть предела
+        if self._written < self.disk_bytes // 10 or self._pruning:
+            return
+        self._pruning, self._written = True, 0
+        try:
+            removed = await loop.run_in_executor(None, self._prune)
+        finally:
+            self._pruning = False
+        if removed:
+            logger.info(f"Из дискового кэша QR-кодов удалено картинок: {removed}")
+
+    def _executor(self) -> "ProcessPoolExecutor":
+        if self._pool is None:
+            # Пул (и multiprocessing) нужен только при первой отрисовке
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # forkserver: не копировать в дочерние процессы потоки и соединения воркера
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._pool
+
+    async def _load(self, key: str, content: str, fmt: str, scale: int, border: int) -> bytes:
+        loop = asyncio.get_running_loop()
+        path = self._path(key, fmt)
+        if self.directory:
+            data = await loop.run_in_executor(None, self._read_file, path)
+            if data is not None:
+                return data
+        data = await loop.run_in_executor(self._executor(), render_sync, content, fmt, scale, border)
+        if self.directory:
+            try:
+                await self._store(path, data)
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить QR-код на диск: {e}")
+        return data
+
+    async def get(self, content: str, fmt: str, scale: int, border: int) -> Tuple[str, bytes]:
+        """(ключ, картинка): из памяти, с диска или отрисованная. Одновременные запросы одной картинки рисуют ее один раз"""
+        key = asset_key(content, fmt, scale, border)
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            return key, data
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = asyncio.ensure_future(self._load(key, content, fmt, scale, border))
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        data = await asyncio.shield(pending)
+        self._remember(key, data)
+        return key, data
+
+    async def prerender(self, contents: Iterable[str], formats: Iterable[str] = ("png",),
+                        scale: Optional[int] = None, border: Optional[int] = None) -> int:
+        """Заранее кладет в дисковый кэш QR-коды для списка коротких URL. Возвращает число картинок"""
+        scale = scale or settings.QR_DEFAULT_SCALE
+        border = settings.QR_DEFAULT_BORDER if border is None else border
+        jobs = [(content, fmt) for content in contents for fmt in formats]
+        # Очередь к пулу не больше двух задач на процесс
+        slots = asyncio.Semaphore(self.workers * 2)
+
+        async def run(content: str, fmt: str) -> None:
+            async with slots:
+                await self._load(asset_key(content, fmt, scale, border), content, fmt, scale, border)
+
+        await asyncio.gather(*(run(content, fmt) for content, fmt in jobs))
+        return len(jobs)
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+qr_cache = QRCache(
+    directory=settings.QR_CACHE_DIR,
+    memory_bytes=settings.QR_MEMORY_CACHE_BYTES,
+    workers=settings.QR_RENDER_WORKERS,
+    disk_bytes=settings.QR_CACHE_DIR_BYTES,
+)
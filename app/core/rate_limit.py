@@ -0,0 +1,248 @@
+import logging
+import math
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+
+from app.core.config import settings
+from app.core.deps import get_token_user_id
+from app.db.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Максимум ключей в локальном состоянии процесса, после чего оно сбрасывается
+_MAX_LOCAL_KEYS = 100_000
+
+# Журнал запросов в скользящем окне. Время берется у сервера Valkey,
+# чтобы все воркеры считали по одним часам.
+# KEYS[1] - ключ, ARGV: окно (мс), лимит, сколько разрешений забрать, префикс члена,
+# префикс прошлой аренды процесса и сколько ее разрешений осталось неизрасходованными -
+# они убираются из окна, чтобы считались только настоящие запросы
+SLIDING_WINDOW_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local refund = tonumber(ARGV[6])
+for i = 1, refund do
+    redis.call('ZREM', KEYS[1], ARGV[5] .. ':' .. i)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local used = redis.call('ZCARD', KEYS[1])
+local granted = math.min(cost, limit - used)
+if granted <= 0 then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    local retry = window
+    if oldest[2] then
+        retry = tonumber(oldest[2]) + window - now
+    end
+    return {0, retry}
+end
+for i = 1, granted do
+    redis.call('ZADD', KEYS[1], now, ARGV[4] .. ':' .. i)
+end
+redis.call('PEXPIRE', KEYS[1], window)
+return {granted, 0}
+"""
+
+# Token bucket: корзина на `limit` токенов, которая наполняется за `window` мс.
+# ARGV - как у SLIDING_WINDOW_LUA; неизрасходованные токены прошлой аренды возвращаются в корзину
+TOKEN_BUCKET_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or limit
+local ts = tonumber(data[2]) or now
+tokens = math.min(limit, tokens + (now - ts) * limit / window + tonumber(ARGV[6]))
+local granted = math.min(cost, math.floor(tokens))
+if granted <= 0 then
+    return {0, math.ceil((1 - tokens) * window / limit)}
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - granted), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], window)
+return {granted, 0}
+"""
+
+
+@dataclass(frozen=True)
+class Rate:
+    limit: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> Optional["Rate"]:
+        """Разбирает строку вида "20/minute"; пустая строка означает "без лимита" """
+        if not value:
+            return None
+        count, _, period = value.partition("/")
+        return cls(limit=int(count), period=_PERIODS[period.strip()])
+
+
+class _LocalState:
+    __slots__ = ("tokens", "expires_at", "blocked_until", "lease")
+
+    def __init__(self) -> None:
+        self.tokens = 0
+        self.expires_at = 0.0
+        self.blocked_until = 0.0
+        # Префикс членов текущей аренды в окне Valkey
+        self.lease = ""
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов поверх атомарных Lua-скриптов Valkey.
+
+    Чтобы не ходить в сеть на каждый запрос, процесс забирает из Valkey сразу
+    несколько разрешений и расходует их локально, а после отказа запоминает,
+    до какого момента ключ заблокирован. Разрешения, не израсходованные до
+    конца аренды, возвращаются следующим обращением к Valkey по этому ключу:
+    редкие запросы не должны расходовать лимит целыми пачками. Без Valkey (или при его ошибке)
+    работает локальный token bucket в памяти процесса.
+    """
+
+    def __init__(self, client, algorithm: str = "sliding_window", batch: int = 10):
+        self.client = client
+        self.algorithm = algorithm
+        self.batch = batch
+        self._local: Dict[str, _LocalState] = {}
+        self._fallback: Dict[str, Tuple[float, float]] = {}
+        self._script = None
+        if client is not None:
+            lua = TOKEN_BUCKET_LUA if algorithm == "token_bucket" else SLIDING_WINDOW_LUA
+            self._script = client.register_script(lua)
+
+    def _lease_size(self, rate: Rate) -> int:
+        # Для маленьких лимитов (например, логин) считаем каждый запрос точно
+        return max(1, min(self.batch, rate.limit // 10))
+
+    async def hit(self, key: str, rate: Rate) -> Tuple[bool, float]:
+        """Учитывает один запрос. Возвращает (разрешен ли, через сколько секунд повторить)"""
+        now = time.monotonic()
+        state = self._local.get(key)
+        if state is not None:
+            if state.blocked_until > now:
+                return False, state.blocked_until - now
+            if state.tokens > 0 and state.expires_at > now:
+                state.tokens -= 1
+                return True, 0.0
+
+        if self._script is None:
+            return self._hit_fallback(key, rate, now)
+
+        lease = uuid.uuid4().hex
+        refund_lease, refund = "", 0
+        if state is not None:
+            # Остаток истекшей аренды; обнуляется до await, чтобы параллельный
+            # запрос этого процесса не вернул его второй раз
+            refund_lease, refund = state.lease, state.tokens
+            state.tokens = 0
+        try:
+            granted, retry_ms = await self._script(
+                keys=[key],
+                args=[int(rate.period * 1000), rate.limit, self._lease_size(rate), lease, refund_lease, refund],
+            )
+        except Exception as e:
+            logger.warning(f"Ошибка лимитера в Valkey, используем локальный: {e}")
+            return self._hit_fallback(key, rate, now)
+
+        if state is None:
+            if len(self._local) >= _MAX_LOCAL_KEYS:
+                self._local.clear()
+            state = self._local[key] = _LocalState()
+
+        granted = int(granted)
+        state.lease = lease
+        if granted <= 0:
+            retry_after = int(retry_ms) / 1000
+            state.blocked_until = now + retry_after
+            return False, retry_after
+
+        # Локальный запас живет недолго, чтобы не искажать окно
+        state.tokens = granted - 1
+        state.expires_at = now + rate.period / 10
+        return True, 0.0
+
+    def _hit_fallback(self, key: str, rate: Rate, now: float) -> Tuple[bool, float]:
+        tokens, ts = self._fallback.get(key, (rate.limit, now))
+        tokens = min(rate.limit, tokens + (now - ts) * rate.limit / rate.period)
+        if tokens < 1:
+            self._fallback[key] = (tokens, now)
+            return False, (1 - tokens) * rate.period / rate.limit
+        if len(self._fallback) >= _MAX_LOCAL_KEYS:
+            self._fallback.clear()
+        self._fallback[key] = (tokens - 1, now)
+        return True, 0.0
+
+
+rate_limiter = RateLimiter(
+    redis_client, algorithm=settings.RATE_LIMIT_ALGORITHM, batch=settings.RATE_LIMIT_LOCAL_BATCH
+)
+
+# Лимиты по маршрутам: (для анонимного IP, для пользователя)
+RULES: Dict[str, Tuple[Optional[Rate], Optional[Rate]]] = {
+    "shorten": (Rate.parse(settings.RATE_LIMIT_SHORTEN_ANON), Rate.parse(settings.RATE_LIMIT_SHORTEN_USER)),
+    "auth": (Rate.parse(settings.RATE_LIMIT_AUTH), Rate.parse(settings.RATE_LIMIT_AUTH)),
+    "redirect": (Rate.parse(settings.RATE_LIMIT_REDIRECT), Rate.parse(settings.RATE_LIMIT_REDIRECT)),
+    "qr": (Rate.parse(settings.RATE_LIMIT_QR_ANON), Rate.parse(settings.RATE_LIMIT_QR_USER)),
+}
+
+
+def client_ip(scope) -> str:
+    """
+    IP клиента для ключей лимитов. За RATE_LIMIT_TRUSTED_PROXIES прокси берется адрес,
+    который дописал в X-Forwarded-For самый внешний из них: он стоит на этом месте
+    справа, а все, что левее, клиент может подставить сам.
+    """
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if proxies > 0:
+        hops = []
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                hops.extend(hop.strip() for hop in value.decode("latin-1").split(","))
+        if len(hops) >= proxies and hops[-proxies]:
+            return hops[-proxies]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def check_rate_limit(route: str, scope, user_id: Optional[int] = None) -> Tuple[bool, float]:
+    if not settings.RATE_LIMIT_ENABLED:
+        return True, 0.0
+    anon_rate, user_rate = RULES[route]
+    if user_id is not None:
+        rate, key = user_rate, f"rl:{route}:user:{user_id}"
+    else:
+        rate, key = anon_rate, f"rl:{route}:ip:{client_ip(scope)}"
+    if rate is None:
+        return True, 0.0
+    return await rate_limiter.hit(key, rate)
+
+
+def rate_limit(route: str):
+    """
+    Зависимость FastAPI, ограничивающая частоту запросов к маршруту.
+    Авторизованных пользователей считает по ID, анонимных - по IP.
+    """
+    async def dependency(
+        request: Request,
+        user_id: Optional[int] = Depends(get_token_user_id),
+    ) -> None:
+        allowed, retry_after = await check_rate_limit(route, request.scope, user_id)
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Слишком много запросов, попробуйте позже",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    return dependency
@@ -0,0 +1,51 @@
+import time
+from typing import NamedTuple, Optional
+
+from app.core.config import settings
+
+# Тип редиректа задается для каждой ссылки:
+# - 301/308 (постоянные) отдаются с Cache-Control: public, max-age - их кэшируют CDN
+#   и браузеры, поэтому основной сервис видит только промахи CDN, а остальные клики
+#   добавляет app.tools.import_edge_logs из логов CDN;
+# - 302/307 (временные) отдаются с no-store - каждый переход доходит до сервиса
+#   и учитывается точно.
+
+REDIRECT_TYPES = (301, 302, 307, 308)
+PERMANENT_TYPES = frozenset({301, 308})
+
+_NO_STORE = "no-store"
+
+
+class Redirect(NamedTuple):
+    """Ответ редиректа: URL, статус и срок действия ссылки (unix-время, None - бессрочная)"""
+    url: str
+    status: int
+    expires_at: Optional[float]
+
+
+def cache_control(status: int, expires_at: Optional[float] = None) -> str:
+    """Cache-Control редиректа: постоянные кэшируются не дольше срока действия ссылки"""
+    if status not in PERMANENT_TYPES:
+        return _NO_STORE
+    max_age = settings.REDIRECT_PERMANENT_MAX_AGE
+    if expires_at is not None:
+        max_age = min(max_age, int(expires_at - time.time()))
+    if max_age <= 0:
+        return _NO_STORE
+    return f"public, max-age={max_age}"
+
+
+# Короткий код, который обслуживает RedirectMiddleware с кэшем редиректов: буквы, цифры,
+# "_" и "-". Пути с другими символами идут в обычный роутер FastAPI, поэтому импорт
+# ссылок (app.tools.import_links) принимает только такие коды
+SHORT_CODE_PATTERN = r"[0-9A-Za-z_-]{1,50}"
+
+
+# Первые сегменты путей самого приложения (префиксы роутеров и документация).
+# Такие коды перехватывали бы маршруты API, поэтому редирект по ним не ищется,
+# а создать ссылку с таким кодом нельзя. Новый роутер добавляется и сюда
+RESERVED_CODES = frozenset({"links", "auth", "domains", "edge", "admin", "docs", "redoc", "openapi.json"})
+
+
+def is_reserved_code(short_code: str) -> bool:
+    return short_code.lower() in RESERVED_CODES
@@ -1,14 +1,19 @@
 from datetime import datetime, timedelta,  timezone
-from typing import Any, Union, Optional
+from functools import lru_cache
+from typing import Any, Dict, Union, Optional
 import random
 import string
 
-from jose import jwt
-from passlib.context import CryptContext
-
 from app.core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"])
+# jose и passlib импортируются при первом использовании: они нужны только
+# авторизации, а не редиректам, и заметно удлиняют старт нового инстанса
+
+
+@lru_cache(maxsize=None)
+def _pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"])
 
 
 def create_access_token(
@@ -20,17 +25,29 @@ def create_access_token(
         expire = datetime.now(timezone.utc) + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
+    from jose import jwt
+
     to_encode = {"exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """Проверяет подпись и срок действия токена; для недействительного токена - ValueError"""
+    from jose import JWTError, jwt
+
+    try:
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError as e:
+        raise ValueError(str(e)) from e
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return _pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return _pwd_context().hash(password)
 
 
 def generate_short_code(length: int = 6) -> str:
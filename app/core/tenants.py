@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.db.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Ключ Valkey с версией таблицы доменов: увеличивается при любом изменении доменов,
+# чтобы остальные воркеры перечитали таблицу
+VERSION_KEY = "domains:version"
+
+# Владение доменом подтверждается TXT-записью _url-cutter.<host> со значением токена домена
+VERIFICATION_PREFIX = "_url-cutter"
+VERIFICATION_TIMEOUT = 5.0
+
+
+def normalize_host(host: str) -> str:
+    """Хост в нижнем регистре без порта"""
+    host = host.strip().lower()
+    if host.startswith("["):
+        return host.split("]", 1)[0] + "]"
+    return host.rsplit(":", 1)[0] if host.count(":") == 1 else host
+
+
+def verification_record(host: str) -> str:
+    """Имя TXT-записи, подтверждающей владение доменом"""
+    return f"{VERIFICATION_PREFIX}.{host}"
+
+
+async def lookup_txt(name: str) -> List[str]:
+    """Значения TXT-записей имени; пустой список, если записей нет или DNS не ответил"""
+    # dnspython нужен только подтверждению доменов - не на старте сервиса
+    import dns.asyncresolver
+    import dns.exception
+
+    try:
+        answer = await dns.asyncresolver.resolve(name, "TXT", lifetime=VERIFICATION_TIMEOUT)
+    except dns.exception.DNSException as e:
+        logger.info(f"TXT-записи {name} не найдены: {e}")
+        return []
+    return [b"".join(record.strings).decode("utf-8", "replace") for record in answer]
+
+
+class HostTable:
+    """
+    Таблица "хост -> ID домена" в памяти процесса.
+
+    Запрос к основному или неизвестному хосту попадает в пространство кодов
+    основного домена (None). Таблица целиком перечитывается из БД, когда
+    меняется версия в Valkey (проверка раз в DOMAIN_RELOAD_INTERVAL секунд),
+    поэтому на запрос приходится только поиск в словаре.
+    """
+
+    def __init__(self, reload_interval: float):
+        self.reload_interval = reload_interval
+        self.hosts: Dict[bytes, int] = {}
+        self.by_id: Dict[int, str] = {}
+        self._version: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def resolve(self, host: Optional[str]) -> Optional[int]:
+        if not host:
+            return None
+        return self.hosts.get(normalize_host(host).encode("latin-1"))
+
+    def resolve_scope(self, scope) -> Optional[int]:
+        """ID домена по заголовку Host из ASGI scope"""
+        if not self.hosts:
+            return None
+        for name, value in scope["headers"]:
+            if name == b"host":
+                domain_id = self.hosts.get(value.lower())
+                if domain_id is None and b":" in value:
+                    return self.resolve(value.decode("latin-1"))
+                return domain_id
+        return None
+
+    def base_url(self, domain_id: Optional[int]) -> str:
+        """Базовый URL коротких ссылок домена"""
+        if domain_id is None:
+            return settings.BASE_URL
+        host = self.by_id.get(domain_id)
+        if host is None:
+            return settings.BASE_URL
+        return f"{settings.CUSTOM_DOMAIN_SCHEME}://{host}"
+
+    async def reload(self) -> None:
+        # Импорт здесь, чтобы модуль не тянул модели и сессии при импорте схем
+        if settings.EDGE_MODE:
+            # На edge-узле домены приходят вместе со снимком ссылок
+            from app.db.edge_store import edge_store
+            domains = edge_store.domains()
+        else:
+            from app.crud import domain as domain_crud
+            from app.db.base import async_session
+
+            async with async_session() as db:
+                domains = await domain_crud.get_active_hosts(db)
+        self.hosts = {host.encode("latin-1"): domain_id for domain_id, host in domains}
+        self.by_id = {domain_id: host for domain_id, host in domains}
+        logger.info(f"Загружено доменов: {len(self.hosts)}")
+
+    async def notify_changed(self) -> None:
+        """Перечитывает таблицу локально и сообщает остальным воркерам об изменении"""
+        await self.reload()
+        if redis_client is not None:
+            try:
+                self._version = str(await redis_client.incr(VERSION_KEY))
+            except Exception as e:
+                logger.warning(f"Не удалось обновить версию доменов: {e}")
+
+    async def _current_version(self) -> Optional[str]:
+        if redis_client is None:
+            return None
+        try:
+            return await redis_client.get(VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать версию доменов: {e}")
+            return self._version
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                version = await self._current_version()
+                # Без Valkey перечитываем таблицу на каждом интервале
+                if version is None or version != self._version:
+                    await self.reload()
+                    self._version = version
+            except Exception as e:
+                logger.error(f"Ошибка обновления таблицы доменов: {e}")
+
+    async def start(self) -> None:
+        try:
+            self._version = await self._current_version()
+            await self.reload()
+        except Exception as e:
+            logger.error(f"Ошибка загрузки таблицы доменов: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+host_table = HostTable(settings.DOMAIN_RELOAD_INTERVAL)
+
+
+def default_host() -> str:
+    return normalize_host(urlsplit(settings.BASE_URL).netloc)
@@ -0,0 +1,90 @@
+import secrets
+from typing import List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, and_, func, update
+
+from app.models.domain import Domain
+from app.models.user import User
+
+
+async def get_active_hosts(db: AsyncSession) -> List[Tuple[int, str]]:
+    """Пары (id, host) всех активных подтвержденных доменов - для таблицы хостов"""
+    result = await db.execute(
+        select(Domain.id, Domain.host).where(and_(Domain.is_active == True, Domain.verified_at != None))
+    )
+    return [(row.id, row.host) for row in result.all()]
+
+
+async def get(
+    db: AsyncSession, domain_id: int, *, for_share: bool = False, for_update: bool = False
+) -> Optional[Domain]:
+    """
+    Домен по ID. for_share/for_update блокируют строку домена до конца транзакции `db`:
+    создание ссылки на домене (FOR SHARE) и удаление домена (FOR UPDATE) не идут
+    одновременно, так что удаление видит все ссылки домена
+    """
+    query = select(Domain).where(Domain.id == domain_id)
+    if for_share or for_update:
+        query = query.with_for_update(read=not for_update)
+    result = await db.execute(query)
+    return result.scalars().first()
+
+
+async def get_verified_by_host(db: AsyncSession, host: str) -> Optional[Domain]:
+    result = await db.execute(select(Domain).where(and_(Domain.host == host, Domain.verified_at != None)))
+    return result.scalars().first()
+
+
+async def get_multi_by_user(db: AsyncSession, *, user_id: int) -> List[Domain]:
+    result = await db.execute(select(Domain).where(Domain.user_id == user_id).order_by(Domain.id))
+    return result.scalars().all()
+
+
+async def create(db: AsyncSession, *, host: str, user: User) -> Domain:
+    """Заявка на домен: он станет активным после подтверждения владения (verify)"""
+    if await get_verified_by_host(db, host):
+        raise ValueError(f"Домен '{host}' уже зарегистрирован")
+    result = await db.execute(select(Domain.id).where(and_(Domain.host == host, Domain.user_id == user.id)))
+    if result.first() is not None:
+        raise ValueError(f"Домен '{host}' уже добавлен, подтвердите владение им")
+    
+    db_obj = Domain(host=host, user_id=user.id, is_active=True, verification_token=secrets.token_urlsafe(24))
+    db.add(db_obj)
+    await db.commit()
+    await db.refresh(db_obj)
+    return db_obj
+
+
+async def verify(db: AsyncSession, domain: Domain) -> Domain:
+    """
+    Отмечает владение доменом подтвержденным и удаляет чужие заявки на тот же хост
+    (у неподтвержденных доменов ссылок нет). Если хост уже подтвердил другой
+    пользователь, вызывает ValueError.
+    """
+    try:
+        await db.execute(
+            update(Domain).where(Domain.id == domain.id).values(verified_at=func.now())
+        )
+        await db.execute(
+            delete(Domain).where(and_(Domain.host == domain.host, Domain.id != domain.id, Domain.verified_at == None))
+        )
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise ValueError(f"Домен '{domain.host}' уже подтвержден другим пользователем")
+    await db.refresh(domain)
+    return domain
+
+
+async def remove(db: AsyncSession, *, domain_id: int, user_id: int) -> Optional[int]:
+    """Удаляет домен владельца, возвращает его ID или None"""
+    result = await db.execute(
+        delete(Domain)
+        .where(and_(Domain.id == domain_id, Domain.user_id == user_id))
+        .returning(Domain.id)
+    )
+    await db.commit()
+    return result.scalar_one_or_none()
@@ -1,162 +1,719 @@
-from datetime import datetime
-from typing import Optional, List, Union, Dict, Any
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Iterable, List, NamedTuple, Protocol, Tuple, Union, Dict, Any
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete, func, or_, and_
+from sqlalchemy import any_, bindparam, delete, insert, func, or_, and_, update as sa_update, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.core.redirects import is_reserved_code
 from app.core.security import generate_short_code
 from app.core.config import settings
-from app.models.link import Link
+from app.db import shards
+from app.db.base import async_session
+from app.models.link import Link, LinkArchive
+from app.models.link_event import LinkEvent
 from app.models.user import User
 from app.schemas.link import LinkCreate, LinkUpdate
 
 
+class LinkRecord(NamedTuple):
+    """
+    Легковесное представление ссылки для горячих путей: строится из select по
+    колонкам, не попадает в identity map сессии и не отслеживает изменения.
+    """
+    id: int
+    short_code: str
+    domain_id: Optional[int]
+    original_url: str
+    user_id: Optional[int]
+    clicks: int
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    last_used_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    is_active: bool
+    is_anonymous: bool
+    redirect_type: int
+
+
+_LINK_RECORD_COLUMNS = tuple(getattr(Link, name) for name in LinkRecord._fields)
+
+
+class RedirectTarget(NamedTuple):
+    """Все, что нужно редиректу и кэшу: URL, время последнего изменения, срок действия и тип редиректа"""
+    original_url: str
+    changed_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    redirect_type: int = 307
+
+
+class LinkChange(NamedTuple):
+    """Состояние ссылки для репликации на edge-узлы"""
+    id: int
+    domain_id: Optional[int]
+    short_code: str
+    original_url: str
+    expires_at: Optional[datetime]
+    is_active: bool
+    changed_at: datetime
+    # В конце и со значением по умолчанию: основной сервис без этого поля его не присылает
+    redirect_type: int = 307
+
+
+class LinkStore(Protocol):
+    """Хранилище, из которого обработчик редиректов берет ссылки"""
+
+    async def get_redirect_target(
+        self, short_code: str, domain_id: Optional[int] = None
+    ) -> Optional[RedirectTarget]:
+        ...
+
+
+class DatabaseLinkStore:
+    """Основное хранилище: Postgres (или шарды), своя сессия на каждый запрос"""
+
+    async def get_redirect_target(
+        self, short_code: str, domain_id: Optional[int] = None
+    ) -> Optional[RedirectTarget]:
+        async with async_session() as db:
+            return await get_redirect_target(db, short_code=short_code, domain_id=domain_id)
+
+
+def _in_domain(domain_id: Optional[int]):
+    # Пространство коротких кодов: основной домен (NULL) или собственный домен
+    if domain_id is None:
+        return Link.domain_id == None
+    return Link.domain_id == domain_id
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def is_expired(expires_at: Optional[datetime], now: Optional[datetime] = None) -> bool:
+    if expires_at is None:
+        return False
+    if expires_at.tzinfo is None:
+        # SQLite возвращает время без часового пояса; все время ссылок хранится в UTC
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= (now or utcnow())
+
+
+def _is_live():
+    # Ссылка активна и не истекла. Истекшие ссылки деактивирует app.workers.expiry,
+    # сравнение со временем здесь - страховка на случай его отставания
+    return and_(
+        or_(
+            Link.expires_at > utcnow(),
+            Link.expires_at == None
+        ),
+        Link.is_active == True
+    )
+
+
+async def _record_events(db: AsyncSession, op: str, links: Iterable[Any]) -> None:
+    """
+    Пишет события изменения в outbox (link_event) в текущей транзакции, до commit:
+    событие появляется тогда и только тогда, когда зафиксировано само изменение.
+    `links` - объекты Link, LinkRecord или строки RETURNING с id, domain_id и short_code.
+    """
+    rows = [
+        {
+            "op": op,
+            "link_id": link.id,
+            "domain_id": link.domain_id,
+            "short_code": link.short_code,
+            "original_url": getattr(link, "original_url", None),
+            "expires_at": getattr(link, "expires_at", None),
+            "is_active": getattr(link, "is_active", None),
+            "redirect_type": getattr(link, "redirect_type", None),
+        }
+        for link in links
+    ]
+    if rows:
+        await db.execute(insert(LinkEvent), rows)
+
+
 async def get(db: AsyncSession, link_id: int) -> Optional[Link]:
-    result = await db.execute(select(Link).where(Link.id == link_id))
-    return result.scalars().first()
-
-
-async def get_by_short_code(db: AsyncSession, short_code: str) -> Optional[Link]:
-    result = await db.execute(select(Link).where(
-        and_(
-            Link.short_code == short_code,
-            or_(
-                Link.expires_at > datetime.now(),
-                Link.expires_at == None
-            ),
-            Link.is_active == True
+    # По id шард неизвестен - спрашиваем все
+    async def query(db: AsyncSession) -> Optional[Link]:
+        result = await db.execute(select(Link).where(Link.id == link_id))
+        return result.scalars().first()
+
+    return next((link for link in await shards.fan_out(db, query) if link is not None), None)
+
+
+async def get_by_short_code(db: AsyncSession, short_code: str, domain_id: Optional[int] = None) -> Optional[Link]:
+    async with shards.link_session(db, short_code) as db:
+        result = await db.execute(select(Link).where(
+            and_(
+                Link.short_code == short_code,
+                _in_domain(domain_id),
+                _is_live()
+            )
+        ))
+        return result.scalars().first()
+
+
+async def get_record_by_short_code(
+    db: AsyncSession, short_code: str, domain_id: Optional[int] = None
+) -> Optional[LinkRecord]:
+    """Как get_by_short_code, но возвращает LinkRecord вместо ORM-объекта"""
+    async with shards.link_session(db, short_code) as db:
+        result = await db.execute(select(*_LINK_RECORD_COLUMNS).where(
+            and_(
+                Link.short_code == short_code,
+                _in_domain(domain_id),
+                _is_live()
+            )
+        ))
+        row = result.first()
+    return LinkRecord._make(row) if row is not None else None
+
+
+async def get_redirect_target(
+    db: AsyncSession, short_code: str, domain_id: Optional[int] = None
+) -> Optional[RedirectTarget]:
+    """
+    Только данные для редиректа активной ссылки, без загрузки ORM-объекта.
+    Запрос - поиск по ключу: истекшие ссылки к этому времени уже деактивированы
+    (app.workers.expiry), а на случай отставания срок проверяется у найденной строки.
+    """
+    async with shards.link_session(db, short_code) as db:
+        result = await db.execute(select(
+            Link.original_url,
+            func.coalesce(Link.updated_at, Link.created_at),
+            Link.expires_at,
+            Link.redirect_type,
+        ).where(
+            and_(
+                Link.short_code == short_code,
+                _in_domain(domain_id),
+                Link.is_active == True
+            )
+        ))
+        row = result.first()
+    if row is None or is_expired(row.expires_at):
+        return None
+    return RedirectTarget._make(row)
+
+
+def _short_code_in(db: AsyncSession, short_codes: List[str]):
+    # В Postgres - один параметр-массив (short_code = ANY($1)), план не зависит от числа кодов
+    if db.bind.dialect.name == "postgresql":
+        return Link.short_code == any_(bindparam("short_codes", short_codes, type_=ARRAY(String)))
+    return Link.short_code.in_(short_codes)
+
+
+async def get_stats_by_short_codes(
+    db: AsyncSession, *, short_codes: List[str], user_id: Optional[int] = None,
+    domain_id: Optional[int] = None
+):
+    """
+    Статистика по списку кодов одним запросом.
+    Доступ проверяется в самом запросе: анонимным пользователям доступны только
+    анонимные ссылки, авторизованным - свои и ссылки без владельца.
+    С шардами коды группируются по шардам, и шарды опрашиваются параллельно.
+    """
+    async def query(db: AsyncSession, codes: List[str]):
+        query = select(
+            Link.short_code, Link.original_url, Link.clicks,
+            Link.created_at, Link.last_used_at, Link.expires_at,
+        ).where(
+            and_(
+                _short_code_in(db, codes),
+                _in_domain(domain_id),
+                _is_live()
+            )
         )
+        if user_id is None:
+            query = query.where(Link.is_anonymous == True)
+        else:
+            query = query.where(or_(Link.user_id == None, Link.user_id == user_id))
+        result = await db.execute(query)
+        return result.all()
+
+    if not shards.SHARDED:
+        return await query(db, short_codes)
+    groups = shards.group_by_shard(short_codes, lambda code: code)
+    results = await asyncio.gather(*(
+        shards.fan_out(db, lambda db, codes=codes: query(db, codes), [shard_id])
+        for shard_id, codes in groups.items()
     ))
-    return result.scalars().first()
+    return [row for (rows,) in results for row in rows]
+
+
+async def get_changed_since(
+    db: AsyncSession, *, since: Optional[datetime] = None, since_id: int = 0, limit: int = 1000
+) -> List[LinkChange]:
+    """
+    Ссылки, измененные после (since, since_id), по возрастанию (время изменения, id).
+    Включает деактивированные и истекшие - получатель удаляет их у себя.
+    """
+    changed_at = func.coalesce(Link.updated_at, Link.created_at)
+
+    async def query(db: AsyncSession) -> List[LinkChange]:
+        query = select(
+            Link.id, Link.domain_id, Link.short_code, Link.original_url,
+            Link.expires_at, Link.is_active, changed_at, Link.redirect_type,
+        ).order_by(changed_at, Link.id).limit(limit)
+        if since is not None:
+            query = query.where(
+                or_(changed_at > since, and_(changed_at == since, Link.id > since_id))
+            )
+        result = await db.execute(query)
+        return [LinkChange._make(row) for row in result.all()]
+
+    changes = heapq.merge(*await shards.fan_out(db, query), key=lambda change: (change.changed_at, change.id))
+    return list(itertools.islice(changes, limit))
 
 
 async def get_multi(
     db: AsyncSession, *, user_id: Optional[int] = None, skip: int = 0, limit: int = 100
 ) -> List[Link]:
-    query = select(Link).offset(skip).limit(limit)
-    if user_id:
-        query = query.where(Link.user_id == user_id)
-    result = await db.execute(query)
-    return result.scalars().all()
+    # С шардами каждый шард отдает первые skip + limit ссылок, а страница собирается после слияния
+    async def query(db: AsyncSession) -> List[Link]:
+        query = select(Link).order_by(Link.id)
+        if shards.SHARDED:
+            query = query.limit(skip + limit)
+        else:
+            query = query.offset(skip).limit(limit)
+        if user_id:
+            query = query.where(Link.user_id == user_id)
+        result = await db.execute(query)
+        return result.scalars().all()
 
+    if not shards.SHARDED:
+        return await query(db)
+    links = heapq.merge(*await shards.fan_out(db, query), key=lambda link: link.id)
+    return list(itertools.islice(links, skip, skip + limit))
 
-async def search_by_original_url(
-    db: AsyncSession, *, original_url: str, user_id: Optional[int] = None
-) -> List[Link]:
-    query = select(Link).where(Link.original_url == original_url)
-    if user_id:
-        query = query.where(Link.user_id == user_id)
-    result = await db.execute(query)
-    return result.scalars().all()
+
+SEARCH_MODES = ("exact", "prefix", "substring", "domain")
+
+
+def _normalize_host(value: str) -> str:
+    # "https://WWW.Example.com/path" -> "example.com"
+    host = value.strip().lower()
+    if "://" in host:
+        host = host.split("://", 1)[1]
+    host = host.split("/", 1)[0].split("?", 1)[0].split(":", 1)[0]
+    return host.removeprefix("www.")
+
+
+def _escape_like(value: str) -> str:
+    # Шаблон LIKE, совпадающий только с самой строкой (как autoescape=True в istartswith)
+    return value.replace("/", "//").replace("%", "/%").replace("_", "/_")
+
+
+def _url_matches(mode: str, value: str):
+    """
+    Условие поиска по original_url. prefix, substring и domain - ILIKE, который
+    в Postgres обслуживает GIN-индекс pg_trgm (ix_link_original_url_trgm).
+    """
+    url = Link.original_url
+    if mode == "exact":
+        return url == value
+    if mode == "prefix":
+        return url.istartswith(value, autoescape=True)
+    if mode == "substring":
+        return url.icontains(value, autoescape=True)
+    # domain: хост (и www.хост) сразу после схемы, за ним конец URL, путь, порт,
+    # запрос или фрагмент - но не продолжение имени (example.com.evil.org)
+    # Все ветки - ILIKE по original_url: одна ветка без индекса (например, lower(url) = ...)
+    # не дала бы Postgres собрать BitmapOr, и поиск по домену читал бы всю таблицу
+    host = _normalize_host(value)
+    origins = [f"{scheme}://{www}{host}" for scheme in ("http", "https") for www in ("", "www.")]
+    return or_(
+        *(url.ilike(_escape_like(origin), escape="/") for origin in origins),
+        *(url.ilike(_escape_like(origin + end) + "%", escape="/") for origin in origins for end in "/:?#"),
+    )
+
+
+async def search(
+    db: AsyncSession, *, value: str, mode: str = "exact", user_id: Optional[int] = None,
+    domain_id: Optional[int] = None, after_id: int = 0, limit: int = 100
+):
+    """
+    Страница результатов поиска по URL в порядке id (keyset: id > after_id).
+    Видимость проверяется в запросе: ссылки пользователя или, без user_id, только анонимные.
+    Возвращает строки (id, short_code, original_url, is_anonymous) без загрузки ORM-объектов.
+    """
+    query = (
+        select(Link.id, Link.short_code, Link.original_url, Link.is_anonymous)
+        .where(
+            and_(
+                _url_matches(mode, value),
+                _in_domain(domain_id),
+                Link.id > after_id,
+                Link.user_id == user_id if user_id else Link.is_anonymous == True
+            )
+        )
+        .order_by(Link.id)
+        .limit(limit)
+    )
+
+    async def run(db: AsyncSession):
+        result = await db.execute(query)
+        return result.all()
+
+    if not shards.SHARDED:
+        return await run(db)
+    rows = heapq.merge(*await shards.fan_out(db, run), key=lambda row: row.id)
+    return list(itertools.islice(rows, limit))
 
 
 async def create(
     db: AsyncSession, *, obj_in: LinkCreate, user: Optional[User] = None, 
-    custom_short_code: Optional[str] = None
+    custom_short_code: Optional[str] = None, domain_id: Optional[int] = None
 ) -> Link:
-    short_code = custom_short_code or obj_in.custom_alias
-    
-    # Если не задан кастомный код, генерируем случайный
-    if not short_code:
-        while True:
-            short_code = generate_short_code(settings.SHORT_CODE_LENGTH)
-            # Проверяем, что такой код не существует
-            result = await db.execute(select(Link).where(Link.short_code == short_code))
-            if not result.scalars().first():
-                break
-    else:
-        # Проверяем, что такой кастомный код не существует
-        result = await db.execute(select(Link).where(Link.short_code == short_code))
-        if result.scalars().first():
-            raise ValueError(f"Короткий код '{short_code}' уже используется")
+    custom_code = custom_short_code or obj_in.custom_alias
+    if custom_code and is_reserved_code(custom_code):
+        raise ValueError(f"Короткий код '{custom_code}' зарезервирован")
     
     # Используем переданное время истечения или глобальную настройку
-    from datetime import datetime, timedelta
     expires_at = obj_in.expires_at
     
     # Если время истечения не указано, используем глобальную настройку
     if expires_at is None:
-        expires_at = datetime.now() + timedelta(days=settings.LINK_EXPIRATION_DAYS)
+        expires_at = utcnow() + timedelta(days=settings.LINK_EXPIRATION_DAYS)
     
-    db_obj = Link(
-        original_url=obj_in.original_url,
-        short_code=short_code,
-        user_id=user.id if user else None,
-        expires_at=expires_at,
-        is_anonymous=user is None,
-    )
-    db.add(db_obj)
-    await db.commit()
-    await db.refresh(db_obj)
-    return db_obj
+    while True:
+        short_code = custom_code
+        # Если не задан кастомный код, генерируем случайный
+        if not short_code:
+            while True:
+                short_code = generate_short_code(settings.SHORT_CODE_LENGTH)
+                # Проверяем, что такой код не существует (в шарде этого кода)
+                if not is_reserved_code(short_code) and not await _short_code_taken(db, short_code, domain_id):
+                    break
+        else:
+            # Проверяем, что такой кастомный код не существует
+            if await _short_code_taken(db, short_code, domain_id):
+                raise ValueError(f"Короткий код '{short_code}' уже используется")
+        
+        db_obj = Link(
+            original_url=obj_in.original_url,
+            short_code=short_code,
+            domain_id=domain_id,
+            user_id=user.id if user else None,
+            expires_at=expires_at,
+            is_anonymous=user is None,
+            redirect_type=obj_in.redirect_type or settings.REDIRECT_DEFAULT_TYPE,
+        )
+        async with shards.link_session(db, short_code) as shard_db:
+            shard_db.add(db_obj)
+            try:
+                await shard_db.flush()
+            except IntegrityError:
+                # Параллельный запрос успел занять код между проверкой и вставкой:
+                # кастомный код - ошибка клиента, случайный - генерируем заново
+                await shard_db.rollback()
+                if custom_code:
+                    raise ValueError(f"Короткий код '{short_code}' уже используется")
+                continue
+            await _record_events(shard_db, "create", [db_obj])
+            await shard_db.commit()
+            await shard_db.refresh(db_obj)
+        return db_obj
 
 
-async def update(
-    db: AsyncSession, *, db_obj: Link, obj_in: Union[LinkUpdate, Dict[str, Any]]
-) -> Link:
+async def _short_code_taken(db: AsyncSession, short_code: str, domain_id: Optional[int]) -> bool:
+    async with shards.link_session(db, short_code) as db:
+        result = await db.execute(
+            select(Link.id).where(and_(Link.short_code == short_code, _in_domain(domain_id)))
+        )
+        return result.first() is not None
+
+
+async def update_by_short_code(
+    db: AsyncSession, *, short_code: str, user_id: int, obj_in: Union[LinkUpdate, Dict[str, Any]],
+    domain_id: Optional[int] = None
+) -> Optional[LinkRecord]:
+    """
+    Обновляет ссылку одним UPDATE ... RETURNING. Владелец проверяется в самом запросе,
+    поэтому None означает "ссылки нет" или "ссылка чужая".
+    """
     if isinstance(obj_in, dict):
         update_data = obj_in
     else:
         update_data = obj_in.model_dump(exclude_unset=True)
+    update_data = {field: value for field, value in update_data.items() if value is not None}
     
-    for field in update_data.keys():
-        if field in update_data:
-            setattr(db_obj, field, update_data[field])
-    
-    db.add(db_obj)
-    await db.commit()
-    await db.refresh(db_obj)
-    return db_obj
-
-
-async def remove(db: AsyncSession, *, link_id: int) -> Optional[Link]:
-    result = await db.execute(select(Link).where(Link.id == link_id))
-    link = result.scalars().first()
-    if link:
-        await db.delete(link)
+    async with shards.link_session(db, short_code) as db:
+        result = await db.execute(
+            sa_update(Link)
+            .where(
+                and_(
+                    Link.short_code == short_code,
+                    _in_domain(domain_id),
+                    Link.user_id == user_id,
+                    _is_live()
+                )
+            )
+            .values(**update_data, updated_at=func.now())
+            .returning(*_LINK_RECORD_COLUMNS)
+        )
+        row = result.first()
+        if row is not None:
+            await _record_events(db, "update", [row])
         await db.commit()
-    return link
+    return LinkRecord._make(row) if row is not None else None
 
 
-async def remove_by_short_code(db: AsyncSession, *, short_code: str, user_id: Optional[int] = None) -> Optional[Link]:
-    query = select(Link).where(Link.short_code == short_code)
+async def remove_by_short_code(
+    db: AsyncSession, *, short_code: str, user_id: Optional[int] = None, domain_id: Optional[int] = None
+) -> Optional[LinkRecord]:
+    """Удаляет ссылку одним DELETE ... RETURNING; если указан user_id - только ссылку этого владельца"""
+    query = delete(Link).where(and_(Link.short_code == short_code, _in_domain(domain_id)))
     if user_id is not None:
         query = query.where(Link.user_id == user_id)
     
-    result = await db.execute(query)
-    link = result.scalars().first()
-    if link:
-        await db.delete(link)
+    async with shards.link_session(db, short_code) as db:
+        result = await db.execute(query.returning(*_LINK_RECORD_COLUMNS))
+        row = result.first()
+        if row is not None:
+            await _record_events(db, "delete", [row])
         await db.commit()
-    return link
+    return LinkRecord._make(row) if row is not None else None
 
 
 async def increment_clicks(db: AsyncSession, link: Link) -> Link:
-    link.clicks += 1
-    link.last_used_at = datetime.now()
-    await db.commit()
-    await db.refresh(link)
+    async with shards.link_session(db, link.short_code) as db:
+        result = await db.execute(
+            sa_update(Link)
+            # short_code - ключ секционирования: при LINK_PARTITIONS UPDATE затронет одну секцию
+            .where(and_(Link.id == link.id, Link.short_code == link.short_code))
+            .values(clicks=Link.clicks + 1, last_used_at=func.now())
+            .returning(Link.clicks, Link.last_used_at)
+        )
+        clicks, last_used_at = result.one()
+        await db.commit()
+    # Значения уже в БД - записываем их в объект, не помечая его измененным
+    set_committed_value(link, "clicks", clicks)
+    set_committed_value(link, "last_used_at", last_used_at)
     return link
 
 
-async def remove_expired_links(db: AsyncSession) -> int:
-    """Удаляет все истекшие ссылки"""
-    query = delete(Link).where(
-        and_(
-            Link.expires_at != None,
-            Link.expires_at < datetime.now()
+async def increment_clicks_by_short_code(
+    db: AsyncSession, *, short_code: str, domain_id: Optional[int] = None
+) -> None:
+    """Увеличивает счетчик кликов одним UPDATE, без предварительного SELECT"""
+    async with shards.link_session(db, short_code) as db:
+        await db.execute(
+            sa_update(Link)
+            .where(
+                and_(
+                    Link.short_code == short_code,
+                    _in_domain(domain_id),
+                    _is_live()
+                )
+            )
+            .values(clicks=Link.clicks + 1, last_used_at=func.now())
         )
-    )
-    result = await db.execute(query)
+        await db.commit()
+
+
+async def add_clicks_bulk(db: AsyncSession, clicks: Dict[Tuple[Optional[int], str], int]) -> None:
+    """
+    Прибавляет накопленные клики сразу многим ссылкам (executemany на шард
+    для основного домена и для собственных).
+    Ключи - пары (domain_id, short_code).
+    """
+    if not clicks:
+        return
+    table = Link.__table__
+
+    # Условие на домен - как в _in_domain: "domain_id IS NULL" совпадает с частичным
+    # индексом uq_link_default_short_code, "domain_id = :domain" - с (domain_id, short_code);
+    # IS NOT DISTINCT FROM ни один индекс не использует
+    def clicks_update(in_domain):
+        return (
+            sa_update(table)
+            .where(and_(table.c.short_code == bindparam("code"), in_domain))
+            .values(clicks=table.c.clicks + bindparam("count"), last_used_at=func.now())
+        )
+
+    default_query = clicks_update(table.c.domain_id == None)
+    domain_query = clicks_update(table.c.domain_id == bindparam("domain"))
+    params = [
+        {"domain": domain_id, "code": code, "count": count}
+        for (domain_id, code), count in clicks.items()
+    ]
+
+    async def run(db: AsyncSession, params: List[dict]) -> None:
+        default = [item for item in params if item["domain"] is None]
+        custom = [item for item in params if item["domain"] is not None]
+        if default:
+            await db.execute(default_query, default)
+        if custom:
+            await db.execute(domain_query, custom)
+        await db.commit()
+
+    if not shards.SHARDED:
+        await run(db, params)
+        return
+    groups = shards.group_by_shard(params, lambda item: item["code"])
+    await asyncio.gather(*(
+        shards.fan_out(db, lambda db, params=params: run(db, params), [shard_id])
+        for shard_id, params in groups.items()
+    ))
+
+
+_ARCHIVE_COLUMNS = (
+    "id", "expires_at", "original_url", "short_code", "domain_id",
+    "user_id", "clicks", "created_at", "last_used_at",
+)
+
+
+async def archive_expired(db: AsyncSession, *, limit: int = 1000) -> int:
+    """
+    Переносит в link_archive истекшие ссылки, уже деактивированные задачей истечения
+    (не больше `limit` на шард). События expire и инвалидация кэшей были при
+    деактивации, поэтому здесь строки только перемещаются. Возвращает число ссылок.
+    """
+    async def run(db: AsyncSession):
+        return await _archive_expired(db, limit)
+
+    return sum(await shards.fan_out(db, run))
+
+
+async def _archive_expired(db: AsyncSession, limit: int) -> int:
+    expired = and_(Link.is_active == False, Link.expires_at != None, Link.expires_at <= utcnow())
+    if db.bind.dialect.name == "postgresql":
+        # Перенос одним запросом: DELETE ... RETURNING внутри CTE и INSERT из него
+        ids = select(Link.id).where(expired).order_by(Link.id).limit(limit).scalar_subquery()
+        moved = (
+            delete(Link).where(and_(Link.id.in_(ids), expired))
+            .returning(*(getattr(Link, name) for name in _ARCHIVE_COLUMNS))
+            .cte("moved")
+        )
+        query = (
+            insert(LinkArchive)
+            .from_select(_ARCHIVE_COLUMNS, select(*(moved.c[name] for name in _ARCHIVE_COLUMNS)))
+            .returning(LinkArchive.id)
+        )
+    else:
+        ids = (await db.execute(select(Link.id).where(expired).order_by(Link.id).limit(limit))).scalars().all()
+        await db.execute(
+            insert(LinkArchive).from_select(
+                _ARCHIVE_COLUMNS,
+                select(*(getattr(Link, name) for name in _ARCHIVE_COLUMNS)).where(Link.id.in_(ids)),
+            )
+        )
+        query = delete(Link).where(Link.id.in_(ids)).returning(Link.id)
+    moved = len((await db.execute(query)).all())
     await db.commit()
-    return result.rowcount
+    return moved
+
+
+async def deactivate_expired(
+    db: AsyncSession, *, short_codes: Optional[List[str]] = None, limit: int = 1000
+) -> List[Tuple[Optional[int], str, datetime]]:
+    """
+    Деактивирует истекшие, но еще активные ссылки (все или только с этими кодами,
+    не больше `limit` на шард) и пишет события expire в outbox.
+    Возвращает тройки (domain_id, short_code, updated_at) для инвалидации кэшей.
+    """
+    now = utcnow()
+
+    async def run(db: AsyncSession, codes: Optional[List[str]]):
+        expired = and_(Link.is_active == True, Link.expires_at != None, Link.expires_at <= now)
+        if codes is not None:
+            expired = and_(expired, Link.short_code.in_(codes))
+        ids = select(Link.id).where(expired).limit(limit).scalar_subquery()
+        result = await db.execute(
+            sa_update(Link)
+            .where(and_(Link.id.in_(ids), expired))
+            .values(is_active=False, updated_at=func.now())
+            .returning(Link.id, Link.domain_id, Link.short_code, Link.original_url,
+                       Link.expires_at, Link.is_active, Link.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+        await _record_events(db, "expire", rows)
+        await db.commit()
+        return [(row.domain_id, row.short_code, row.updated_at) for row in rows]
+
+    if short_codes is None:
+        results = await shards.fan_out(db, lambda db: run(db, None))
+    elif not shards.SHARDED:
+        results = [await run(db, short_codes)]
+    else:
+        groups = shards.group_by_shard(short_codes, lambda code: code)
+        results = await asyncio.gather(*(
+            shards.fan_out(db, lambda db, codes=codes: run(db, codes), [shard_id])
+            for shard_id, codes in groups.items()
+        ))
+        results = [links for (links,) in results]
+    return [link for links in results for link in links]
+
+
+async def get_expiring(
+    db: AsyncSession, *, until: datetime, after: Optional[Tuple[datetime, int]] = None, limit: int = 10000
+) -> List[Tuple[datetime, int, Optional[int], str]]:
+    """
+    Активные ссылки, истекающие не позже `until`, по возрастанию (expires_at, id),
+    после ключа `after`. Строки (expires_at, id, domain_id, short_code) - для расписания истечения.
+    """
+    async def run(db: AsyncSession):
+        query = (
+            select(Link.expires_at, Link.id, Link.domain_id, Link.short_code)
+            .where(and_(Link.is_active == True, Link.expires_at != None, Link.expires_at <= until))
+            .order_by(Link.expires_at, Link.id)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(
+                or_(Link.expires_at > after[0], and_(Link.expires_at == after[0], Link.id > after[1]))
+            )
+        result = await db.execute(query)
+        return result.all()
+
+    rows = heapq.merge(*await shards.fan_out(db, run), key=lambda row: (row.expires_at, row.id))
+    return list(itertools.islice(rows, limit))
 
 
-async def count_links(db: AsyncSession, user_id: Optional[int] = None) -> int:
-    """Подсчитывает количество ссылок пользователя"""
+async def get_live_page(
+    db: AsyncSession, *, after_id: int = 0, limit: int = 1000
+) -> List[Tuple[int, Optional[int], str, str, int]]:
+    """
+    Страница активных неистекших ссылок по возрастанию id после `after_id`:
+    строки (id, domain_id, short_code, original_url, clicks) - для обхода всех ссылок пачками.
+    """
+    query = (
+        select(Link.id, Link.domain_id, Link.short_code, Link.original_url, Link.clicks)
+        .where(and_(_is_live(), Link.id > after_id))
+        .order_by(Link.id)
+        .limit(limit)
+    )
+
+    async def run(db: AsyncSession):
+        result = await db.execute(query)
+        return result.all()
+
+    rows = heapq.merge(*await shards.fan_out(db, run), key=lambda row: row.id)
+    return list(itertools.islice(rows, limit))
+
+
+async def count_links(
+    db: AsyncSession, user_id: Optional[int] = None, domain_id: Optional[int] = None
+) -> int:
+    """Подсчитывает количество ссылок пользователя и/или собственного домена"""
     query = select(func.count(Link.id))
     if user_id:
         query = query.where(Link.user_id == user_id)
-    result = await db.execute(query)
-    return result.scalar_one() 
\ No newline at end of file
+    if domain_id is not None:
+        query = query.where(Link.domain_id == domain_id)
+
+    async def run(db: AsyncSession) -> int:
+        result = await db.execute(query)
+        return result.scalar_one()
+
+    return sum(await shards.fan_out(db, run)) 
\ No newline at end of file
@@ -0,0 +1,38 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, func, update
+
+from app.models.link_event import LinkEvent
+
+# События пишет app.crud.link в транзакциях изменений ссылок; здесь - только
+# чтение и обслуживание outbox для реле. С шардированием функции вызываются
+# для сессии каждого шарда (shards.per_shard).
+
+
+async def get_unpublished(db: AsyncSession, *, limit: int = 500) -> List[LinkEvent]:
+    """Еще не опубликованные события по возрастанию id"""
+    result = await db.execute(
+        select(LinkEvent).where(LinkEvent.published_at == None).order_by(LinkEvent.id).limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def mark_published(db: AsyncSession, *, ids: List[int]) -> None:
+    if not ids:
+        return
+    await db.execute(
+        update(LinkEvent).where(LinkEvent.id.in_(ids)).values(published_at=func.now())
+    )
+    await db.commit()
+
+
+async def remove_published_before(db: AsyncSession, *, before: datetime) -> int:
+    """Удаляет опубликованные события старше `before`, возвращает их количество"""
+    result = await db.execute(
+        delete(LinkEvent).where(LinkEvent.published_at != None, LinkEvent.published_at < before)
+    )
+    await db.commit()
+    return result.rowcount
@@ -0,0 +1,218 @@
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import and_, case, delete, func, insert, or_, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.db import shards
+from app.models.link import Link
+from app.models.link_stats import LinkStatsHour, LinkStatsSummary, LinkStatsTopDomain, LinkStatsTopLink
+
+# Пересчет агрегатов (compute_*) читает таблицу link каждого шарда и вызывается только
+# из app.workers.aggregates; эндпоинты читают готовые таблицы link_stats_* (get_*).
+# Все запросы выполняются с statement_timeout (Postgres), чтобы ни пересчет,
+# ни запрос администратора не занимали БД дольше заданного.
+
+
+async def statement_timeout(db: AsyncSession, ms: float) -> None:
+    """Ограничивает время запросов до конца текущей транзакции (только Postgres)"""
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(text(f"SET LOCAL statement_timeout = {int(ms)}"))
+
+
+def _hour(db: AsyncSession):
+    # Начало часа создания ссылки в UTC
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc("hour", func.timezone("UTC", Link.created_at))
+    return func.strftime("%Y-%m-%d %H:00:00", Link.created_at)
+
+
+# Хост адреса назначения без www. и порта
+_HOST_PATTERN = r"^[a-z][a-z0-9+.-]*://(?:www\.)?([^/:?#]+)"
+
+
+def _url_host(url: str) -> Optional[str]:
+    host = urlsplit(url).hostname
+    return host.removeprefix("www.") if host else None
+
+
+def _as_utc(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+async def compute_summary(db: AsyncSession, *, now: datetime) -> Dict[str, int]:
+    expired = or_(Link.is_active == False, and_(Link.expires_at != None, Link.expires_at <= now))
+
+    async def run(db: AsyncSession) -> Tuple[int, int, int, int]:
+        await statement_timeout(db, settings.AGGREGATES_QUERY_TIMEOUT_MS)
+        result = await db.execute(select(
+            func.count(),
+            func.coalesce(func.sum(case((expired, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Link.is_anonymous == True, 1), else_=0)), 0),
+            func.coalesce(func.sum(Link.clicks), 0),
+        ).select_from(Link))
+        return tuple(result.one())
+
+    total = expired_count = anonymous = clicks = 0
+    for shard_total, shard_expired, shard_anonymous, shard_clicks in await shards.fan_out(db, run):
+        total += shard_total
+        expired_count += shard_expired
+        anonymous += shard_anonymous
+        clicks += shard_clicks
+    return {
+        "total": total,
+        "active": total - expired_count,
+        "expired": expired_count,
+        "anonymous": anonymous,
+        "clicks": clicks,
+    }
+
+
+async def compute_created_per_hour(db: AsyncSession, *, since: datetime) -> Dict[datetime, int]:
+    """Число созданных ссылок по часам начиная с `since` (по индексу ix_link_created_at)"""
+    async def run(db: AsyncSession):
+        await statement_timeout(db, settings.AGGREGATES_QUERY_TIMEOUT_MS)
+        hour = _hour(db)
+        result = await db.execute(
+            select(hour, func.count()).where(Link.created_at >= since).group_by(hour)
+        )
+        return result.all()
+
+    hours: Counter = Counter()
+    for rows in await shards.fan_out(db, run):
+        for hour, created in rows:
+            hours[_as_utc(hour)] += created
+    return dict(hours)
+
+
+async def compute_top_links(db: AsyncSession, *, limit: int) -> List[tuple]:
+    """Ссылки с наибольшим числом кликов: (id, domain_id, short_code, original_url, clicks)"""
+    async def run(db: AsyncSession):
+        await statement_timeout(db, settings.AGGREGATES_QUERY_TIMEOUT_MS)
+        result = await db.execute(
+            select(Link.id, Link.domain_id, Link.short_code, Link.original_url, Link.clicks)
+            .where(Link.clicks > 0)
+            .order_by(Link.clicks.desc(), Link.id)
+            .limit(limit)
+        )
+        return result.all()
+
+    rows = [row for shard_rows in await shards.fan_out(db, run) for row in shard_rows]
+    return sorted(rows, key=lambda row: (-row.clicks, row.id))[:limit]
+
+
+async def compute_top_domains(db: AsyncSession, *, limit: int) -> List[Tuple[str, int, int]]:
+    """
+    Домены адресов назначения с наибольшим числом ссылок: (host, ссылок, кликов).
+    С шардами сводятся топы шардов с запасом, поэтому хвост списка приблизителен.
+    """
+    shard_limit = limit * 10 if shards.SHARDED else limit
+
+    async def run(db: AsyncSession):
+        if db.get_bind().dialect.name != "postgresql":
+            # SQLite (локальный запуск) без регулярных выражений: хосты считаются в Python
+            result = await db.execute(select(Link.original_url, Link.clicks))
+            counts: Counter = Counter()
+            sums: Counter = Counter()
+            for url, url_clicks in result.all():
+                host = _url_host(url)
+                counts[host] += 1
+                sums[host] += url_clicks or 0
+            return [(host, count, sums[host]) for host, count in counts.most_common(shard_limit)]
+        await statement_timeout(db, settings.AGGREGATES_QUERY_TIMEOUT_MS)
+        host = func.substring(func.lower(Link.original_url), _HOST_PATTERN).label("host")
+        links = func.count().label("links")
+        result = await db.execute(
+            select(host, links, func.coalesce(func.sum(Link.clicks), 0))
+            .group_by(host)
+            .order_by(links.desc())
+            .limit(shard_limit)
+        )
+        return result.all()
+
+    links: Counter = Counter()
+    clicks: Counter = Counter()
+    for rows in await shards.fan_out(db, run):
+        for host, host_links, host_clicks in rows:
+            if host:
+                links[host] += host_links
+                clicks[host] += host_clicks
+    return [(host, count, clicks[host]) for host, count in links.most_common(limit)]
+
+
+async def latest_hour(db: AsyncSession) -> Optional[datetime]:
+    result = await db.execute(select(func.max(LinkStatsHour.hour)))
+    value = result.scalar()
+    return _as_utc(value) if value is not None else None
+
+
+async def replace_snapshot(
+    db: AsyncSession, *, summary: Dict[str, int], refreshed_at: datetime, refresh_ms: int,
+    hours: Dict[datetime, int], hours_since: datetime, keep_since: datetime,
+    top_links: List[tuple], top_domains: List[Tuple[str, int, int]],
+) -> None:
+    """
+    Заменяет агрегаты одним коммитом: читатели видят либо прошлый, либо новый снимок.
+    Часы с `hours_since` пересчитаны заново, часы раньше `keep_since` удаляются.
+    """
+    await db.execute(delete(LinkStatsSummary))
+    await db.execute(insert(LinkStatsSummary).values(
+        id=1, refreshed_at=refreshed_at, refresh_ms=refresh_ms, **summary
+    ))
+    await db.execute(delete(LinkStatsHour).where(
+        or_(LinkStatsHour.hour >= hours_since, LinkStatsHour.hour < keep_since)
+    ))
+    if hours:
+        await db.execute(insert(LinkStatsHour), [
+            {"hour": hour, "created": created} for hour, created in hours.items()
+        ])
+    await db.execute(delete(LinkStatsTopLink))
+    if top_links:
+        await db.execute(insert(LinkStatsTopLink), [
+            {
+                "rank": rank, "link_id": row.id, "domain_id": row.domain_id,
+                "short_code": row.short_code, "original_url": row.original_url, "clicks": row.clicks,
+            }
+            for rank, row in enumerate(top_links, start=1)
+        ])
+    await db.execute(delete(LinkStatsTopDomain))
+    if top_domains:
+        await db.execute(insert(LinkStatsTopDomain), [
+            {"rank": rank, "host": host, "links": links, "clicks": clicks}
+            for rank, (host, links, clicks) in enumerate(top_domains, start=1)
+        ])
+    await db.commit()
+
+
+async def get_summary(db: AsyncSession) -> Optional[LinkStatsSummary]:
+    await statement_timeout(db, settings.ADMIN_STATS_TIMEOUT_MS)
+    result = await db.execute(select(LinkStatsSummary).where(LinkStatsSummary.id == 1))
+    return result.scalar_one_or_none()
+
+
+async def get_created_per_hour(db: AsyncSession, *, since: datetime) -> List[Tuple[datetime, int]]:
+    await statement_timeout(db, settings.ADMIN_STATS_TIMEOUT_MS)
+    result = await db.execute(
+        select(LinkStatsHour.hour, LinkStatsHour.created)
+        .where(LinkStatsHour.hour >= since)
+        .order_by(LinkStatsHour.hour)
+    )
+    return [(_as_utc(hour), created) for hour, created in result.all()]
+
+
+async def get_top_links(db: AsyncSession, *, limit: int) -> List[LinkStatsTopLink]:
+    await statement_timeout(db, settings.ADMIN_STATS_TIMEOUT_MS)
+    result = await db.execute(select(LinkStatsTopLink).order_by(LinkStatsTopLink.rank).limit(limit))
+    return result.scalars().all()
+
+
+async def get_top_domains(db: AsyncSession, *, limit: int) -> List[LinkStatsTopDomain]:
+    await statement_timeout(db, settings.ADMIN_STATS_TIMEOUT_MS)
+    result = await db.execute(select(LinkStatsTopDomain).order_by(LinkStatsTopDomain.rank).limit(limit))
+    return result.scalars().all()
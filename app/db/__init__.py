@@ -1,5 +1,7 @@
 # Модуль для работы с базой данных
 # Здесь могут быть общие импорты или инициализация
 
-# Импортируем все модели для корректной инициализации
-from app.models import User, Link 
\ No newline at end of file
+# Импортируем все модели для корректной инициализации. Импорт модуля, а не имен:
+# app.models сам импортирует app.db.base, и при импорте моделей первыми
+# пакет app.models здесь еще инициализирован не до конца
+import app.models  # noqa: F401
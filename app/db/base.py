@@ -1,21 +1,110 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.sql import func
-from sqlalchemy import Column, DateTime
+from sqlalchemy.sql.functions import now
+from sqlalchemy import Column, DateTime, event
 
 from app.core.config import settings
 
-# Явно указываем использование asyncpg
-db_url = settings.DATABASE_URL
-if not db_url.startswith("postgresql+asyncpg://"):
-    db_url = db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-engine = create_async_engine(db_url, echo=True)
+def async_url(url: str) -> str:
+    """URL для асинхронного драйвера: postgresql:// -> asyncpg, sqlite:// -> aiosqlite"""
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # Читатели не ждут писателя (WAL), а писатели ждут блокировку, а не падают с "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA busy_timeout=30000")
+    cursor.close()
+
+
+@compiles(now, "sqlite")
+def _sqlite_now(element, compiler, **kw):
+    # CURRENT_TIMESTAMP в SQLite - "YYYY-MM-DD HH:MM:SS", а SQLAlchemy передает время как
+    # "YYYY-MM-DD HH:MM:SS.ffffff": строки одного момента не совпадали бы при сравнении
+    # (курсоры по времени изменения). %f - секунды с миллисекундами, дополняем до микросекунд
+    return "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def create_engine(url: str, **kwargs) -> AsyncEngine:
+    """
+    Движок БД по URL. Кроме Postgres (asyncpg) поддерживается SQLite (aiosqlite) -
+    для локального запуска и тестов; `sqlite+aiosqlite://` без пути - БД в памяти,
+    общая для всех сессий процесса.
+    """
+    url = async_url(url)
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, **kwargs)
+    if url.rstrip("/").endswith(":") or ":memory:" in url:
+        # Без StaticPool каждое соединение получило бы свою пустую БД
+        kwargs.setdefault("poolclass", StaticPool)
+        kwargs.setdefault("connect_args", {"check_same_thread": False})
+        return create_async_engine(url, **kwargs)
+    engine = create_async_engine(url, **kwargs)
+    event.listen(engine.sync_engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+engine = create_engine(settings.DATABASE_URL, echo=settings.DATABASE_ECHO)
+
+
+class LazyAsyncSession(AsyncSession):
+    """
+    Сессия, которая запоминает, были ли в ней изменения.
+
+    Соединение из пула берется только при первом запросе к БД, а `get_db`
+    по флагу `has_pending_writes` решает, нужен ли завершающий commit.
+    """
+
+    _has_writes = False
+
+    @property
+    def has_pending_writes(self) -> bool:
+        return self._has_writes or bool(self.new or self.dirty or self.deleted)
+
+    async def execute(self, statement, *args, **kwargs):
+        # INSERT/UPDATE/DELETE, а также autoflush накопленных ORM-изменений
+        if getattr(statement, "is_dml", False) or self.new or self.dirty or self.deleted:
+            self._has_writes = True
+        return await super().execute(statement, *args, **kwargs)
+
+    async def flush(self, *args, **kwargs):
+        if self.new or self.dirty or self.deleted:
+            self._has_writes = True
+        await super().flush(*args, **kwargs)
+
+    async def commit(self):
+        await super().commit()
+        self._has_writes = False
+
+    async def rollback(self):
+        await super().rollback()
+        self._has_writes = False
+
+
 async_session = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
+    engine, class_=LazyAsyncSession, expire_on_commit=False
 )
 
+
+def use_engine(new_engine: AsyncEngine) -> None:
+    """
+    Подменяет движок основной БД (тесты, встраивание): новые сессии async_session
+    и get_db работают с ним. Вызывается до старта приложения.
+    """
+    global engine
+    engine = new_engine
+    async_session.configure(bind=new_engine)
+
 Base = declarative_base()
 
 class BaseModel(Base):
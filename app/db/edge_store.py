@@ -0,0 +1,164 @@
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.crud.link import LinkChange, RedirectTarget
+
+logger = logging.getLogger(__name__)
+
+# Локальный снимок ссылок edge-узла в SQLite (WAL): редирект читает его одним
+# поиском по первичному ключу в памяти процесса, а фоновая синхронизация
+# (app.workers.edge_sync) пишет изменения отдельным соединением, не блокируя чтение.
+# Основной домен хранится как domain_id = 0.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    domain_id INTEGER NOT NULL,
+    short_code TEXT NOT NULL,
+    original_url TEXT NOT NULL,
+    expires_at REAL,
+    changed_at TEXT NOT NULL,
+    generation INTEGER NOT NULL DEFAULT 0,
+    redirect_type INTEGER NOT NULL DEFAULT 307,
+    PRIMARY KEY (domain_id, short_code)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS domains (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_LOOKUP_SQL = (
+    "SELECT original_url, changed_at, expires_at, redirect_type FROM links WHERE domain_id = ? AND short_code = ?"
+)
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    # Время без пояса (SQLite на основном сервисе) хранится в UTC, как и там
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class SQLiteLinkStore:
+    """
+    Реплика активных ссылок только для чтения (реализация LinkStore для edge-узлов).
+    Изменения применяет только синхронизация.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[sqlite3.Connection] = None
+
+    def open(self) -> None:
+        if self._reader is not None:
+            return
+        self._writer = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        self._writer.executescript(SCHEMA)
+        self._migrate()
+        self._reader = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._reader.execute("PRAGMA query_only=ON")
+        logger.info(f"Открыт локальный снимок ссылок {self.path}: {self.count()} ссылок")
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self._writer.execute("PRAGMA table_info(links)")}
+        if "redirect_type" not in columns:
+            # Снимок прошлой версии: типы редиректа строки получат при полной синхронизации на старте
+            self._writer.execute("ALTER TABLE links ADD COLUMN redirect_type INTEGER NOT NULL DEFAULT 307")
+
+    def close(self) -> None:
+        for conn in (self._reader, self._writer):
+            if conn is not None:
+                conn.close()
+        self._reader = self._writer = None
+
+    def lookup(self, short_code: str, domain_id: Optional[int] = None) -> Optional[RedirectTarget]:
+        row = self._reader.execute(_LOOKUP_SQL, (domain_id or 0, short_code)).fetchone()
+        if row is None:
+            return None
+        original_url, changed_at, expires_at, redirect_type = row
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return RedirectTarget(
+            original_url,
+            datetime.fromisoformat(changed_at),
+            datetime.fromtimestamp(expires_at, timezone.utc) if expires_at is not None else None,
+            redirect_type,
+        )
+
+    async def get_redirect_target(
+        self, short_code: str, domain_id: Optional[int] = None
+    ) -> Optional[RedirectTarget]:
+        return self.lookup(short_code, domain_id)
+
+    def count(self) -> int:
+        return self._reader.execute("SELECT count(*) FROM links").fetchone()[0]
+
+    def domains(self) -> List[Tuple[int, str]]:
+        return self._reader.execute("SELECT id, host FROM domains").fetchall()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._reader.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def apply(
+        self,
+        changes: Iterable[LinkChange],
+        domains: Optional[Iterable[Tuple[int, str]]] = None,
+        generation: int = 0,
+        meta: Optional[dict] = None,
+    ) -> None:
+        """Применяет пачку изменений одной транзакцией (вызывается из потока синхронизации)"""
+        upserts, deletes = [], []
+        now = time.time()
+        for change in changes:
+            key = (change.domain_id or 0, change.short_code)
+            expires_at = _timestamp(change.expires_at)
+            if not change.is_active or (expires_at is not None and expires_at <= now):
+                deletes.append(key)
+            else:
+                upserts.append((
+                    *key, change.original_url, expires_at, change.changed_at.isoformat(), generation,
+                    change.redirect_type,
+                ))
+
+        conn = self._writer
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("DELETE FROM links WHERE domain_id = ? AND short_code = ?", deletes)
+            conn.executemany(
+                "INSERT INTO links (domain_id, short_code, original_url, expires_at, changed_at, generation, "
+                "redirect_type) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (domain_id, short_code) DO UPDATE SET "
+                "original_url = excluded.original_url, expires_at = excluded.expires_at, "
+                "changed_at = excluded.changed_at, generation = excluded.generation, "
+                "redirect_type = excluded.redirect_type",
+                upserts,
+            )
+            if domains is not None:
+                conn.execute("DELETE FROM domains")
+                conn.executemany("INSERT INTO domains (id, host) VALUES (?, ?)", list(domains))
+            for key, value in (meta or {}).items():
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def drop_stale(self, generation: int) -> int:
+        """После полной синхронизации удаляет ссылки, которых не было в полном снимке"""
+        return self._writer.execute("DELETE FROM links WHERE generation < ?", (generation,)).rowcount
+
+
+edge_store = SQLiteLinkStore(settings.EDGE_STORE_PATH)
@@ -0,0 +1,67 @@
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from app.db.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Расписание истечения ссылок: sorted set `link:expiry`, член - "{domain_id}:{short_code}"
+# (0 - основной домен), вес - expires_at в секундах. В расписании только ссылки,
+# истекающие в ближайший горизонт (EXPIRY_HORIZON): остальные подгружаются из БД
+# по индексу ix_link_expires_at, когда до их срока остается меньше горизонта.
+
+KEY = "link:expiry"
+
+# Снимает со расписания наступившие сроки атомарно, чтобы две копии задачи
+# не обработали одну ссылку. KEYS[1] - расписание; ARGV: текущее время, лимит
+POP_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+_pop_due_script = redis_client.register_script(POP_DUE_LUA) if redis_client is not None else None
+
+
+def member(short_code: str, domain_id: Optional[int] = None) -> str:
+    return f"{domain_id or 0}:{short_code}"
+
+
+def parse_member(value: str) -> Tuple[Optional[int], str]:
+    domain_id, _, short_code = value.partition(":")
+    return int(domain_id) or None, short_code
+
+
+def score(expires_at: datetime) -> float:
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at.timestamp()
+
+
+async def schedule(links: Iterable[Tuple[Optional[int], str, datetime]]) -> None:
+    """Ставит (или переносит) сроки ссылок: тройки (domain_id, short_code, expires_at)"""
+    mapping = {member(code, domain_id): score(expires_at) for domain_id, code, expires_at in links}
+    if mapping:
+        await redis_client.zadd(KEY, mapping)
+
+
+async def unschedule(links: Iterable[Tuple[Optional[int], str]]) -> None:
+    members = [member(code, domain_id) for domain_id, code in links]
+    if members:
+        await redis_client.zrem(KEY, *members)
+
+
+async def pop_due(limit: int = 1000, now: Optional[float] = None) -> List[Tuple[Optional[int], str]]:
+    """Снимает с расписания ссылки, срок которых наступил: пары (domain_id, short_code)"""
+    due = await _pop_due_script(keys=[KEY], args=[now if now is not None else time.time(), limit])
+    return [parse_member(value) for value in due]
+
+
+async def next_due() -> Optional[float]:
+    """Ближайший срок в расписании (секунды) или None"""
+    entries = await redis_client.zrange(KEY, 0, 0, withscores=True)
+    return entries[0][1] if entries else None
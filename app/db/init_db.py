@@ -0,0 +1,44 @@
+"""
+Создание таблиц базы данных (и таблиц ссылок в шардах).
+
+    python -m app.db.init_db
+
+Запускается один раз перед деплоем (render.yaml: preDeployCommand), а не при
+старте каждого инстанса. Для локального запуска без отдельного шага есть
+INIT_DB_ON_STARTUP=true.
+"""
+import asyncio
+import logging
+
+from app.db import base, shards
+from app.db.base import Base
+
+logger = logging.getLogger(__name__)
+
+
+async def init_db() -> None:
+    async with base.engine.begin() as conn:
+        logger.info("Создание таблиц базы данных...")
+        await conn.run_sync(Base.metadata.create_all, tables=shards.main_tables())
+    if shards.SHARDED:
+        logger.info(f"Создание таблиц ссылок в шардах: {len(shards.engines)}")
+        await shards.create_tables()
+    logger.info("Таблицы успешно созданы")
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    base.engine.echo = False
+
+    async def run():
+        try:
+            await init_db()
+        finally:
+            await base.engine.dispose()
+            await shards.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+from app.db.redis import redis_client
+
+# Аренда в Valkey для фоновых задач, которые во всех воркерах должны выполняться
+# одним экземпляром (реле outbox, истечение ссылок). Аренду продлевает только
+# текущий владелец; если он пропал, ее через ttl забирает другой процесс.
+
+# KEYS[1] - ключ аренды; ARGV: токен процесса, срок аренды (мс)
+LEASE_LUA = """
+local cur = redis.call('GET', KEYS[1])
+if cur and cur ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+_lease_script = redis_client.register_script(LEASE_LUA) if redis_client is not None else None
+
+
+async def hold(key: str, token: str, ttl_ms: int) -> bool:
+    """Берет или продлевает аренду `key` для `token`. True - аренда у этого процесса"""
+    return bool(await _lease_script(keys=[key], args=[token, ttl_ms]))
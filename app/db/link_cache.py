@@ -0,0 +1,170 @@
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.hotlinks import hot_links
+from app.core.redirects import Redirect
+from app.db import response_cache
+from app.db.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Кэш редиректов: hash `linkv:{domain_id}:{short_code}` (0 - основной домен) с полями `url`, `v` (версия ссылки
+# в микросекундах, берется из updated_at/created_at), `t` (тип редиректа) и `x` (срок действия
+# ссылки, unix-время; пусто - бессрочная). Запись из промаха кэша
+# проходит только если ее версия строго новее версии в кэше, поэтому редирект,
+# прочитавший старую строку, не может вернуть в кэш устаревший URL после
+# обновления или удаления ссылки. Инвалидация пишет "надгробие" (пустой url)
+# с версией изменения и такое же надгробие в кэш ответов /links/{short_code}
+# (app.db.response_cache), удаляя ответы не новее изменения.
+# Все версии берутся из строк БД (часы БД), а не из часов приложения. При равных
+# версиях (updated_at на SQLite - с точностью до миллисекунды) побеждает надгробие:
+# до его истечения ссылка читается из БД.
+
+# KEYS[1] - ключ ссылки; ARGV: версия, url, ttl (мс), тип редиректа, срок действия
+STORE_LUA = """
+local cur = redis.call('HGET', KEYS[1], 'v')
+if cur and tonumber(cur) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'v', ARGV[1], 'url', ARGV[2], 't', ARGV[4], 'x', ARGV[5])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# KEYS - пары (ключ ссылки, ключ кэша ответов); ARGV[1] - ttl надгробия (мс),
+# ARGV[2..] - версии изменения для каждой пары
+INVALIDATE_LUA = """
+for i = 1, #KEYS, 2 do
+    local version = ARGV[(i + 1) / 2 + 1]
+    local cur = redis.call('HGET', KEYS[i], 'v')
+    if not cur or tonumber(cur) <= tonumber(version) then
+        redis.call('HSET', KEYS[i], 'v', version, 'url', '')
+        redis.call('PEXPIRE', KEYS[i], ARGV[1])
+    end
+    local resp = redis.call('HMGET', KEYS[i + 1], 'v', 'd')
+    if not resp[1] or tonumber(resp[1]) <= tonumber(version) then
+        local tombstone = version
+        if resp[2] and tonumber(resp[2]) > tonumber(version) then
+            tombstone = resp[2]
+        end
+        redis.call('DEL', KEYS[i + 1])
+        redis.call('HSET', KEYS[i + 1], 'd', tombstone)
+        redis.call('PEXPIRE', KEYS[i + 1], ARGV[1])
+    end
+end
+return #KEYS / 2
+"""
+
+_store_script = redis_client.register_script(STORE_LUA) if redis_client is not None else None
+_invalidate_script = redis_client.register_script(INVALIDATE_LUA) if redis_client is not None else None
+
+
+def key(short_code: str, domain_id: Optional[int] = None) -> str:
+    return f"linkv:{domain_id or 0}:{short_code}"
+
+
+def version_of(timestamp: Optional[datetime]) -> int:
+    """Версия записи кэша по времени последнего изменения ссылки"""
+    if timestamp is None:
+        return 0
+    if timestamp.tzinfo is None:
+        # SQLite возвращает время без пояса, хранится оно в UTC
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1_000_000)
+
+
+def expires_timestamp(expires_at: Optional[datetime]) -> Optional[float]:
+    """Срок действия ссылки в unix-времени (None - бессрочная)"""
+    if expires_at is None:
+        return None
+    if expires_at.tzinfo is None:
+        # Время ссылок хранится в UTC (SQLite возвращает его без пояса)
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at.timestamp()
+
+
+def ttl_seconds(expires_at: Optional[datetime]) -> float:
+    """Время жизни записи кэша: не дольше LINK_CACHE_TTL и не дольше самой ссылки"""
+    ttl = settings.LINK_CACHE_TTL
+    if expires_at is not None:
+        ttl = min(ttl, expires_timestamp(expires_at) - time.time())
+    return ttl
+
+
+async def get_url(short_code: str, domain_id: Optional[int] = None) -> Optional[str]:
+    """URL из кэша или None (нет записи, надгробие или ошибка Valkey)"""
+    if redis_client is None:
+        return None
+    try:
+        return await redis_client.hget(key(short_code, domain_id), "url") or None
+    except Exception as e:
+        logger.warning(f"Ошибка чтения кэша для {short_code}: {e}")
+        return None
+
+
+async def get(short_code: str, domain_id: Optional[int] = None) -> Optional[Redirect]:
+    """Редирект из кэша или None (нет записи, надгробие или ошибка Valkey)"""
+    if redis_client is None:
+        return None
+    try:
+        url, redirect_type, expires_at = await redis_client.hmget(key(short_code, domain_id), "url", "t", "x")
+    except Exception as e:
+        logger.warning(f"Ошибка чтения кэша для {short_code}: {e}")
+        return None
+    if not url:
+        return None
+    return Redirect(url, int(redirect_type or 307), float(expires_at) if expires_at else None)
+
+
+async def store(
+    short_code: str, url: str, version: int, expires_at: Optional[datetime] = None,
+    domain_id: Optional[int] = None, redirect_type: int = 307
+) -> bool:
+    """Кладет URL в кэш, если там нет такой же или более новой версии. Возвращает, записан ли он"""
+    if _store_script is None:
+        return False
+    ttl_ms = int(ttl_seconds(expires_at) * 1000)
+    if ttl_ms <= 0:
+        return False
+    expires = expires_timestamp(expires_at)
+    try:
+        return bool(await _store_script(
+            keys=[key(short_code, domain_id)],
+            args=[version, url, ttl_ms, redirect_type, "" if expires is None else expires],
+        ))
+    except Exception as e:
+        logger.warning(f"Ошибка записи кэша для {short_code}: {e}")
+        return False
+
+
+async def invalidate(short_code: str, version: int, domain_id: Optional[int] = None) -> None:
+    """
+    Сбрасывает кэш ссылки после изменения с версией `version` - по updated_at
+    строки, которую вернул UPDATE/DELETE ... RETURNING.
+    """
+    await invalidate_many([(domain_id, short_code)], [version])
+
+
+async def invalidate_many(links: Iterable[Tuple[Optional[int], str]], versions: Sequence[int]) -> None:
+    """
+    Сбрасывает кэш многих ссылок одним вызовом Lua-скрипта (для фоновых задач и админки).
+    `links` - пары (domain_id, short_code), `versions` - версии их изменений.
+    """
+    links = list(links)
+    for domain_id, short_code in links:
+        hot_links.unpin(short_code, domain_id)
+    if _invalidate_script is None or not links:
+        return
+    keys = []
+    for domain_id, short_code in links:
+        keys.append(key(short_code, domain_id))
+        keys.append(response_cache.key(short_code, domain_id))
+    try:
+        await _invalidate_script(
+            keys=keys, args=[settings.LINK_CACHE_TOMBSTONE_TTL * 1000, *versions]
+        )
+    except Exception as e:
+        logger.warning(f"Ошибка инвалидации кэша для {len(links)} ссылок: {e}")
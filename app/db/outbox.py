@@ -0,0 +1,108 @@
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.db.redis import redis_client
+from app.models.link_event import LinkEvent
+
+logger = logging.getLogger(__name__)
+
+# Лента изменений ссылок - поток Valkey OUTBOX_STREAM. Записи добавляет только реле
+# outbox (app.workers.outbox), поэтому ID записи потока - единый курсор ленты
+# и для нескольких шардов. Доставка "хотя бы один раз": после сбоя реле событие
+# может повториться, получатели различают события по паре (shard, id).
+
+FIELDS = (
+    "id", "shard", "op", "link_id", "domain_id", "short_code",
+    "original_url", "expires_at", "is_active", "created_at", "redirect_type",
+)
+_INT_FIELDS = ("id", "shard", "link_id", "domain_id", "redirect_type")
+
+START = "0-0"
+
+
+class CursorExpired(Exception):
+    """Курсор старше самых старых записей потока: часть событий уже удалена"""
+
+
+def _encode(event: LinkEvent, shard: int) -> Dict[str, Any]:
+    # В потоке только строки; None хранится как пустая строка
+    values = {
+        "id": event.id,
+        "shard": shard,
+        "op": event.op,
+        "link_id": event.link_id,
+        "domain_id": event.domain_id,
+        "short_code": event.short_code,
+        "original_url": event.original_url,
+        "expires_at": event.expires_at.isoformat() if event.expires_at is not None else None,
+        "is_active": {True: "1", False: "0"}.get(event.is_active),
+        "created_at": event.created_at.isoformat() if event.created_at is not None else None,
+        "redirect_type": event.redirect_type,
+    }
+    return {name: "" if value is None else value for name, value in values.items()}
+
+
+def _decode(fields: Dict[str, str]) -> Dict[str, Any]:
+    event: Dict[str, Any] = {name: fields.get(name) or None for name in FIELDS}
+    for name in _INT_FIELDS:
+        if event[name] is not None:
+            event[name] = int(event[name])
+    if event["is_active"] is not None:
+        event["is_active"] = event["is_active"] == "1"
+    return event
+
+
+def _id_tuple(entry_id: str) -> Tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def enabled() -> bool:
+    return redis_client is not None
+
+
+async def publish(events: Sequence[LinkEvent], shard: int = 0) -> None:
+    """Добавляет события в поток одним конвейером (вызывает только реле)"""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for event in events:
+            pipe.xadd(
+                settings.OUTBOX_STREAM, _encode(event, shard),
+                maxlen=settings.OUTBOX_STREAM_MAXLEN, approximate=True,
+            )
+        await pipe.execute()
+
+
+async def head() -> str:
+    """ID последней записи потока - курсор "с текущего момента" """
+    entries = await redis_client.xrevrange(settings.OUTBOX_STREAM, count=1)
+    return entries[0][0] if entries else START
+
+
+async def read(
+    since: Optional[str], *, timeout: float = 0, limit: int = 1000
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    События после курсора `since` (None - только новые) и курсор для следующего запроса.
+    Если событий нет, ждет их до `timeout` секунд. Курсор, который уже вытеснен
+    из потока, вызывает CursorExpired - получателю нужна полная пересинхронизация.
+    """
+    if since is None:
+        since = await head()
+    elif since != START:
+        try:
+            since_key = _id_tuple(since)
+        except ValueError:
+            raise ValueError(f"Некорректный курсор: {since}")
+        first = await redis_client.xrange(settings.OUTBOX_STREAM, count=1)
+        # Курсор - ID записи, которую получатель уже видел; если ее нет, а поток начинается
+        # позже, то между ними могли быть вытесненные события
+        if first and _id_tuple(first[0][0]) > since_key:
+            raise CursorExpired(since)
+
+    block = int(timeout * 1000) if timeout > 0 else None
+    response = await redis_client.xread({settings.OUTBOX_STREAM: since}, count=limit, block=block)
+    entries = response[0][1] if response else []
+    if not entries:
+        return [], since
+    return [_decode(fields) for _, fields in entries], entries[-1][0]
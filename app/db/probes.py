@@ -0,0 +1,120 @@
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.db.expiry_schedule import POP_DUE_LUA, member, parse_member
+from app.db.redis import redis_client
+
+# Проверка адресов назначения (app.workers.probe) в Valkey:
+#   link:probe          - sorted set, член "{domain_id}:{short_code}", вес - время следующей проверки;
+#   link:probe:failing  - sorted set недоступных адресов, вес - время первой неудачной проверки;
+#   probe:{member}      - hash с адресом и результатом последней проверки.
+# Результаты живут RESULT_TTL секунд без обновления - записи удаленных ссылок исчезают сами.
+
+SCHEDULE_KEY = "link:probe"
+FAILING_KEY = "link:probe:failing"
+RESULT_TTL = 7 * 24 * 3600
+
+# Поля результата, которые отдаются в превью ссылки
+PREVIEW_FIELDS = ("status", "ok", "title", "final_url", "error", "checked_at")
+
+_pop_due_script = redis_client.register_script(POP_DUE_LUA) if redis_client is not None else None
+
+
+def result_key(short_code: str, domain_id: Optional[int] = None) -> str:
+    return f"probe:{member(short_code, domain_id)}"
+
+
+async def schedule(links: Dict[Tuple[Optional[int], str], float], only_new: bool = False) -> None:
+    """Назначает время проверки ссылкам {(domain_id, short_code): время}. only_new - не переносить уже назначенные"""
+    mapping = {member(code, domain_id): at for (domain_id, code), at in links.items()}
+    if mapping:
+        await redis_client.zadd(SCHEDULE_KEY, mapping, nx=only_new)
+
+
+async def pop_due(limit: int, now: Optional[float] = None) -> List[Tuple[Optional[int], str]]:
+    """Снимает с расписания ссылки, которые пора проверить: пары (domain_id, short_code)"""
+    due = await _pop_due_script(keys=[SCHEDULE_KEY], args=[now if now is not None else time.time(), limit])
+    return [parse_member(value) for value in due]
+
+
+async def next_due() -> Optional[float]:
+    entries = await redis_client.zrange(SCHEDULE_KEY, 0, 0, withscores=True)
+    return entries[0][1] if entries else None
+
+
+async def set_targets(targets: Iterable[Tuple[Optional[int], str, str, Optional[int]]]) -> None:
+    """Запоминает адреса ссылок: четверки (domain_id, short_code, original_url, clicks или None)"""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for domain_id, code, url, clicks in targets:
+            fields = {"url": url} if clicks is None else {"url": url, "clicks": clicks}
+            key = result_key(code, domain_id)
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, RESULT_TTL)
+        await pipe.execute()
+
+
+async def forget(links: Iterable[Tuple[Optional[int], str]]) -> None:
+    """Убирает удаленные и истекшие ссылки из расписания и результатов"""
+    members = [member(code, domain_id) for domain_id, code in links]
+    if not members:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zrem(SCHEDULE_KEY, *members)
+        pipe.zrem(FAILING_KEY, *members)
+        pipe.delete(*(f"probe:{value}" for value in members))
+        await pipe.execute()
+
+
+async def get_many(links: List[Tuple[Optional[int], str]]) -> List[Dict[str, str]]:
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for domain_id, code in links:
+            pipe.hgetall(result_key(code, domain_id))
+        return await pipe.execute()
+
+
+async def store(domain_id: Optional[int], short_code: str, result: Dict[str, str], failing_since: Optional[float]) -> None:
+    """Сохраняет результат проверки и отмечает ссылку в списке недоступных (None - доступна)"""
+    key = result_key(short_code, domain_id)
+    value = member(short_code, domain_id)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hset(key, mapping=result)
+        pipe.expire(key, RESULT_TTL)
+        if failing_since is None:
+            pipe.zrem(FAILING_KEY, value)
+        else:
+            pipe.zadd(FAILING_KEY, {value: failing_since}, nx=True)
+        await pipe.execute()
+
+
+async def get_preview(short_code: str, domain_id: Optional[int] = None) -> Optional[dict]:
+    """Последний результат проверки адреса ссылки или None, если проверок еще не было"""
+    if redis_client is None:
+        return None
+    result = await redis_client.hgetall(result_key(short_code, domain_id))
+    if not result.get("checked_at"):
+        return None
+    preview = {field: result.get(field) or None for field in PREVIEW_FIELDS}
+    preview["status"] = int(preview["status"]) if preview["status"] else None
+    preview["ok"] = preview["ok"] == "1"
+    return preview
+
+
+async def failing(limit: int = 100) -> List[dict]:
+    """Недоступные адреса, начиная с давно недоступных"""
+    entries = await redis_client.zrange(FAILING_KEY, 0, limit - 1, withscores=True)
+    links = [parse_member(value) for value, _ in entries]
+    results = await get_many(links)
+    return [
+        {
+            "short_code": code,
+            "domain_id": domain_id,
+            "failing_since": datetime.fromtimestamp(since, timezone.utc).isoformat(),
+            "original_url": result.get("url"),
+            "failures": int(result.get("failures") or 0),
+            "status": int(result["status"]) if result.get("status") else None,
+            "error": result.get("error") or None,
+            "checked_at": result.get("checked_at"),
+        }
+        for (domain_id, code), (_, since), result in zip(links, entries, results)
+    ]
@@ -5,9 +5,99 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Серверы Valkey в памяти процесса по имени из memory://<имя>
+_memory_servers = {}
+
+
+def create_client(url: str):
+    """
+    Клиент Valkey по URL. memory://[имя] - Valkey в памяти процесса (fakeredis):
+    для тестов и локального запуска без сервера, клиенты с одним именем видят
+    одни данные. Lua-скрипты (register_script) выполняются через lupa.
+    """
+    if url.startswith("memory://"):
+        # fakeredis нужен только тестам - не зависимость сервиса
+        import fakeredis
+
+        name = url[len("memory://"):] or "default"
+        server = _memory_servers.get(name)
+        if server is None:
+            server = _memory_servers[name] = fakeredis.FakeServer()
+        return fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    return redis.from_url(url, decode_responses=True)
+
+
+class _Script:
+    """Lua-скрипт ValkeyClient: регистрируется у того клиента, который сейчас подставлен"""
+
+    def __init__(self, owner: "ValkeyClient", script: str):
+        self._owner = owner
+        self._script = script
+        self._client = None
+        self._registered = None
+
+    def __call__(self, keys=None, args=None, client=None):
+        current = self._owner.client
+        if self._client is not current:
+            self._registered = current.register_script(self._script)
+            self._client = current
+        return self._registered(keys=keys, args=args, client=client)
+
+
+class ValkeyClient:
+    """
+    Клиент Valkey приложения. Модули импортируют этот объект при старте, а команды
+    передаются клиенту, подставленному сейчас, - его можно заменить через use_client
+    (тесты, встраивание) уже после импорта модулей, как движок БД через base.use_engine.
+    """
+
+    def __init__(self, client):
+        self._instrument = None
+        self.client = client
+
+    @property
+    def client(self):
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        if self._instrument is not None:
+            self._instrument(client)
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def instrument(self, hook) -> None:
+        """
+        Применяет hook (например, замеры профилирования) к текущему клиенту и к
+        каждому клиенту, подставленному позже через use_client
+        """
+        self._instrument = hook
+        hook(self._client)
+
+    def register_script(self, script: str) -> _Script:
+        return _Script(self, script)
+
+
+def use_client(client) -> None:
+    """
+    Подменяет клиент Valkey: команды и Lua-скрипты всех модулей уходят ему.
+    Вызывается до старта приложения. Valkey, отключенный при импорте
+    (EDGE_MODE или ошибка настройки), так не включить
+    """
+    if redis_client is None:
+        raise RuntimeError("Valkey отключен: клиент нельзя подменить")
+    redis_client.client = client
+
+
 try:
-    redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
-    logger.info(f"Redis подключен к {settings.REDIS_URL}")
+    if settings.EDGE_MODE:
+        # Edge-узел работает без Valkey: кэши и лимиты только в памяти процесса
+        redis_client = None
+    else:
+        redis_client = ValkeyClient(create_client(settings.REDIS_URL))
+        logger.info(f"Redis подключен к {settings.REDIS_URL}")
 except Exception as e:
     logger.error(f"Ошибка подключения к Redis: {e}")
     # Создаем заглушку для клиента Redis, чтобы приложение могло запуститься
@@ -18,11 +108,10 @@ async def get_redis():
     if redis_client is None:
         logger.warning("Redis клиент не инициализирован, возвращаем None")
         yield None
+        return
 
     try:
         yield redis_client
     except Exception as e:
         logger.error(f"Ошибка при использовании Redis: {e}")
         raise e
-    finally:
-        pass
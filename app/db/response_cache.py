@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import time
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.db.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Кэш готовых JSON-ответов для GET /links/{short_code} и /links/{short_code}/stats.
+# Все ответы по одной ссылке лежат в одном hash `linkresp:{domain_id}:{short_code}` с полями
+# `{kind}:{viewer}`, поэтому инвалидация при изменении ссылки - это одна операция.
+# Значение поля: "<срок годности (unix)>\n<etag>\n<тело ответа>"
+#
+# Ответы версионируются так же, как кэш редиректов (app.db.link_cache): поле `v` -
+# версия строки, из которой собраны ответы, `d` - версия последнего изменения
+# (надгробие, его пишет link_cache.invalidate). Ответ, собранный из строки,
+# прочитанной до изменения, не старше надгробия и не записывается.
+
+# KEYS[1] - ключ ответов ссылки; ARGV: версия, поле, значение, ttl (мс)
+STORE_LUA = """
+local cur = redis.call('HMGET', KEYS[1], 'v', 'd')
+local version = tonumber(ARGV[1])
+if cur[2] and tonumber(cur[2]) >= version then
+    return 0
+end
+if cur[1] and tonumber(cur[1]) ~= version then
+    if tonumber(cur[1]) > version then
+        return 0
+    end
+    -- ответы более старой версии устарели
+    redis.call('DEL', KEYS[1])
+    if cur[2] then
+        redis.call('HSET', KEYS[1], 'd', cur[2])
+    end
+end
+redis.call('HSET', KEYS[1], 'v', ARGV[1], ARGV[2], ARGV[3])
+if redis.call('PTTL', KEYS[1]) < tonumber(ARGV[4]) then
+    redis.call('PEXPIRE', KEYS[1], ARGV[4])
+end
+return 1
+"""
+
+_store_script = redis_client.register_script(STORE_LUA) if redis_client is not None else None
+
+
+def key(short_code: str, domain_id: Optional[int] = None) -> str:
+    return f"linkresp:{domain_id or 0}:{short_code}"
+
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из частей ответа (тело, версия и т.п.)"""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+async def get(
+    short_code: str, kind: str, viewer: str, domain_id: Optional[int] = None
+) -> Optional[Tuple[str, str]]:
+    """Возвращает (etag, тело) из кэша или None"""
+    if redis_client is None:
+        return None
+    try:
+        value = await redis_client.hget(key(short_code, domain_id), f"{kind}:{viewer}")
+    except Exception as e:
+        logger.warning(f"Ошибка чтения кэша ответов для {short_code}: {e}")
+        return None
+    if not value:
+        return None
+    expires, etag, body = value.split("\n", 2)
+    if float(expires) < time.time():
+        return None
+    return etag, body
+
+
+async def store(
+    short_code: str, kind: str, viewer: str, etag: str, body: str, version: int,
+    domain_id: Optional[int] = None
+) -> bool:
+    """
+    Кэширует ответ, собранный из строки ссылки версии `version` (link_cache.version_of),
+    если она строго новее последнего изменения ссылки. Возвращает, записан ли ответ.
+    Сброс кэша - link_cache.invalidate вместе с кэшем редиректов.
+    """
+    if _store_script is None:
+        return False
+    ttl = settings.LINK_RESPONSE_CACHE_TTL
+    try:
+        return bool(await _store_script(
+            keys=[key(short_code, domain_id)],
+            args=[version, f"{kind}:{viewer}", f"{time.time() + ttl}\n{etag}\n{body}", ttl * 1000],
+        ))
+    except Exception as e:
+        logger.warning(f"Ошибка записи кэша ответов для {short_code}: {e}")
+        return False
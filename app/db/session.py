@@ -4,12 +4,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Ленивая сессия: соединение из пула берется только при первом запросе,
+    а commit выполняется только если в сессии были изменения.
+    Анонимные запросы и попадания в кэш соединение не занимают вовсе.
+    """
     async with async_session() as session:
         try:
             yield session
-            await session.commit()
+            if session.has_pending_writes:
+                await session.commit()
         except Exception:
-            await session.rollback()
+            if session.in_transaction():
+                await session.rollback()
             raise
-        finally:
-            await session.close() 
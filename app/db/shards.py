@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base import Base, LazyAsyncSession, create_engine
+from app.models.link import SHARDED, Link, LinkArchive
+from app.models.link_event import LinkEvent
+
+# Шардирование ссылок по нескольким БД Postgres.
+#
+# Шард ссылки определяется только ее коротким кодом (jump consistent hash),
+# поэтому маршрутизация не требует справочника, а все ссылки с одним кодом
+# (на разных доменах) лежат в одном шарде и их уникальность проверяет сама БД.
+# При добавлении шарда переезжает примерно 1/N ссылок.
+# Без SHARD_DATABASE_URLS все функции работают с переданной сессией основной БД.
+
+T = TypeVar("T")
+
+# Outbox изменений живет рядом со ссылками, чтобы писаться в той же транзакции
+SHARD_TABLES = [Link.__table__, LinkArchive.__table__, LinkEvent.__table__]
+
+
+engines = [create_engine(url) for url in settings.SHARD_URLS]
+session_factories = [
+    sessionmaker(engine, class_=LazyAsyncSession, expire_on_commit=False) for engine in engines
+]
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping, Veach): номер корзины для 64-битного ключа"""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+def shard_for(short_code: str) -> int:
+    digest = hashlib.blake2b(short_code.encode(), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, "big"), len(session_factories))
+
+
+def group_by_shard(items: Iterable[T], short_code: Callable[[T], str]) -> Dict[int, List[T]]:
+    groups: Dict[int, List[T]] = defaultdict(list)
+    for item in items:
+        groups[shard_for(short_code(item))].append(item)
+    return groups
+
+
+@asynccontextmanager
+async def _shard_session(shard_id: int):
+    async with session_factories[shard_id]() as session:
+        yield session
+        # Как get_db: фиксируем только если были изменения
+        if session.has_pending_writes:
+            await session.commit()
+
+
+@asynccontextmanager
+async def link_session(db: AsyncSession, short_code: str):
+    """Сессия шарда, в котором лежит ссылка с этим кодом (без шардов - сама `db`)"""
+    if not SHARDED:
+        yield db
+        return
+    async with _shard_session(shard_for(short_code)) as session:
+        yield session
+
+
+def count() -> int:
+    """Число шардов (без шардирования - один, основная БД)"""
+    return len(session_factories) if SHARDED else 1
+
+
+async def fan_out(
+    db: AsyncSession,
+    query: Callable[[AsyncSession], Awaitable[T]],
+    shard_ids: Optional[Iterable[int]] = None,
+) -> List[T]:
+    """Выполняет `query` параллельно во всех (или указанных) шардах и возвращает список результатов"""
+    return await per_shard(db, lambda session, shard_id: query(session), shard_ids)
+
+
+async def per_shard(
+    db: AsyncSession,
+    query: Callable[[AsyncSession, int], Awaitable[T]],
+    shard_ids: Optional[Iterable[int]] = None,
+) -> List[T]:
+    """Как fan_out, но `query` получает и номер шарда (для курсоров по шардам)"""
+    if not SHARDED:
+        return [await query(db, 0)]
+
+    async def run(shard_id: int) -> T:
+        async with _shard_session(shard_id) as session:
+            return await query(session, shard_id)
+
+    if shard_ids is None:
+        shard_ids = range(len(session_factories))
+    return list(await asyncio.gather(*(run(shard_id) for shard_id in shard_ids)))
+
+
+def main_tables() -> Optional[list]:
+    """Таблицы основной БД для create_all (None - все)"""
+    if not SHARDED:
+        return None
+    return [table for table in Base.metadata.sorted_tables if table not in SHARD_TABLES]
+
+
+async def _interleave_ids(conn, shard_id: int) -> None:
+    # id должны быть уникальны между шардами: шард i выдает i+1, i+1+N, i+1+2N, ...
+    shards = len(engines)
+    result = await conn.execute(text(
+        "SELECT increment_by FROM pg_sequences WHERE sequencename = 'link_id_seq'"
+    ))
+    if result.scalar() == shards:
+        return
+    max_id = (await conn.execute(text("SELECT coalesce(max(id), 0) FROM link"))).scalar()
+    start = (max_id // shards + 1) * shards + shard_id + 1
+    await conn.execute(text(f"ALTER SEQUENCE link_id_seq INCREMENT BY {shards} RESTART WITH {start}"))
+
+
+async def create_tables() -> None:
+    for shard_id, engine in enumerate(engines):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=SHARD_TABLES)
+            if conn.dialect.name == "postgresql":
+                await _interleave_ids(conn, shard_id)
+
+
+async def dispose() -> None:
+    for engine in engines:
+        await engine.dispose()
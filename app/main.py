@@ -1,11 +1,28 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
-from app.api.routes import links, auth
+from sqlalchemy import text
+
+from app.api.routes import admin, domains, edge, links, auth
+from app.api.redirect import RedirectMiddleware
 from app.core.config import settings
-from app.db.base import Base, engine
+from app.core import profiling
+from app.core.qr import qr_cache
+from app.core.tenants import host_table
+from app.db import base
+from app.db import shards
+from app.db.init_db import init_db
+from app.db.redis import redis_client
+from app.db.edge_store import edge_store
+from app.workers.aggregates import aggregates_worker
+from app.workers.clicks import click_buffer
+from app.workers.edge_sync import edge_sync
+from app.workers.expiry import expiry_worker
+from app.workers.outbox import outbox_relay
+from app.workers.probe import probe_worker
 
 
 # TODO настроить нормальное логирование
@@ -23,6 +40,7 @@ description = """
 * **Статистика** - отслеживание количества переходов по ссылкам
 * **Управление ссылками** - обновление, удаление, создание кастомных ссылок
 * **Срок жизни** - настройка времени действия ссылок
+* **Собственные домены** - короткие ссылки на своем домене с отдельным пространством кодов
 * **Авторизация** - защита доступа к управлению ссылками
 
 ## Особенности
@@ -35,23 +53,78 @@ description = """
 """
 
 
-# TODO Кажется не очень хорошо инициализировать БД здесь и стоит вынести в другое место
+async def _warm_up() -> None:
+    # Соединения с БД и Valkey открываются до первого запроса, а не на нем
+    async def database():
+        async with base.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def valkey():
+        if redis_client is not None:
+            await redis_client.ping()
+
+    for name, result in zip(("БД", "Valkey"), await asyncio.gather(database(), valkey(), return_exceptions=True)):
+        if isinstance(result, Exception):
+            logger.warning(f"Не удалось заранее подключиться к {name}: {result}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Запуск приложения...")
-    try:
-        logger.info("Проверка подключения к базе данных...")
-        async with engine.begin() as conn:
-            logger.info("Создание таблиц базы данных...")
-            await conn.run_sync(Base.metadata.create_all)
-            logger.info("Таблицы успешно созданы")
-    except Exception as e:
-        logger.error(f"Ошибка при инициализации базы данных: {e}")
-        raise e
+    # Таблицы создает отдельный шаг деплоя (python -m app.db.init_db),
+    # чтобы новый инстанс начинал обслуживать запросы сразу
+    if settings.INIT_DB_ON_STARTUP:
+        try:
+            await init_db()
+        except Exception as e:
+            logger.error(f"Ошибка при инициализации базы данных: {e}")
+            raise e
+
+    await asyncio.gather(_warm_up(), host_table.start())
+    if settings.PROFILING_ENABLED:
+        profiling.stack_sampler.start()
+    click_buffer.start()
+    if settings.BACKGROUND_WORKERS:
+        outbox_relay.start()
+        expiry_worker.start()
+        aggregates_worker.start()
+        if settings.PROBE_ENABLED:
+            probe_worker.start()
 
     yield
 
     logger.info("Завершение работы приложения...")
+    await probe_worker.stop()
+    await aggregates_worker.stop()
+    await expiry_worker.stop()
+    await outbox_relay.stop()
+    await click_buffer.stop()
+    await host_table.stop()
+    qr_cache.shutdown()
+    profiling.stack_sampler.stop()
+    # Соединения закрываются явно: иначе Postgres видит оборванные соединения,
+    # а поток aiosqlite не дает процессу завершиться
+    await base.engine.dispose()
+    await shards.dispose()
+
+
+@asynccontextmanager
+async def edge_lifespan(app: FastAPI):
+    # Edge-узел не подключается к БД и Valkey: редиректы идут из локального снимка ссылок
+    logger.info(f"Запуск edge-узла, основной сервис: {settings.EDGE_PRIMARY_URL}")
+    edge_store.open()
+    await host_table.start()
+    if settings.PROFILING_ENABLED:
+        profiling.stack_sampler.start()
+    edge_sync.start()
+
+    yield
+
+    logger.info("Завершение работы edge-узла...")
+    await edge_sync.stop()
+    await host_table.stop()
+    profiling.stack_sampler.stop()
+    edge_store.close()
 
 app = FastAPI(
     title="URL Cutter API",
@@ -66,12 +139,24 @@ app = FastAPI(
             "name": "links",
             "description": "Операции с короткими ссылками: создание, редактирование, статистика и перенаправление",
         },
+        {
+            "name": "domains",
+            "description": "Собственные домены пользователей для коротких ссылок",
+        },
+        {
+            "name": "edge",
+            "description": "Репликация ссылок на edge-узлы редиректов (по токену X-Edge-Token)",
+        },
+        {
+            "name": "admin",
+            "description": "Служебные операции для администраторов",
+        },
         {
             "name": "status",
             "description": "Проверка статуса API",
         },
     ],
-    lifespan=lifespan,
+    lifespan=edge_lifespan if settings.EDGE_MODE else lifespan,
 )
 
 # TODO настроить корректные значения
@@ -83,7 +168,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Быстрый обработчик редиректов добавляется последним, чтобы стоять перед CORS и роутером
+app.add_middleware(RedirectMiddleware)
+
+# Профилирование стоит перед всеми обработчиками, включая редиректы
+if settings.PROFILING_ENABLED:
+    profiling.install()
+    app.add_middleware(profiling.ProfilingMiddleware)
+
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
+app.include_router(domains.router, prefix="/domains", tags=["domains"])
+app.include_router(edge.router, prefix="/edge", tags=["edge"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 app.include_router(links.router, tags=["links"])
 
 @app.get("/", tags=["status"])
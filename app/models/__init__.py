@@ -1,4 +1,7 @@
 from app.models.user import User
-from app.models.link import Link
+from app.models.link import Link, LinkArchive
+from app.models.link_event import LinkEvent
+from app.models.link_stats import LinkStatsHour, LinkStatsSummary, LinkStatsTopDomain, LinkStatsTopLink
+from app.models.domain import Domain
 
 # Импорт всех моделей для правильной инициализации базы данных 
\ No newline at end of file
@@ -0,0 +1,23 @@
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, ForeignKey, text
+from app.db.base import BaseModel
+
+
+class Domain(BaseModel):
+    # Хост уникален только среди подтвержденных доменов: заявку на чужой хост
+    # может оставить кто угодно, но активен домен только после подтверждения владения
+    __table_args__ = (
+        Index("uq_domain_verified_host", "host", unique=True,
+              postgresql_where=text("verified_at IS NOT NULL"), sqlite_where=text("verified_at IS NOT NULL")),
+    )
+
+    id = Column(Integer, primary_key=True, index=True,
+                comment="Уникальный идентификатор домена")
+    host = Column(String, index=True, nullable=False,
+                  comment="Имя хоста (в нижнем регистре, без порта)")
+    user_id = Column(Integer, ForeignKey("user.id"), nullable=False,
+                     comment="ID пользователя, владеющего доменом")
+    is_active = Column(Boolean, default=True, comment="Активен ли домен")
+    verification_token = Column(String, nullable=False,
+                                comment="Значение TXT-записи, подтверждающей владение доменом")
+    verified_at = Column(DateTime(timezone=True), nullable=True,
+                         comment="Когда подтверждено владение доменом (NULL - не подтверждено)")
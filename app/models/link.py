@@ -1,29 +1,129 @@
-from sqlalchemy import Boolean, Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Boolean, Column, Integer, SmallInteger, String, ForeignKey, DateTime, Text, Index, UniqueConstraint, event, text
 from sqlalchemy.orm import relationship
-from datetime import datetime, timedelta
-from app.db.base import BaseModel
+from datetime import datetime, timedelta, timezone
+from app.db.base import Base, BaseModel
 from app.core.config import settings
 
+# При LINK_PARTITIONS > 0 таблица link в Postgres секционируется HASH (short_code).
+# Все уникальные ограничения секционированной таблицы должны включать ключ
+# секционирования, поэтому первичный ключ становится (id, short_code).
+# Запросы с условием short_code = ... читают только одну секцию.
+PARTITIONED = settings.LINK_PARTITIONS > 0
+
+# При SHARD_DATABASE_URLS ссылки хранятся в отдельных БД (см. app.db.shards),
+# а пользователи и домены - в основной, поэтому внешние ключи на них невозможны
+SHARDED = bool(settings.SHARD_URLS)
+
+
+def _references(target: str):
+    return () if SHARDED else (ForeignKey(target),)
+
 
 class Link(BaseModel):
-    id = Column(Integer, primary_key=True, index=True,
+    # Короткий код уникален в пределах домена. Для основного домена (domain_id IS NULL)
+    # уникальность обеспечивает частичный индекс, так как NULL в UNIQUE не сравниваются
+    __table_args__ = (
+        UniqueConstraint("domain_id", "short_code", name="uq_link_domain_short_code"),
+        Index("uq_link_default_short_code", "short_code", unique=True,
+              postgresql_where=text("domain_id IS NULL"), sqlite_where=text("domain_id IS NULL")),
+        # Расписание истечения читает активные ссылки по expires_at
+        Index("ix_link_expires_at", "expires_at",
+              postgresql_where=text("is_active"), sqlite_where=text("is_active")),
+        # Статистика созданных ссылок по часам пересчитывает только последние часы
+        Index("ix_link_created_at", "created_at"),
+        # Поиск по подстроке, префиксу и домену URL (ILIKE) - триграммный GIN-индекс
+        Index("ix_link_original_url_trgm", "original_url",
+              postgresql_using="gin", postgresql_ops={"original_url": "gin_trgm_ops"}),
+        {"postgresql_partition_by": "HASH (short_code)"} if PARTITIONED else {},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True,
                 comment="Уникальный идентификатор ссылки")
     original_url = Column(Text, nullable=False,
                           comment="Оригинальный URL, который был сокращен")
-    short_code = Column(String, unique=True, index=True,
-                        nullable=False, comment="Короткий код для ссылки")
-    user_id = Column(Integer, ForeignKey("user.id"), nullable=True,
+    # Неуникальный индекс: запросы только по коду (истечение, админка, инструменты)
+    short_code = Column(String, nullable=False, primary_key=PARTITIONED, index=True,
+                        comment="Короткий код для ссылки")
+    domain_id = Column(Integer, *_references("domain.id"), nullable=True,
+                       comment="ID собственного домена (NULL - основной домен)")
+    user_id = Column(Integer, *_references("user.id"), nullable=True,
                      comment="ID пользователя, создавшего ссылку")
-    user = relationship("User", backref="links")
+    if not SHARDED:
+        user = relationship("User", backref="links")
     clicks = Column(Integer, default=0,
                     comment="Количество переходов по ссылке")
     last_used_at = Column(DateTime(timezone=True), nullable=True,
                           comment="Дата и время последнего использования ссылки")
     expires_at = Column(DateTime(timezone=True), nullable=True, 
-                        default=lambda: datetime.now() + timedelta(days=settings.LINK_EXPIRATION_DAYS),
+                        default=lambda: datetime.now(timezone.utc) + timedelta(days=settings.LINK_EXPIRATION_DAYS),
                         comment="Дата и время истечения срока действия ссылки")
     project_id = Column(Integer, nullable=True,
                         comment="ID проекта, к которому относится ссылка")
     is_active = Column(Boolean, default=True, comment="Активна ли ссылка")
     is_anonymous = Column(Boolean, default=False,
                           comment="Создана ли ссылка анонимным пользователем")
+    redirect_type = Column(SmallInteger, nullable=False, default=307, server_default=text("307"),
+                           comment="HTTP-статус редиректа: 301, 302, 307 или 308")
+
+
+class LinkArchive(Base):
+    """
+    Архив истекших ссылок. В Postgres секционирован по месяцам expires_at:
+    старые месяцы удаляются целиком через DROP секции, без DELETE по строкам.
+    """
+    __tablename__ = "link_archive"
+    __table_args__ = {"postgresql_partition_by": "RANGE (expires_at)"}
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    expires_at = Column(DateTime(timezone=True), primary_key=True)
+    original_url = Column(Text, nullable=False)
+    short_code = Column(String, nullable=False)
+    domain_id = Column(Integer, nullable=True)
+    user_id = Column(Integer, nullable=True)
+    clicks = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True))
+    last_used_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=text("CURRENT_TIMESTAMP"))
+
+
+def hash_partition_ddl(table: str, parent: str, partitions: int):
+    """DDL секций HASH (short_code): {table}_p0 ... {table}_p{n-1}"""
+    return [
+        f"CREATE TABLE IF NOT EXISTS {table}_p{i} PARTITION OF {parent} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+        for i in range(partitions)
+    ]
+
+
+def archive_partition_ddl(month: datetime) -> str:
+    """DDL секции архива за месяц (UTC), в который попадает `month`"""
+    if month.tzinfo is not None:
+        month = month.astimezone(timezone.utc)
+    start = month.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    end = (start + timedelta(days=32)).replace(day=1)
+    # Границы с явным поясом: иначе Postgres читает их в часовом поясе сессии
+    return (
+        f"CREATE TABLE IF NOT EXISTS link_archive_{start:%Y_%m} PARTITION OF link_archive "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d} 00:00+00') TO ('{end:%Y-%m-%d} 00:00+00')"
+    )
+
+
+@event.listens_for(Link.__table__, "before_create")
+def _create_trgm_extension(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+@event.listens_for(Link.__table__, "after_create")
+def _create_link_partitions(target, connection, **kw):
+    if PARTITIONED and connection.dialect.name == "postgresql":
+        for ddl in hash_partition_ddl("link", "link", settings.LINK_PARTITIONS):
+            connection.execute(text(ddl))
+
+
+@event.listens_for(LinkArchive.__table__, "after_create")
+def _create_archive_partitions(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        # Секция по умолчанию принимает строки, для месяца которых секции еще нет
+        connection.execute(text("CREATE TABLE IF NOT EXISTS link_archive_default PARTITION OF link_archive DEFAULT"))
+        connection.execute(text(archive_partition_ddl(datetime.now(timezone.utc))))
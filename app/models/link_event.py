@@ -0,0 +1,32 @@
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Index, Integer, SmallInteger, String, Text, func
+from app.db.base import Base
+
+
+class LinkEvent(Base):
+    """
+    Транзакционный outbox изменений ссылок: событие пишется в той же транзакции,
+    что и само изменение, а реле (app.workers.outbox) публикует его в поток Valkey
+    и отмечает published_at. Опубликованные события хранятся OUTBOX_RETENTION_HOURS.
+    """
+    __tablename__ = "link_event"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    op = Column(String(16), nullable=False, comment="create, update, delete или expire")
+    link_id = Column(Integer, nullable=False)
+    domain_id = Column(Integer, nullable=True)
+    short_code = Column(String, nullable=False)
+    original_url = Column(Text, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+    is_active = Column(Boolean, nullable=True)
+    redirect_type = Column(SmallInteger, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    published_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Реле читает только неопубликованные события - небольшой частичный индекс
+        Index(
+            "ix_link_event_unpublished", "id",
+            postgresql_where=published_at.is_(None),
+            sqlite_where=published_at.is_(None),
+        ),
+    )
@@ -0,0 +1,52 @@
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Text
+
+from app.db.base import Base
+
+# Агрегаты по ссылкам для статистики администратора. Их пересчитывает
+# app.workers.aggregates по расписанию и заменяет одним коммитом, поэтому эндпоинты
+# /admin/stats/* читают несколько маленьких таблиц и не сканируют link.
+# Таблицы живут в основной БД, с шардированием в них сведены данные всех шардов.
+
+
+class LinkStatsSummary(Base):
+    """Общие счетчики ссылок (одна строка, id = 1)"""
+    __tablename__ = "link_stats_summary"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    total = Column(BigInteger, nullable=False)
+    active = Column(BigInteger, nullable=False)
+    expired = Column(BigInteger, nullable=False, comment="Истекшие и деактивированные")
+    anonymous = Column(BigInteger, nullable=False)
+    clicks = Column(BigInteger, nullable=False)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)
+    refresh_ms = Column(Integer, nullable=False, comment="Длительность пересчета")
+
+
+class LinkStatsHour(Base):
+    """Число созданных ссылок по часам (UTC)"""
+    __tablename__ = "link_stats_hour"
+
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    created = Column(Integer, nullable=False)
+
+
+class LinkStatsTopLink(Base):
+    """Самые популярные ссылки по числу кликов"""
+    __tablename__ = "link_stats_top_link"
+
+    rank = Column(Integer, primary_key=True, autoincrement=False)
+    link_id = Column(Integer, nullable=False)
+    domain_id = Column(Integer, nullable=True)
+    short_code = Column(String, nullable=False)
+    original_url = Column(Text, nullable=False)
+    clicks = Column(BigInteger, nullable=False)
+
+
+class LinkStatsTopDomain(Base):
+    """Самые частые домены адресов назначения"""
+    __tablename__ = "link_stats_top_domain"
+
+    rank = Column(Integer, primary_key=True, autoincrement=False)
+    host = Column(String, nullable=False)
+    links = Column(BigInteger, nullable=False)
+    clicks = Column(BigInteger, nullable=False)
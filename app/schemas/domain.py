@@ -0,0 +1,40 @@
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_validator
+from typing import Optional
+from datetime import datetime
+
+from app.core.tenants import normalize_host, verification_record
+
+
+class DomainCreate(BaseModel):
+    host: str = Field(
+        ...,
+        description="Имя хоста собственного домена (DNS должен указывать на сервис)",
+        example="go.example.com",
+        min_length=3,
+        max_length=253
+    )
+
+    @field_validator('host')
+    def validate_host(cls, v):
+        v = normalize_host(v)
+        if "/" in v or "." not in v:
+            raise ValueError('Укажите имя хоста, например go.example.com')
+        return v
+
+
+class Domain(BaseModel):
+    id: int = Field(..., description="Уникальный идентификатор домена")
+    host: str = Field(..., description="Имя хоста")
+    is_active: bool = Field(..., description="Активен ли домен")
+    created_at: Optional[datetime] = Field(None, description="Дата и время добавления домена")
+    verified_at: Optional[datetime] = Field(
+        None, description="Когда подтверждено владение доменом (пока не подтверждено, домен не работает)"
+    )
+    verification_token: str = Field(..., description="Значение TXT-записи для подтверждения владения")
+
+    @computed_field(description="Имя TXT-записи для подтверждения владения")
+    @property
+    def verification_record(self) -> str:
+        return verification_record(self.host)
+
+    model_config = ConfigDict(from_attributes=True)
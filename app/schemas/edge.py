@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, List, Optional, Tuple
+
+
+class EdgeClicks(BaseModel):
+    clicks: List[Tuple[Optional[int], str, Annotated[int, Field(ge=1)]]] = Field(
+        ...,
+        description="Клики, накопленные edge-узлом: [domain_id, short_code, количество]",
+        example=[[None, "abc123", 42]]
+    )
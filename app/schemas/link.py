@@ -1,7 +1,20 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_validator
+from typing import List, Literal, Optional
 from datetime import datetime
 
+from app.core.config import settings
+
+# Допустимые типы редиректа (см. app.core.redirects)
+RedirectType = Literal[301, 302, 307, 308]
+
+
+def _base_url(domain_id: Optional[int]) -> str:
+    if domain_id is None:
+        return settings.BASE_URL
+    # Импорт здесь: таблица доменов тянет клиент Valkey, а схемы импортируются рано
+    from app.core.tenants import host_table
+    return host_table.base_url(domain_id)
+
 
 class LinkBase(BaseModel):
     original_url: str = Field(
@@ -31,6 +44,13 @@ class LinkCreate(LinkBase):
         description="Дата и время истечения ссылки (в формате ISO 8601 с точностью до минуты)",
         example="2026-12-31T23:59:00Z"
     )
+    redirect_type: Optional[RedirectType] = Field(
+        None,
+        description="HTTP-статус редиректа: 301/308 - постоянный, кэшируется CDN и браузерами "
+                    "(клики дополняются из логов CDN), 302/307 - без кэширования, точный учет кликов. "
+                    "По умолчанию REDIRECT_DEFAULT_TYPE",
+        example=302
+    )
 
 
 class LinkUpdate(BaseModel):
@@ -39,6 +59,11 @@ class LinkUpdate(BaseModel):
         description="Новый оригинальный URL",
         example="https://www.new-example.com/updated/url"
     )
+    redirect_type: Optional[RedirectType] = Field(
+        None,
+        description="Новый HTTP-статус редиректа (301, 302, 307 или 308)",
+        example=301
+    )
     
     @field_validator('original_url', mode='before')
     def validate_url(cls, v):
@@ -55,37 +80,65 @@ class LinkInDBBase(LinkBase):
     last_used_at: Optional[datetime] = Field(None, description="Дата и время последнего использования")
     expires_at: Optional[datetime] = Field(None, description="Дата и время истечения ссылки")
     user_id: Optional[int] = Field(None, description="ID пользователя, создавшего ссылку")
+    domain_id: Optional[int] = Field(None, description="ID собственного домена (null - основной домен)")
     is_active: bool = Field(..., description="Активна ли ссылка")
     is_anonymous: bool = Field(..., description="Создана ли ссылка анонимным пользователем")
+    redirect_type: int = Field(307, description="HTTP-статус редиректа")
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class Link(LinkInDBBase):
-    short_url: Optional[str] = Field(
-        None, 
-        description="Полный URL для короткой ссылки",
-        example="http://localhost:8000/abc123"
+    @computed_field(description="Полный URL для короткой ссылки", examples=["http://localhost:8000/abc123"])
+    @property
+    def short_url(self) -> str:
+        return f"{_base_url(self.domain_id)}/{self.short_code}"
+
+
+class LinkPreview(BaseModel):
+    status: Optional[int] = Field(None, description="HTTP-статус адреса назначения (после редиректов)")
+    ok: bool = Field(..., description="Доступен ли адрес при последней проверке")
+    title: Optional[str] = Field(None, description="Заголовок страницы (<title>)")
+    final_url: Optional[str] = Field(None, description="Адрес после редиректов")
+    error: Optional[str] = Field(None, description="Ошибка проверки (таймаут, DNS, соединение)")
+    checked_at: Optional[datetime] = Field(None, description="Время последней проверки")
+
+
+class LinkWithPreview(Link):
+    preview: Optional[LinkPreview] = Field(
+        None, description="Результат последней фоновой проверки адреса (null - еще не проверялся)"
     )
 
 
 class LinkStats(BaseModel):
     original_url: str = Field(..., description="Оригинальный URL")
     short_code: str = Field(..., description="Короткий код ссылки")
-    short_url: str = Field(..., description="Полный URL для короткой ссылки")
     clicks: int = Field(..., description="Количество переходов по ссылке")
     created_at: datetime = Field(..., description="Дата и время создания")
     last_used_at: Optional[datetime] = Field(None, description="Дата и время последнего использования")
     expires_at: Optional[datetime] = Field(None, description="Дата и время истечения")
+    domain_id: Optional[int] = Field(None, exclude=True)
     
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+    @computed_field(description="Полный URL для короткой ссылки")
+    @property
+    def short_url(self) -> str:
+        return f"{_base_url(self.domain_id)}/{self.short_code}"
 
 
 class LinkSearch(BaseModel):
     short_code: str = Field(..., description="Короткий код ссылки")
     original_url: str = Field(..., description="Оригинальный URL")
     
-    class Config:
-        orm_mode = True 
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+
+class LinkStatsBatchRequest(BaseModel):
+    short_codes: List[str] = Field(
+        ...,
+        description="Короткие коды ссылок, по которым нужна статистика",
+        example=["abc123", "mylink"],
+        min_length=1,
+        max_length=settings.BATCH_STATS_MAX_CODES
+    )
@@ -0,0 +1 @@
+# Служебные утилиты командной строки: python -m app.tools.<имя>
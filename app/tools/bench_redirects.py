@@ -0,0 +1,113 @@
+"""
+Сравнение скорости редиректов: RedirectMiddleware и маршрут FastAPI GET /{short_code}.
+
+    DATABASE_URL=sqlite:///bench.db REDIS_URL=memory:// python -m app.tools.bench_redirects
+    python -m app.tools.bench_redirects --codes 20 --requests 20000 --concurrency 100
+
+Приложение запускается в этом же процессе (lifespan), запросы идут через
+httpx.ASGITransport - без сети и сервера, накладные расходы клиента одинаковы
+для обоих вариантов. Вариант "router" - то же приложение без RedirectMiddleware:
+запрос проходит CORS, роутер и зависимости FastAPI, как до появления middleware.
+
+Создаются --codes ссылок, затем каждый вариант получает --requests запросов
+по кругу по всем кодам (--concurrency одновременно). Перед замером один проход
+по кодам заполняет кэш редиректов, так что измеряются попадания в кэш. При малом
+--codes на каждый код приходится больше HOT_LINK_THRESHOLD запросов, и middleware
+отдает ссылки из памяти процесса - так видна работа горячих ссылок.
+БД и Valkey берутся из настроек (DATABASE_URL, REDIS_URL); таблицы создаются,
+фоновые задачи и ограничение частоты запросов выключены.
+"""
+import os
+
+# Настройки читаются при импорте app: лимиты исказили бы замер, а задачи - нагрузку
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("BACKGROUND_WORKERS", "false")
+os.environ.setdefault("INIT_DB_ON_STARTUP", "true")
+os.environ.setdefault("DATABASE_ECHO", "false")
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from typing import List
+
+import httpx
+
+from app.api.redirect import RedirectMiddleware
+from app.main import app, lifespan
+
+
+def router_stack():
+    """ASGI-стек приложения без RedirectMiddleware"""
+    middleware = app.user_middleware
+    app.user_middleware = [item for item in middleware if item.cls is not RedirectMiddleware]
+    try:
+        return app.build_middleware_stack()
+    finally:
+        app.user_middleware = middleware
+
+
+async def create_links(client: httpx.AsyncClient, count: int) -> List[str]:
+    codes = []
+    for i in range(count):
+        response = await client.post("/links/shorten", json={"original_url": f"https://example.com/bench/{i}"})
+        response.raise_for_status()
+        codes.append(response.json()["short_code"])
+    return codes
+
+
+async def run(client: httpx.AsyncClient, codes: List[str], requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            started = time.perf_counter()
+            response = await client.get(f"/{codes[i % len(codes)]}")
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 307:
+                raise RuntimeError(f"Неожиданный ответ {response.status_code}: {response.text}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def bench(args) -> None:
+    variants = {"middleware": app, "router": router_stack()}
+    async with lifespan(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            codes = await create_links(client, args.codes)
+        print(f"Ссылок: {len(codes)}, запросов: {args.requests}, одновременно: {args.concurrency}")
+        results = {}
+        for name, stack in variants.items():
+            transport = httpx.ASGITransport(app=stack)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                await run(client, codes, len(codes), args.concurrency)
+                results[name] = await run(client, codes, args.requests, args.concurrency)
+            result = results[name]
+            print(f"{name:>10}: {result['rps']:8.0f} запр/с  p50 {result['p50']:6.2f} мс  p99 {result['p99']:6.2f} мс")
+        speedup = results["middleware"]["rps"] / results["router"]["rps"]
+        print(f"middleware быстрее в {speedup:.1f} раза")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.tools.bench_redirects", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codes", type=int, default=1000, help="сколько ссылок создать")
+    parser.add_argument("--requests", type=int, default=10000, help="запросов на каждый вариант")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных запросов")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Учет кликов по редиректам, которые отдал из своего кэша CDN.
+
+    python -m app.tools.import_edge_logs /var/log/cdn/E2ABC.2026-10-19-*.gz
+    python -m app.tools.import_edge_logs logpush.ndjson --format ndjson
+    python -m app.tools.import_edge_logs access.log --format regex \\
+        --pattern '(?P<host>\\S+) "GET (?P<path>\\S+)[^"]*" (?P<status>\\d+) (?P<cache>\\S+)'
+
+Постоянные редиректы (301/308) отдаются с Cache-Control: max-age, и повторные
+переходы CDN обслуживает сам - до сервиса доходят и учитываются только промахи
+кэша CDN. Скрипт читает локальные файлы логов CDN (в т.ч. .gz) и прибавляет
+к счетчикам ссылок запросы, отданные из кэша CDN: статус редиректа и попадание
+в кэш (hit). Промахи не учитываются - их уже посчитал сам сервис.
+
+Форматы:
+  w3c    - W3C extended log (CloudFront и др.): колонки из строки #Fields;
+  ndjson - JSON в строке (Cloudflare Logpush и др.);
+  regex  - произвольные строки, разбираемые --pattern.
+Нужные поля - путь запроса, статус ответа, результат кэша CDN и (для собственных
+доменов) хост; их имена в логе задаются --fields, по умолчанию - имена CloudFront
+для w3c и Cloudflare для ndjson. В regex имена групп - path, status, cache, host.
+
+Обработанные файлы запоминаются в Valkey по хэшу содержимого, повторный запуск на тех же
+файлах их пропускает (файл с тем же именем, но другим содержимым, например после ротации
+access.log, обрабатывается). Клики применяются пачками, и номер последней примененной
+пачки тоже запоминается: запуск после сбоя продолжает файл со следующей пачки.
+Чтение из stdin (-) не запоминается.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterator, Optional, TextIO, Tuple
+from urllib.parse import unquote
+
+from app.core.redirects import REDIRECT_TYPES
+from app.core.tenants import host_table
+from app.crud import link as link_crud
+from app.db import shards
+from app.db.base import async_session, engine
+from app.db.redis import redis_client
+
+# Множество Valkey с отпечатками обработанных файлов
+IMPORTED_KEY = "edge_logs:imported"
+# Hash Valkey: отпечаток файла -> число уже примененных пачек кликов
+PROGRESS_KEY = "edge_logs:progress"
+
+DEFAULT_FIELDS = {
+    "w3c": {"path": "cs-uri-stem", "status": "sc-status", "cache": "x-edge-result-type", "host": "x-host-header"},
+    "ndjson": {
+        "path": "ClientRequestPath", "status": "EdgeResponseStatus",
+        "cache": "CacheCacheStatus", "host": "ClientRequestHost",
+    },
+}
+
+_CODE_PATH = re.compile(r"/([A-Za-z0-9_.~-]{1,50})").fullmatch
+_STATUSES = frozenset(str(status) for status in REDIRECT_TYPES)
+
+# Сколько ссылок обновлять одним вызовом add_clicks_bulk
+_APPLY_BATCH = 5000
+
+# Поля записи лога, нужные для учета: (path, status, cache, host)
+_RECORD_FIELDS = ("path", "status", "cache", "host")
+Record = Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]
+
+
+class Stats:
+    def __init__(self):
+        self.files = 0
+        self.skipped_files = 0
+        self.lines = 0
+        self.hits = 0
+        self.links = 0
+
+    def line(self) -> str:
+        return (
+            f"файлов {self.files} (пропущено как обработанные {self.skipped_files}), строк {self.lines}, "
+            f"кликов из кэша CDN {self.hits}, ссылок {self.links}"
+        )
+
+
+def _open(path: str) -> TextIO:
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def read_w3c(stream: TextIO, fields: Dict[str, str]) -> Iterator[Record]:
+    indexes = [None] * len(_RECORD_FIELDS)
+    for line in stream:
+        if line.startswith("#"):
+            if line.startswith("#Fields:"):
+                columns = {name: i for i, name in enumerate(line[len("#Fields:"):].split())}
+                indexes = [columns.get(fields.get(name)) for name in _RECORD_FIELDS]
+            continue
+        values = line.rstrip("\n").split("\t")
+        yield tuple(values[i] if i is not None and i < len(values) else None for i in indexes)
+
+
+def read_ndjson(stream: TextIO, fields: Dict[str, str]) -> Iterator[Record]:
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            yield (None, None, None, None)
+            continue
+        values = (record.get(fields.get(name)) for name in _RECORD_FIELDS)
+        yield tuple(None if value is None else str(value) for value in values)
+
+
+def read_regex(stream: TextIO, pattern: "re.Pattern") -> Iterator[Record]:
+    for line in stream:
+        match = pattern.search(line)
+        if match is None:
+            yield (None, None, None, None)
+            continue
+        groups = match.groupdict()
+        yield tuple(groups.get(name) for name in _RECORD_FIELDS)
+
+
+def count_hits(records: Iterator[Record], stats: Stats) -> Counter:
+    """Клики из кэша CDN по парам (domain_id, short_code)"""
+    clicks: Counter = Counter()
+    for path, status, cache, host in records:
+        stats.lines += 1
+        if status not in _STATUSES or not cache or cache.strip().lower() != "hit" or not path:
+            continue
+        match = _CODE_PATH(unquote(path.split("?", 1)[0]))
+        if match is None:
+            continue
+        # Неизвестный хост, как и в сервисе, - основной домен
+        clicks[(host_table.resolve(host), match.group(1))] += 1
+    return clicks
+
+
+def _click_order(item) -> tuple:
+    (domain_id, code), _ = item
+    return domain_id is not None, domain_id or 0, code
+
+
+async def apply_clicks(clicks: Counter, fingerprint: Optional[str] = None, done: int = 0) -> None:
+    """
+    Прибавляет клики пачками по _APPLY_BATCH ссылок, пропуская первые `done` пачек.
+    Порядок пачек не зависит от порядка строк в логе. С отпечатком файла после каждой
+    пачки в Valkey запоминается, сколько их применено: повторный запуск после сбоя
+    учтет заново разве что пачку, которую сбой прервал между commit и этой записью.
+    """
+    items = sorted(clicks.items(), key=_click_order)
+    for batch, start in enumerate(range(0, len(items), _APPLY_BATCH)):
+        if batch < done:
+            continue
+        async with async_session() as db:
+            await link_crud.add_clicks_bulk(db, dict(items[start:start + _APPLY_BATCH]))
+        if fingerprint is not None and redis_client is not None:
+            await redis_client.hset(PROGRESS_KEY, fingerprint, batch + 1)
+
+
+def _fingerprint(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+
+async def run_import(args) -> None:
+    stats = Stats()
+    await host_table.reload()
+    for path in args.paths:
+        fingerprint = None
+        done = 0
+        if path != "-" and redis_client is not None:
+            fingerprint = _fingerprint(path)
+            if not args.force:
+                if await redis_client.sismember(IMPORTED_KEY, fingerprint):
+                    stats.skipped_files += 1
+                    continue
+                done = int(await redis_client.hget(PROGRESS_KEY, fingerprint) or 0)
+        stream = _open(path)
+        try:
+            if args.format == "w3c":
+                records = read_w3c(stream, args.fields)
+            elif args.format == "ndjson":
+                records = read_ndjson(stream, args.fields)
+            else:
+                records = read_regex(stream, args.pattern)
+            clicks = count_hits(records, stats)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        if not args.dry_run:
+            await apply_clicks(clicks, fingerprint, done)
+            if fingerprint is not None:
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    pipe.sadd(IMPORTED_KEY, fingerprint)
+                    pipe.hdel(PROGRESS_KEY, fingerprint)
+                    await pipe.execute()
+        stats.files += 1
+        stats.hits += sum(clicks.values())
+        stats.links += len(clicks)
+        print(f"\r{stats.line()}", end="", flush=True)
+    print()
+    print(f"{'Проверено' if args.dry_run else 'Готово'}: {stats.line()}")
+
+
+def _parse_fields(value: str) -> Dict[str, str]:
+    fields = {}
+    for item in value.split(","):
+        name, _, column = item.partition("=")
+        if name not in _RECORD_FIELDS or not column:
+            raise argparse.ArgumentTypeError(f"ожидается path|status|cache|host=<поле лога>, получено {item!r}")
+        fields[name] = column
+    return fields
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.tools.import_edge_logs", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="файлы логов CDN (.gz читаются как есть) или - для stdin")
+    parser.add_argument("--format", choices=("w3c", "ndjson", "regex"), default="w3c", help="формат логов")
+    parser.add_argument("--fields", type=_parse_fields,
+                        help="имена полей лога, например path=cs-uri-stem,cache=x-edge-result-type")
+    parser.add_argument("--pattern", help="регулярное выражение для --format regex с группами path, status, cache, host")
+    parser.add_argument("--force", action="store_true", help="обработать файлы, даже если они уже учтены")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать клики, не меняя счетчики")
+    args = parser.parse_args(argv)
+    if args.format == "regex":
+        if not args.pattern:
+            parser.error("--format regex требует --pattern")
+        args.pattern = re.compile(args.pattern)
+        if not {"path", "status", "cache"} <= set(args.pattern.groupindex):
+            parser.error("--pattern должен содержать группы path, status и cache")
+    else:
+        args.fields = {**DEFAULT_FIELDS[args.format], **(args.fields or {})}
+    if redis_client is None:
+        print("Valkey недоступен: обработанные файлы не запоминаются", file=sys.stderr)
+    engine.echo = False
+
+    async def run():
+        try:
+            await run_import(args)
+        finally:
+            await engine.dispose()
+            await shards.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Массовый импорт коротких ссылок из другого сервиса сокращения (PostgreSQL).
+
+    python -m app.tools.import_links links.csv
+    python -m app.tools.import_links links.ndjson --batch 50000 --rejects rejects.csv
+    zcat links.csv.gz | python -m app.tools.import_links - --format csv
+
+Вход - CSV с заголовком или NDJSON с полями short_code, original_url и
+необязательными created_at (ISO 8601 или unix-время), clicks, expires_at и
+redirect_type (301, 302, 307 или 308, по умолчанию REDIRECT_DEFAULT_TYPE).
+Код - буквы, цифры, "_" и "-" (как у быстрых редиректов), до 50 символов.
+Строки читаются потоком и обрабатываются пачками:
+  1. проверка кода и URL всей пачки, повторы кода внутри пачки отбрасываются;
+  2. коды, уже занятые в БД, находятся одним запросом short_code = ANY(...)
+     по индексу коротких кодов;
+  3. оставшиеся строки загружаются через COPY во временную таблицу и
+     переносятся в link одним INSERT ... SELECT ... ON CONFLICT DO NOTHING
+     (вместе с событиями create в outbox link_event).
+Каждая пачка - отдельная транзакция: прерванный импорт можно запустить
+повторно, уже загруженные коды будут пропущены как занятые.
+
+С --qr png,svg QR-коды загруженных ссылок сразу отрисовываются в дисковый кэш
+QR_CACHE_DIR (тот же каталог, что у сервиса), и первые запросы к ним не ждут отрисовки.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple, get_args
+
+from app.core.config import settings
+from app.core.qr import FORMATS, qr_cache
+from app.core.redirects import SHORT_CODE_PATTERN, is_reserved_code
+from app.core.tenants import host_table
+from app.db import shards
+from app.db.base import engine
+from app.schemas.link import RedirectType
+
+_CODE_RE = re.compile(SHORT_CODE_PATTERN)
+_URL_RE = re.compile(r"https?://[^\s/?#]+[^\s]*", re.IGNORECASE)
+_MAX_URL_LENGTH = 8192
+_REDIRECT_TYPES = get_args(RedirectType)
+
+STAGING_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS link_import (
+    short_code text NOT NULL,
+    original_url text NOT NULL,
+    created_at timestamptz NOT NULL,
+    clicks integer NOT NULL,
+    expires_at timestamptz,
+    redirect_type smallint NOT NULL
+) ON COMMIT DELETE ROWS
+"""
+STAGING_COLUMNS = ("short_code", "original_url", "created_at", "clicks", "expires_at", "redirect_type")
+
+# Для основного домена условие domain_id IS NULL позволяет использовать частичный
+# уникальный индекс по short_code, для собственного - индекс (domain_id, short_code)
+CONFLICTS_SQL = "SELECT short_code FROM link WHERE short_code = ANY($1::text[]) AND domain_id IS NULL"
+DOMAIN_CONFLICTS_SQL = "SELECT short_code FROM link WHERE short_code = ANY($1::text[]) AND domain_id = $2"
+
+# $1 - domain_id, $2 - user_id
+MERGE_SQL = """
+INSERT INTO link (short_code, original_url, domain_id, user_id, clicks, created_at,
+                  expires_at, is_active, is_anonymous, redirect_type)
+SELECT short_code, original_url, $1, $2, clicks, created_at, expires_at, true, $2 IS NULL, redirect_type
+FROM link_import
+ON CONFLICT DO NOTHING
+"""
+MERGE_WITH_EVENTS_SQL = f"""
+WITH inserted AS (
+    {MERGE_SQL}
+    RETURNING id, domain_id, short_code, original_url, expires_at, is_active, redirect_type
+), events AS (
+    INSERT INTO link_event (op, link_id, domain_id, short_code, original_url, expires_at, is_active, redirect_type)
+    SELECT 'create', id, domain_id, short_code, original_url, expires_at, is_active, redirect_type FROM inserted
+)
+SELECT count(*) FROM inserted
+"""
+
+Row = Tuple[str, str, datetime, int, Optional[datetime], int]
+
+
+class Stats:
+    def __init__(self):
+        self.read = self.invalid = self.conflicts = self.skipped = self.imported = self.rendered = 0
+        self.started = time.monotonic()
+
+    def line(self) -> str:
+        elapsed = time.monotonic() - self.started
+        return (
+            f"прочитано {self.read}, загружено {self.imported}, занято {self.conflicts + self.skipped}, "
+            f"ошибок {self.invalid}, {self.read / elapsed if elapsed else 0:.0f} строк/с"
+            + (f", QR-кодов {self.rendered}" if self.rendered else "")
+        )
+
+
+def _parse_time(value) -> Optional[datetime]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+        return datetime.fromtimestamp(float(value), timezone.utc)
+    parsed = datetime.fromisoformat(value)
+    # Время без часового пояса считаем UTC
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def read_records(stream, fmt: str) -> Iterator[Tuple[int, dict]]:
+    """Пары (номер строки, запись) из CSV с заголовком или NDJSON"""
+    if fmt == "csv":
+        for number, record in enumerate(csv.DictReader(stream), start=2):
+            yield number, record
+        return
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, {}
+
+
+def validate_batch(
+    records: List[Tuple[int, dict]], default_expires: Optional[datetime], rejects
+) -> Dict[str, Row]:
+    """
+    Проверяет пачку целиком и возвращает строки для загрузки по коду.
+    Отклоненные строки пишутся в `rejects` (если задан) с причиной.
+    """
+    now = datetime.now(timezone.utc)
+    rows: Dict[str, Row] = {}
+    for number, record in records:
+        code = (record.get("short_code") or "").strip()
+        url = (record.get("original_url") or "").strip()
+        if not _CODE_RE.fullmatch(code) or is_reserved_code(code):
+            reason = "short_code"
+        elif len(url) > _MAX_URL_LENGTH or not _URL_RE.fullmatch(url):
+            reason = "original_url"
+        elif code in rows:
+            reason = "duplicate"
+        else:
+            try:
+                created_at = _parse_time(record.get("created_at")) or now
+                expires_at = _parse_time(record.get("expires_at")) or default_expires
+                clicks = int(record.get("clicks") or 0)
+                redirect_type = int(record.get("redirect_type") or settings.REDIRECT_DEFAULT_TYPE)
+            except (TypeError, ValueError, OverflowError):
+                reason = "value"
+            else:
+                if clicks < 0:
+                    reason = "clicks"
+                elif redirect_type not in _REDIRECT_TYPES:
+                    reason = "redirect_type"
+                else:
+                    rows[code] = (code, url, created_at, clicks, expires_at, redirect_type)
+                    continue
+        if rejects is not None:
+            rejects.writerow((number, reason, code, url))
+    return rows
+
+
+class Target:
+    """Соединение с БД (основной или шардом) с временной таблицей для COPY"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._conn = None
+        self.pg = None
+
+    async def open(self) -> None:
+        self._conn = await self.engine.connect()
+        raw = await self._conn.get_raw_connection()
+        self.pg = raw.driver_connection
+        await self.pg.execute(STAGING_DDL)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+
+    async def taken(self, codes: List[str], domain_id: Optional[int]) -> set:
+        if domain_id is None:
+            records = await self.pg.fetch(CONFLICTS_SQL, codes)
+        else:
+            records = await self.pg.fetch(DOMAIN_CONFLICTS_SQL, codes, domain_id)
+        return {record["short_code"] for record in records}
+
+    async def load(self, rows: List[Row], domain_id: Optional[int], user_id: Optional[int],
+                   events: bool) -> int:
+        """COPY пачки во временную таблицу и перенос в link. Возвращает число вставленных строк"""
+        async with self.pg.transaction():
+            await self.pg.copy_records_to_table("link_import", records=rows, columns=STAGING_COLUMNS)
+            if events:
+                return await self.pg.fetchval(MERGE_WITH_EVENTS_SQL, domain_id, user_id)
+            status = await self.pg.execute(MERGE_SQL, domain_id, user_id)
+            return int(status.split()[-1])
+
+
+async def load_batch(targets: List[Target], rows: Dict[str, Row], args, stats: Stats) -> List[str]:
+    """Загружает пачку и возвращает коды, которые не были заняты"""
+    if shards.SHARDED:
+        groups = shards.group_by_shard(rows.values(), lambda row: row[0])
+    else:
+        groups = {0: list(rows.values())}
+
+    async def run(target: Target, group: List[Row]) -> List[str]:
+        taken = await target.taken([row[0] for row in group], args.domain_id)
+        stats.conflicts += len(taken)
+        group = [row for row in group if row[0] not in taken]
+        if group:
+            inserted = await target.load(group, args.domain_id, args.user_id, not args.no_events)
+            # Код мог заняться между проверкой и вставкой
+            stats.skipped += len(group) - inserted
+            stats.imported += inserted
+        return [row[0] for row in group]
+
+    results = await asyncio.gather(*(run(targets[shard_id], group) for shard_id, group in groups.items()))
+    return [code for codes in results for code in codes]
+
+
+async def run_import(args) -> None:
+    targets = [Target(e) for e in (shards.engines if shards.SHARDED else [engine])]
+    stream = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+    rejects_file = open(args.rejects, "w", newline="", encoding="utf-8") if args.rejects else None
+    rejects = csv.writer(rejects_file) if rejects_file else None
+    if rejects is not None:
+        rejects.writerow(("line", "reason", "short_code", "original_url"))
+    default_expires = (
+        datetime.now(timezone.utc) + timedelta(days=args.expires_days) if args.expires_days else None
+    )
+    stats = Stats()
+    if args.qr and args.domain_id is not None:
+        # Базовый URL собственного домена - из таблицы доменов
+        await host_table.reload()
+    try:
+        for target in targets:
+            await target.open()
+        batch: List[Tuple[int, dict]] = []
+        records = read_records(stream, args.format)
+        while True:
+            batch.clear()
+            for item in records:
+                batch.append(item)
+                if len(batch) >= args.batch:
+                    break
+            if not batch:
+                break
+            stats.read += len(batch)
+            rows = validate_batch(batch, default_expires, rejects)
+            stats.invalid += len(batch) - len(rows)
+            if rows:
+                loaded = await load_batch(targets, rows, args, stats)
+                if args.qr:
+                    base_url = host_table.base_url(args.domain_id)
+                    stats.rendered += await qr_cache.prerender(
+                        (f"{base_url}/{code}" for code in loaded), args.qr
+                    )
+            print(f"\r{stats.line()}", end="", flush=True)
+    finally:
+        print()
+        for target in targets:
+            await target.close()
+        if stream is not sys.stdin:
+            stream.close()
+        if rejects_file is not None:
+            rejects_file.close()
+        qr_cache.shutdown()
+    print(f"Готово: {stats.line()}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.tools.import_links", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="файл CSV/NDJSON или - для stdin")
+    parser.add_argument("--format", choices=("csv", "ndjson"), help="формат (по умолчанию - по расширению)")
+    parser.add_argument("--batch", type=int, default=20_000, help="строк в одной пачке")
+    parser.add_argument("--domain-id", type=int, default=None, help="собственный домен ссылок (по умолчанию основной)")
+    parser.add_argument("--user-id", type=int, default=None, help="владелец ссылок (по умолчанию анонимные)")
+    parser.add_argument("--expires-days", type=int, default=settings.LINK_EXPIRATION_DAYS,
+                        help="срок действия ссылок без expires_at (0 - бессрочные)")
+    parser.add_argument("--rejects", help="CSV для отклоненных строк с причиной")
+    parser.add_argument("--no-events", action="store_true",
+                        help="не писать события в outbox (edge-узлы увидят ссылки при полной синхронизации)")
+    parser.add_argument("--qr", type=lambda value: value.split(","),
+                        help=f"отрисовать QR-коды загруженных ссылок в дисковый кэш: {','.join(FORMATS)}")
+    args = parser.parse_args(argv)
+    if args.qr and not set(args.qr) <= set(FORMATS):
+        parser.error(f"--qr: допустимые форматы {', '.join(FORMATS)}")
+    if args.qr and not settings.QR_CACHE_DIR:
+        parser.error("--qr требует QR_CACHE_DIR")
+    if args.format is None:
+        args.format = "ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv"
+
+    dialect = (shards.engines[0] if shards.SHARDED else engine).dialect.name
+    if dialect != "postgresql":
+        sys.exit("Импорт через COPY поддерживается только для PostgreSQL")
+    engine.echo = False
+
+    async def run():
+        try:
+            await run_import(args)
+        finally:
+            await engine.dispose()
+            await shards.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
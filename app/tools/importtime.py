@@ -0,0 +1,90 @@
+"""
+Проверка времени импорта приложения (бюджет холодного старта инстанса).
+
+    python -m app.tools.importtime
+    python -m app.tools.importtime --budget-ms 700 --top 20
+
+Запускает `python -X importtime -c "import app.main"` в отдельном процессе
+несколько раз (после прогревочного импорта, который компилирует байткод),
+берет лучший результат и печатает самые тяжелые пакеты.
+Код возврата 1, если импорт дольше бюджета или при старте загружен модуль
+из списка --forbid (по умолчанию - зависимости, которые должны грузиться лениво).
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Нужны только авторизации, edge-узлу, QR-кодам и подтверждению доменов -
+# на старте основного сервиса их быть не должно
+LAZY_MODULES = ("jose", "passlib", "bcrypt", "httpx", "segno", "dns")
+
+# Бюджет времени импорта app.main (мс) на инстансе сервиса: цель - первый редирект
+# через несколько сотен миллисекунд после запуска процесса, и импорт - основная их часть
+DEFAULT_BUDGET_MS = 400
+
+
+def warm_up(module: str) -> None:
+    """Импортирует `module` один раз, чтобы замеры не включали компиляцию байткода"""
+    env = {name: value for name, value in os.environ.items() if name != "PYTHONDONTWRITEBYTECODE"}
+    result = subprocess.run([sys.executable, "-c", f"import {module}"], capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        sys.exit(f"Ошибка импорта {module}:\n{result.stderr}")
+
+
+def measure(module: str) -> Tuple[int, Dict[str, int], List[str]]:
+    """Время импорта `module` (мкс), собственное время по пакетам верхнего уровня и список модулей"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Ошибка импорта {module}:\n{result.stderr}")
+    total = 0
+    packages: Dict[str, int] = defaultdict(int)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        modules.append(name)
+        packages[name.split(".")[0]] += int(self_us)
+        if name == module:
+            total = int(cumulative_us)
+    return total, packages, modules
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.tools.importtime", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="допустимое время импорта (мс)")
+    parser.add_argument("--runs", type=int, default=3, help="сколько раз измерить (берется лучший)")
+    parser.add_argument("--top", type=int, default=15, help="сколько тяжелых пакетов показать")
+    parser.add_argument("--forbid", action="append", help="модуль, который не должен импортироваться при старте")
+    args = parser.parse_args(argv)
+    forbidden = args.forbid or list(LAZY_MODULES)
+
+    warm_up(args.module)
+    total, packages, modules = min(
+        (measure(args.module) for _ in range(args.runs)), key=lambda item: item[0]
+    )
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{self_us / 1000:8.1f} мс  {package}")
+    print(f"Импорт {args.module}: {total / 1000:.1f} мс (бюджет {args.budget_ms:.0f} мс)")
+
+    failed = False
+    loaded = sorted({name for name in modules if name.split(".")[0] in forbidden})
+    if loaded:
+        print(f"При старте загружены ленивые модули: {', '.join(loaded)}")
+        failed = True
+    if total / 1000 > args.budget_ms:
+        print("Бюджет превышен")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
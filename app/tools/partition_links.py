@@ -0,0 +1,319 @@
+"""
+Перевод таблицы link на HASH-секционирование по short_code без остановки сервиса.
+
+    python -m app.tools.partition_links migrate --partitions 16
+    python -m app.tools.partition_links bench --table link_old --table link
+    python -m app.tools.partition_links drop-old
+    python -m app.tools.partition_links archive-partitions --months 3
+
+migrate:
+  1. создает секционированную таблицу link_new и триггер на link, который
+     зеркалирует в нее все INSERT/UPDATE/DELETE;
+  2. копирует существующие строки пачками по id (строки пачки блокируются
+     FOR SHARE, чтобы параллельные изменения не разошлись с копией);
+  3. в короткой транзакции под ACCESS EXCLUSIVE меняет таблицы местами:
+     link -> link_old, link_new -> link.
+После проверки (например, bench) link_old удаляется командой drop-old.
+Приложение после переключения запускается с LINK_PARTITIONS=<число секций>.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Column, Index, MetaData, Table, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from app.crud import link as link_crud
+from app.db.base import engine
+from app.models.link import Link, archive_partition_ddl, hash_partition_ddl
+
+SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION link_partition_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM link_new WHERE id = OLD.id AND short_code = OLD.short_code;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO link_new SELECT NEW.*;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# Ограничения и индексы новой таблицы создаются с суффиксом _new и переименовываются
+# при переключении. Первичный ключ секционированной таблицы включает short_code
+NEW_TABLE_CONSTRAINTS = [
+    "ALTER TABLE link_new ADD CONSTRAINT link_pkey_new PRIMARY KEY (id, short_code)",
+    "ALTER TABLE link_new ADD CONSTRAINT uq_link_domain_short_code_new UNIQUE (domain_id, short_code)",
+    "ALTER TABLE link_new ADD CONSTRAINT link_domain_id_fkey_new FOREIGN KEY (domain_id) REFERENCES domain (id)",
+    'ALTER TABLE link_new ADD CONSTRAINT link_user_id_fkey_new FOREIGN KEY (user_id) REFERENCES "user" (id)',
+]
+
+
+def new_table_indexes() -> List[str]:
+    """
+    DDL индексов link_new - все индексы модели Link (поиск, истечение, статистика...),
+    чтобы после переключения запросы не превратились в полный просмотр секций
+    """
+    table = Link.__table__
+    new_table = Table("link_new", MetaData(), *(Column(column.name, column.type) for column in table.columns))
+    ddl = []
+    for index in sorted(table.indexes, key=lambda index: index.name):
+        new_index = Index(
+            f"{index.name}_new", *(new_table.c[column.name] for column in index.columns),
+            unique=index.unique, **dict(index.dialect_kwargs),
+        )
+        ddl.append(str(CreateIndex(new_index).compile(dialect=postgresql.dialect())))
+    return ddl
+
+
+# Запрос get_redirect_target: условие на домен - как в _in_domain ("domain_id IS NULL"
+# для основного домена, "domain_id = :domain" для собственного), чтобы замер шел
+# по тем же индексам, что и редиректы. Срок действия приложение проверяет у найденной строки
+LOOKUP_SQL = """
+SELECT original_url, coalesce(updated_at, created_at), expires_at, redirect_type
+FROM {table}
+WHERE short_code = :code AND {in_domain} AND is_active
+"""
+
+
+def lookup_query(table: str, domain_id: Optional[int]) -> Tuple[str, dict]:
+    """SQL поиска редиректа в таблице и параметры условия на домен (код - параметр :code)"""
+    if domain_id is None:
+        return LOOKUP_SQL.format(table=table, in_domain="domain_id IS NULL"), {}
+    return LOOKUP_SQL.format(table=table, in_domain="domain_id = :domain"), {"domain": domain_id}
+
+
+async def _relkind(conn, name: str):
+    result = await conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relnamespace = 'public'::regnamespace"),
+        {"name": name},
+    )
+    return result.scalar()
+
+
+async def prepare(partitions: int) -> int:
+    """Создает link_new с секциями и триггер синхронизации. Возвращает max(id) на момент старта"""
+    async with engine.begin() as conn:
+        kind = await _relkind(conn, "link")
+        if kind is None:
+            raise SystemExit("Таблица link не найдена")
+        if kind == "p":
+            raise SystemExit("Таблица link уже секционирована")
+        if await _relkind(conn, "link_new") is not None:
+            raise SystemExit("Таблица link_new уже существует: удалите ее или завершите прошлый запуск")
+
+        await conn.execute(text(
+            "CREATE TABLE link_new (LIKE link INCLUDING DEFAULTS INCLUDING COMMENTS) "
+            "PARTITION BY HASH (short_code)"
+        ))
+        for ddl in hash_partition_ddl("link_new", "link_new", partitions):
+            await conn.execute(text(ddl))
+        # Триграммный индекс поиска нужен и базам, созданным до его появления
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for ddl in NEW_TABLE_CONSTRAINTS + new_table_indexes():
+            await conn.execute(text(ddl))
+
+        await conn.execute(text(SYNC_FUNCTION))
+        await conn.execute(text(
+            "CREATE TRIGGER link_partition_sync AFTER INSERT OR UPDATE OR DELETE ON link "
+            "FOR EACH ROW EXECUTE FUNCTION link_partition_sync()"
+        ))
+        # Строки с id больше этого значения попадут в link_new через триггер
+        result = await conn.execute(text("SELECT coalesce(max(id), 0) FROM link"))
+        return result.scalar()
+
+
+async def backfill(max_id: int, batch: int, pause: float) -> None:
+    copied = 0
+    last_id = 0
+    started = time.monotonic()
+    while last_id < max_id:
+        upper = min(last_id + batch, max_id)
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                text(
+                    "INSERT INTO link_new SELECT * FROM link WHERE id > :low AND id <= :high "
+                    "FOR SHARE ON CONFLICT DO NOTHING"
+                ),
+                {"low": last_id, "high": upper},
+            )
+        copied += result.rowcount
+        last_id = upper
+        elapsed = time.monotonic() - started
+        print(
+            f"\rскопировано {copied} строк, id {last_id}/{max_id}, "
+            f"{copied / elapsed if elapsed else 0:.0f} строк/с",
+            end="", flush=True,
+        )
+        if pause:
+            await asyncio.sleep(pause)
+    print()
+
+
+async def _rename_constraints(conn, table: str, rename) -> None:
+    result = await conn.execute(
+        text("SELECT conname FROM pg_constraint WHERE conrelid = CAST(:table AS regclass)"),
+        {"table": table},
+    )
+    for (name,) in result.all():
+        if rename(name) != name:
+            await conn.execute(text(f'ALTER TABLE {table} RENAME CONSTRAINT "{name}" TO "{rename(name)}"'))
+    # Индексы, не связанные с ограничениями (все индексы модели)
+    result = await conn.execute(
+        text(
+            "SELECT i.relname FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = CAST(:table AS regclass) "
+            "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)"
+        ),
+        {"table": table},
+    )
+    for (name,) in result.all():
+        if rename(name) != name:
+            await conn.execute(text(f'ALTER INDEX "{name}" RENAME TO "{rename(name)}"'))
+
+
+async def verify() -> None:
+    # Один снимок на оба подсчета: триггер пишет в link_new в той же транзакции,
+    # что и изменение link, поэтому числа должны совпасть без блокировки таблиц
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+        async with conn.begin():
+            old_count = (await conn.execute(text("SELECT count(*) FROM link"))).scalar()
+            new_count = (await conn.execute(text("SELECT count(*) FROM link_new"))).scalar()
+    if old_count != new_count:
+        raise SystemExit(f"Число строк не совпадает: link={old_count}, link_new={new_count}")
+    print(f"Проверено: {new_count} строк")
+
+
+async def swap(partitions: int) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(text("LOCK TABLE link IN ACCESS EXCLUSIVE MODE"))
+        await conn.execute(text("DROP TRIGGER link_partition_sync ON link"))
+        await conn.execute(text("ALTER TABLE link RENAME TO link_old"))
+        await _rename_constraints(conn, "link_old", lambda name: f"{name}_old")
+        await conn.execute(text("ALTER TABLE link_new RENAME TO link"))
+        await _rename_constraints(conn, "link", lambda name: name.removesuffix("_new"))
+        for i in range(partitions):
+            await conn.execute(text(f"ALTER TABLE link_new_p{i} RENAME TO link_p{i}"))
+        # Последовательность id должна пережить удаление link_old
+        await conn.execute(text("ALTER SEQUENCE link_id_seq OWNED BY link.id"))
+    print(f"Готово: link секционирована на {partitions} секций, старая таблица - link_old")
+
+
+async def migrate(args) -> None:
+    max_id = await prepare(args.partitions)
+    print(f"Создана link_new ({args.partitions} секций), копируем строки до id {max_id}")
+    await backfill(max_id, args.batch, args.pause)
+    await verify()
+    await swap(args.partitions)
+
+
+async def drop_old(args) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP TABLE IF EXISTS link_old"))
+        await conn.execute(text("DROP FUNCTION IF EXISTS link_partition_sync()"))
+    print("link_old удалена")
+
+
+async def archive_partitions(args) -> None:
+    """Создает секции архива на текущий и следующие месяцы, пока в них нет строк"""
+    month = link_crud.utcnow().replace(day=1)
+    async with engine.begin() as conn:
+        for _ in range(args.months + 1):
+            await conn.execute(text(archive_partition_ddl(month)))
+            print(f"link_archive_{month:%Y_%m}")
+            month = (month + timedelta(days=32)).replace(day=1)
+
+
+async def bench(args) -> None:
+    """Сравнивает задержку поиска редиректа по случайным кодам в указанных таблицах"""
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text(f"SELECT short_code, domain_id FROM {args.table[0]} TABLESAMPLE SYSTEM (1) LIMIT :n"),
+            {"n": args.samples},
+        )
+        codes = result.all()
+        if len(codes) < args.samples:
+            result = await conn.execute(
+                text(f"SELECT short_code, domain_id FROM {args.table[0]} ORDER BY random() LIMIT :n"),
+                {"n": args.samples},
+            )
+            codes = result.all()
+        if not codes:
+            raise SystemExit("Нет ссылок для замера")
+
+        for table in args.table:
+            queries = []
+            for code, domain_id in codes:
+                sql, params = lookup_query(table, domain_id)
+                queries.append((text(sql), {"code": code, **params}))
+            # Прогрев кэша планов и буферов
+            for query, params in queries[:100]:
+                await conn.execute(query, params)
+            timings = []
+            for query, params in queries:
+                started = time.perf_counter()
+                await conn.execute(query, params)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            sql, params = lookup_query(table, codes[0][1])
+            plan = await conn.execute(text("EXPLAIN (ANALYZE, COSTS OFF) " + sql), {"code": codes[0][0], **params})
+            scans = sum(1 for (line,) in plan.all() if " on " in line and "Scan" in line)
+            print(
+                f"{table}: {len(timings)} запросов, "
+                f"p50 {statistics.median(timings):.3f} мс, "
+                f"p95 {timings[int(len(timings) * 0.95) - 1]:.3f} мс, "
+                f"p99 {timings[int(len(timings) * 0.99) - 1]:.3f} мс, "
+                f"сканов в плане: {scans}"
+            )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.tools.partition_links", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("migrate", help="секционировать существующую таблицу link")
+    cmd.add_argument("--partitions", type=int, default=16)
+    cmd.add_argument("--batch", type=int, default=10_000, help="строк за одну транзакцию копирования")
+    cmd.add_argument("--pause", type=float, default=0.05, help="пауза между пачками (секунды)")
+    cmd.set_defaults(func=migrate)
+
+    cmd = commands.add_parser("drop-old", help="удалить link_old после переключения")
+    cmd.set_defaults(func=drop_old)
+
+    cmd = commands.add_parser("archive-partitions", help="создать секции архива заранее")
+    cmd.add_argument("--months", type=int, default=3)
+    cmd.set_defaults(func=archive_partitions)
+
+    cmd = commands.add_parser("bench", help="замерить задержку поиска по коду")
+    cmd.add_argument("--table", action="append", help="таблица (можно несколько: link_old и link)")
+    cmd.add_argument("--samples", type=int, default=2000)
+    cmd.set_defaults(func=bench)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "table", "") is None:
+        args.table = ["link"]
+    if engine.dialect.name != "postgresql":
+        sys.exit("Секционирование поддерживается только для PostgreSQL")
+    engine.echo = False
+
+    async def run():
+        try:
+            await args.func(args)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
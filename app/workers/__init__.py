@@ -0,0 +1 @@
+# Фоновые задачи, которые запускаются вместе с приложением в lifespan
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import timedelta
+from typing import Optional
+
+from app.core.config import settings
+from app.crud import link as link_crud
+from app.crud import link_stats as link_stats_crud
+from app.db import lease
+from app.db.base import async_session
+from app.db.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = "aggregates:worker"
+
+
+class AggregatesWorker:
+    """
+    Пересчитывает агрегаты статистики (app.models.link_stats) раз в `interval` секунд
+    и заменяет их одним коммитом - эндпоинты /admin/stats/* читают только готовые
+    таблицы. Счетчики, топ ссылок и доменов пересчитываются целиком (по одному
+    сканированию link на шард), созданные по часам - только за последние часы
+    по индексу created_at; хранится `hours` часов истории.
+    Как и другие фоновые задачи, во всех воркерах работает один экземпляр (аренда в Valkey).
+    """
+
+    def __init__(self, interval: float, hours: int, top: int):
+        self.interval = interval
+        self.hours = hours
+        self.top = top
+        self._token = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> None:
+        started = time.monotonic()
+        now = link_crud.utcnow()
+        keep_since = (now - timedelta(hours=self.hours)).replace(minute=0, second=0, microsecond=0)
+        async with async_session() as db:
+            latest = await link_stats_crud.latest_hour(db)
+            # Прошлый час пересчитывается еще раз: транзакции создания могли зафиксироваться позже
+            hours_since = max(keep_since, latest - timedelta(hours=1)) if latest else keep_since
+            summary = await link_stats_crud.compute_summary(db, now=now)
+            hours = await link_stats_crud.compute_created_per_hour(db, since=hours_since)
+            top_links = await link_stats_crud.compute_top_links(db, limit=self.top)
+            top_domains = await link_stats_crud.compute_top_domains(db, limit=self.top)
+            refresh_ms = int((time.monotonic() - started) * 1000)
+            await link_stats_crud.replace_snapshot(
+                db, summary=summary, refreshed_at=now, refresh_ms=refresh_ms,
+                hours=hours, hours_since=hours_since, keep_since=keep_since,
+                top_links=top_links, top_domains=top_domains,
+            )
+        logger.info(f"Статистика ссылок пересчитана за {refresh_ms} мс")
+
+    async def _run(self) -> None:
+        ttl_ms = int(max(self.interval * 2, 60) * 1000)
+        while True:
+            try:
+                if redis_client is None or await lease.hold(LEASE_KEY, self._token, ttl_ms):
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка пересчета статистики ссылок: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+aggregates_worker = AggregatesWorker(
+    interval=settings.AGGREGATES_REFRESH_INTERVAL,
+    hours=settings.AGGREGATES_HOURS,
+    top=settings.AGGREGATES_TOP,
+)
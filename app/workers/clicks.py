@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Optional
+
+from app.core.config import settings
+from app.crud import link as link_crud
+from app.db.base import async_session
+
+logger = logging.getLogger(__name__)
+
+
+class ClickBuffer:
+    """
+    Накапливает клики горячих ссылок в памяти и периодически сбрасывает их в БД
+    одним пакетным UPDATE вместо UPDATE на каждый переход.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, short_code: str, domain_id: Optional[int] = None) -> None:
+        self._pending[(domain_id, short_code)] += 1
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, Counter()
+        try:
+            async with async_session() as db:
+                await link_crud.add_clicks_bulk(db, dict(pending))
+        except Exception as e:
+            logger.error(f"Ошибка сброса кликов ({len(pending)} ссылок): {e}")
+            # Вернем клики в буфер, чтобы не потерять их до следующей попытки
+            self._pending.update(pending)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+click_buffer = ClickBuffer(settings.HOT_LINK_FLUSH_INTERVAL)
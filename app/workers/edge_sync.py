@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
+
+from app.core.config import settings
+from app.crud.link import LinkChange
+from app.db.edge_store import SQLiteLinkStore, edge_store
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# Транзакция на основном сервисе может зафиксироваться позже, чем наступило
+# записанное ею updated_at, поэтому опрос /edge/links/delta перечитывает последние секунды
+_OVERLAP = timedelta(seconds=5)
+
+# Сколько основной сервис держит запрос ленты изменений, если событий нет (секунды)
+_LONG_POLL = 20
+
+
+def _event_change(event: dict) -> LinkChange:
+    """Событие ленты изменений в виде состояния ссылки для снимка"""
+    return LinkChange(
+        id=event["link_id"],
+        domain_id=event["domain_id"],
+        short_code=event["short_code"],
+        original_url=event["original_url"],
+        expires_at=datetime.fromisoformat(event["expires_at"]) if event["expires_at"] else None,
+        # Удаленные и истекшие ссылки снимок удаляет
+        is_active=event["op"] in ("create", "update") and bool(event["is_active"]),
+        changed_at=datetime.fromisoformat(event["created_at"]),
+        # Тип не записан только в событиях удаления и истечения: такие ссылки снимок удаляет
+        redirect_type=event.get("redirect_type") or settings.REDIRECT_DEFAULT_TYPE,
+    )
+
+
+class EdgeSync:
+    """
+    Синхронизация edge-узла с основным сервисом. Снимок ссылок загружается целиком
+    (GET /edge/links/delta), затем поддерживается лентой изменений
+    (GET /edge/links/changes, long-poll) - включая удаления и истечения.
+    Раз в EDGE_FULL_SYNC_INTERVAL и при устаревшем курсоре ленты снимок перечитывается
+    целиком. Если лента на основном сервисе недоступна, изменения опрашиваются
+    по времени изменения ссылок. Накопленные клики отправляются раз в `interval`
+    (POST /edge/links/clicks).
+    """
+
+    def __init__(self, store: SQLiteLinkStore, primary_url: str, secret: str,
+                 interval: float, batch: int, full_interval: float):
+        self.store = store
+        self.primary_url = primary_url.rstrip("/")
+        self.secret = secret
+        self.interval = interval
+        self.batch = batch
+        self.full_interval = full_interval
+        self._clicks: Counter = Counter()
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._task: Optional[asyncio.Task] = None
+        self._clicks_task: Optional[asyncio.Task] = None
+        self._next_full = 0.0
+
+    def add_click(self, short_code: str, domain_id: Optional[int] = None) -> None:
+        self._clicks[(domain_id, short_code)] += 1
+
+    async def _pull(self, since: Optional[str], since_id: int, generation: int) -> Optional[str]:
+        """
+        Забирает страницы изменений начиная с курсора. Возвращает позицию ленты
+        изменений на момент первой страницы (None - лента недоступна)
+        """
+        cursor, first_page = None, True
+        while True:
+            params = {"since_id": since_id, "limit": self.batch}
+            if since is not None:
+                params["since"] = since
+            response = await self._client.get("/edge/links/delta", params=params)
+            response.raise_for_status()
+            page = response.json()
+            if first_page:
+                cursor, first_page = page.get("cursor"), False
+            fields = page["fields"]
+            changes = []
+            for row in page["links"]:
+                # Поля, которых этот узел не знает (основной сервис новее), пропускаются
+                change = {name: value for name, value in zip(fields, row) if name in LinkChange._fields}
+                for name in ("expires_at", "changed_at"):
+                    if change[name] is not None:
+                        change[name] = datetime.fromisoformat(change[name])
+                changes.append(LinkChange(**change))
+            meta = None
+            if page["next"] is not None:
+                since, since_id = page["next"]["since"], page["next"]["since_id"]
+                meta = {"since": since}
+            await asyncio.to_thread(self.store.apply, changes, page["domains"], generation, meta)
+            if len(changes) < self.batch:
+                return cursor
+
+    async def _follow(self, cursor: str) -> bool:
+        """Применяет одну порцию ленты изменений. False - курсор устарел"""
+        response = await self._client.get(
+            "/edge/links/changes",
+            params={"since": cursor, "timeout": _LONG_POLL, "limit": self.batch},
+        )
+        if response.status_code == 410:
+            return False
+        response.raise_for_status()
+        page = response.json()
+        if page["events"] or page["cursor"] != cursor:
+            changes = [_event_change(event) for event in page["events"]]
+            generation = int(self.store.get_meta("generation") or 0)
+            await asyncio.to_thread(self.store.apply, changes, None, generation, {"cursor": page["cursor"]})
+        return True
+
+    async def sync_once(self) -> None:
+        generation = int(self.store.get_meta("generation") or 0)
+        if time.monotonic() >= self._next_full:
+            # Полный снимок с новым поколением, затем удаляем строки старых поколений
+            generation += 1
+            cursor = await self._pull(None, 0, generation)
+            dropped = await asyncio.to_thread(self.store.drop_stale, generation)
+            meta = {"generation": str(generation), "cursor": cursor or ""}
+            await asyncio.to_thread(self.store.apply, [], None, generation, meta)
+            self._next_full = time.monotonic() + self.full_interval
+            logger.info(f"Полная синхронизация снимка: {self.store.count()} ссылок, удалено {dropped}")
+            return
+
+        cursor = self.store.get_meta("cursor")
+        if cursor:
+            if not await self._follow(cursor):
+                logger.warning("Курсор ленты изменений устарел, выполняем полную синхронизацию")
+                self._next_full = 0.0
+            return
+        # Лента недоступна: опрашиваем изменения по времени (удаления - только полной синхронизацией)
+        since = self.store.get_meta("since")
+        if since is not None:
+            since = (datetime.fromisoformat(since) - _OVERLAP).isoformat()
+        await self._pull(since, 0, generation)
+        await asyncio.sleep(self.interval)
+
+    async def upload_clicks(self) -> None:
+        if not self._clicks:
+            return
+        clicks, self._clicks = self._clicks, Counter()
+        try:
+            response = await self._client.post(
+                "/edge/links/clicks",
+                json={"clicks": [[domain_id, code, count] for (domain_id, code), count in clicks.items()]},
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logger.error(f"Ошибка отправки кликов ({len(clicks)} ссылок): {e}")
+            # Вернем клики в буфер, чтобы отправить их при следующей попытке
+            self._clicks.update(clicks)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sync_once()
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации снимка ссылок: {e}")
+                await asyncio.sleep(self.interval)
+
+    async def _run_clicks(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.upload_clicks()
+
+    def start(self) -> None:
+        # httpx нужен только edge-узлу - не импортируем его при старте основного сервиса
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.primary_url, headers={"X-Edge-Token": self.secret}, timeout=_LONG_POLL + 10
+            )
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            self._clicks_task = asyncio.create_task(self._run_clicks())
+
+    async def stop(self) -> None:
+        for task in (self._task, self._clicks_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._clicks_task = None
+        if self._client is not None:
+            await self.upload_clicks()
+            await self._client.aclose()
+            self._client = None
+
+
+edge_sync = EdgeSync(
+    edge_store,
+    primary_url=settings.EDGE_PRIMARY_URL,
+    secret=settings.EDGE_SYNC_SECRET,
+    interval=settings.EDGE_SYNC_INTERVAL,
+    batch=settings.EDGE_SYNC_BATCH,
+    full_interval=settings.EDGE_FULL_SYNC_INTERVAL,
+)
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.crud import link as link_crud
+from app.db import expiry_schedule, lease, link_cache, outbox
+from app.db.base import async_session
+from app.db.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = "expiry:worker"
+CURSOR_KEY = "expiry:cursor"
+
+
+class ExpiryWorker:
+    """
+    Деактивирует ссылки в момент истечения: пишет событие expire в outbox и сбрасывает
+    кэши, чтобы поиск ссылки для редиректа оставался поиском по ключу.
+
+    Сроки берутся из расписания в Valkey (app.db.expiry_schedule), которое пополняется
+    лентой изменений (создание и изменение ссылок) и раз в половину горизонта -
+    из БД. Как и реле outbox, во всех воркерах работает один экземпляр (аренда в Valkey).
+    Раз в `sweep_interval` истекшие ссылки дополнительно ищутся в БД - на случай
+    потери расписания; без Valkey работает только этот проход. При LINK_ARCHIVE_EXPIRED
+    тот же проход переносит деактивированные истекшие ссылки в link_archive.
+    """
+
+    def __init__(self, tick: float, horizon: float, sweep_interval: float, batch: int):
+        self.tick = tick
+        self.horizon = horizon
+        self.sweep_interval = sweep_interval
+        self.batch = batch
+        self._token = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self._next_load = 0.0
+        self._next_sweep = 0.0
+
+    async def _expire(self, links: List[Tuple[Optional[int], str, datetime]]) -> None:
+        # Версия надгробия - updated_at деактивированной строки, по часам БД
+        await link_cache.invalidate_many(
+            [(domain_id, short_code) for domain_id, short_code, _ in links],
+            [link_cache.version_of(updated_at) for _, _, updated_at in links],
+        )
+        if links:
+            logger.info(f"Деактивировано истекших ссылок: {len(links)}")
+
+    async def follow_changes(self) -> None:
+        """Переносит в расписание сроки из новых событий ленты изменений"""
+        cursor = await redis_client.get(CURSOR_KEY)
+        try:
+            events, cursor = await outbox.read(cursor, limit=self.batch)
+        except outbox.CursorExpired:
+            # Пропущенные события покроет загрузка горизонта из БД
+            events, cursor = [], await outbox.head()
+            self._next_load = 0.0
+        horizon = time.time() + self.horizon
+        scheduled, removed = [], []
+        for event in events:
+            key = (event["domain_id"], event["short_code"])
+            expires_at = datetime.fromisoformat(event["expires_at"]) if event["expires_at"] else None
+            if (event["op"] in ("create", "update") and event["is_active"] and expires_at is not None
+                    and expiry_schedule.score(expires_at) <= horizon):
+                scheduled.append((*key, expires_at))
+            else:
+                removed.append(key)
+        await expiry_schedule.unschedule(removed)
+        await expiry_schedule.schedule(scheduled)
+        await redis_client.set(CURSOR_KEY, cursor)
+
+    async def load_horizon(self) -> int:
+        """Ставит в расписание все активные ссылки, истекающие в пределах горизонта"""
+        until = link_crud.utcnow() + timedelta(seconds=self.horizon)
+        after, loaded = None, 0
+        while True:
+            async with async_session() as db:
+                rows = await link_crud.get_expiring(db, until=until, after=after, limit=self.batch)
+            await expiry_schedule.schedule(
+                (domain_id, code, expires_at) for expires_at, _, domain_id, code in rows
+            )
+            loaded += len(rows)
+            if len(rows) < self.batch:
+                return loaded
+            after = (rows[-1].expires_at, rows[-1].id)
+
+    async def expire_due(self) -> int:
+        """Деактивирует ссылки, срок которых наступил по расписанию"""
+        due = await expiry_schedule.pop_due(self.batch)
+        if not due:
+            return 0
+        async with async_session() as db:
+            expired = await link_crud.deactivate_expired(db, short_codes=[code for _, code in due])
+        await self._expire(expired)
+        return len(due)
+
+    async def sweep(self) -> None:
+        while True:
+            async with async_session() as db:
+                expired = await link_crud.deactivate_expired(db, limit=self.batch)
+            await self._expire(expired)
+            if len(expired) < self.batch:
+                break
+        if settings.LINK_ARCHIVE_EXPIRED:
+            await self.archive()
+
+    async def archive(self) -> None:
+        """Переносит деактивированные истекшие ссылки в link_archive"""
+        while True:
+            async with async_session() as db:
+                moved = await link_crud.archive_expired(db, limit=self.batch)
+            if moved:
+                logger.info(f"Перенесено в архив истекших ссылок: {moved}")
+            if moved < self.batch:
+                return
+
+    async def run_once(self) -> int:
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            await self.sweep()
+        if redis_client is None:
+            return 0
+        await self.follow_changes()
+        if now >= self._next_load:
+            self._next_load = now + self.horizon / 2
+            await self.load_horizon()
+        return await self.expire_due()
+
+    async def _delay(self) -> float:
+        # До ближайшего срока, но не дольше tick (расписание могло пополниться)
+        if redis_client is None:
+            return self.sweep_interval
+        next_due = await expiry_schedule.next_due()
+        if next_due is None:
+            return self.tick
+        return min(self.tick, max(next_due - time.time(), 0.01))
+
+    async def _run(self) -> None:
+        ttl_ms = int(max(self.tick * 20, 10) * 1000)
+        while True:
+            expired = 0
+            delay = self.tick
+            try:
+                if redis_client is None or await lease.hold(LEASE_KEY, self._token, ttl_ms):
+                    expired = await self.run_once()
+                    delay = await self._delay()
+            except Exception as e:
+                logger.error(f"Ошибка обработки истечения ссылок: {e}")
+            # Полная пачка - срок наступил у многих ссылок сразу
+            if expired < self.batch:
+                await asyncio.sleep(delay)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+expiry_worker = ExpiryWorker(
+    tick=settings.EXPIRY_TICK,
+    horizon=settings.EXPIRY_HORIZON,
+    sweep_interval=settings.EXPIRY_SWEEP_INTERVAL,
+    batch=settings.EXPIRY_BATCH,
+)
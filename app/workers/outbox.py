@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud import link_event as link_event_crud
+from app.db import lease, outbox, shards
+from app.db.base import async_session
+from app.db.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = "outbox:relay"
+
+# Как часто удалять из таблицы старые опубликованные события (секунды)
+_PRUNE_INTERVAL = 600
+
+
+class OutboxRelay:
+    """
+    Публикует события из outbox (link_event) в поток Valkey и отмечает их опубликованными.
+    Во всех воркерах работает один экземпляр реле - тот, кто держит аренду в Valkey,
+    поэтому порядок событий одной ссылки в потоке совпадает с порядком изменений.
+    """
+
+    def __init__(self, interval: float, batch: int, retention_hours: int):
+        self.interval = interval
+        self.batch = batch
+        self.retention = timedelta(hours=retention_hours)
+        self._token = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self._next_prune = 0.0
+
+    async def _hold_lease(self) -> bool:
+        ttl_ms = int(max(self.interval * 20, 5) * 1000)
+        return await lease.hold(LEASE_KEY, self._token, ttl_ms)
+
+    async def _relay_shard(self, db: AsyncSession, shard_id: int) -> int:
+        events = await link_event_crud.get_unpublished(db, limit=self.batch)
+        if not events:
+            return 0
+        await outbox.publish(events, shard_id)
+        await link_event_crud.mark_published(db, ids=[event.id for event in events])
+        return len(events)
+
+    async def relay_once(self) -> int:
+        """Один проход по всем шардам, возвращает число опубликованных событий"""
+        async with async_session() as db:
+            counts = await shards.per_shard(db, self._relay_shard)
+        return max(counts)
+
+    async def prune(self) -> None:
+        before = datetime.now(timezone.utc) - self.retention
+        async with async_session() as db:
+            removed = await shards.fan_out(
+                db, lambda db: link_event_crud.remove_published_before(db, before=before)
+            )
+        if sum(removed):
+            logger.info(f"Удалено старых событий outbox: {sum(removed)}")
+
+    async def _run(self) -> None:
+        while True:
+            relayed = 0
+            try:
+                if await self._hold_lease():
+                    relayed = await self.relay_once()
+                    if time.monotonic() >= self._next_prune:
+                        self._next_prune = time.monotonic() + _PRUNE_INTERVAL
+                        await self.prune()
+            except Exception as e:
+                logger.error(f"Ошибка публикации событий outbox: {e}")
+            # Полная пачка - в outbox, вероятно, есть еще события
+            if relayed < self.batch:
+                await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        # Без Valkey публиковать некуда: события копятся в таблице до его появления
+        if redis_client is None:
+            logger.warning("Valkey недоступен, реле outbox не запущено")
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+outbox_relay = OutboxRelay(
+    interval=settings.OUTBOX_RELAY_INTERVAL,
+    batch=settings.OUTBOX_RELAY_BATCH,
+    retention_hours=settings.OUTBOX_RETENTION_HOURS,
+)
@@ -0,0 +1,354 @@
+import asyncio
+import html
+import ipaddress
+import logging
+import math
+import random
+import re
+import socket
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from app.core.config import settings
+from app.core.hotlinks import hot_links
+from app.crud import link as link_crud
+from app.db import lease, outbox, probes
+from app.db.base import async_session
+from app.db.redis import redis_client
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+LEASE_KEY = "probe:worker"
+CURSOR_KEY = "probe:cursor"
+
+_TICK = 1.0
+_MAX_REDIRECTS = 5
+# Сколько байт HTML читать в поисках <title>
+_TITLE_BYTES = 64 * 1024
+_TITLE_RE = re.compile(rb"<title[^>]*>(.*?)</title", re.IGNORECASE | re.DOTALL)
+# Адрес отвечает, но не пускает робота - считаем его живым
+_REACHABLE = {401, 403, 405, 429}
+
+
+class BlockedAddress(Exception):
+    pass
+
+
+def is_public(address: str) -> bool:
+    return ipaddress.ip_address(address).is_global
+
+
+class ProbeWorker:
+    """
+    Проверяет адреса назначения ссылок: GET с ограниченным чтением тела (статус,
+    итоговый адрес после редиректов, <title>), результат кладется в Valkey
+    (app.db.probes) и отдается как превью в GET /links/{short_code}?preview=true.
+    Сам редирект результатов не читает и проверок не ждет.
+
+    Ссылки попадают в расписание из ленты изменений (новые и измененные проверяются
+    сразу) и обходом БД раз в `discover_interval`. Интервал проверки уменьшается
+    с числом кликов, горячие ссылки процесса проверяются с минимальным интервалом;
+    неудачная проверка повторяется через `retry_interval`, а после `dead_after`
+    неудач подряд адрес считается недоступным и проверяется все реже.
+
+    Запросы идут через один httpx.AsyncClient с ограниченным пулом соединений
+    (keep-alive между проверками), не больше `concurrency` одновременно и не больше
+    `per_host` к одному хосту. Соединение открывается с тем адресом, который
+    проверил _resolve (app.workers.probe_transport). Как и другие фоновые задачи, во всех воркерах
+    работает один экземпляр (аренда в Valkey).
+    """
+
+    def __init__(self, interval: float, min_interval: float, max_interval: float, retry_interval: float,
+                 dead_after: int, concurrency: int, per_host: int, timeout: float, batch: int,
+                 discover_interval: float, allow_private: bool, user_agent: str):
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.retry_interval = retry_interval
+        self.dead_after = dead_after
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.batch = batch
+        self.discover_interval = discover_interval
+        self.allow_private = allow_private
+        self.user_agent = user_agent
+        self._token = uuid.uuid4().hex
+        self._client: Optional["httpx.AsyncClient"] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._next_discover = 0.0
+
+    def next_interval(self, clicks: int, failures: int, hot: bool = False) -> float:
+        """Через сколько секунд проверить ссылку снова"""
+        if 0 < failures < self.dead_after:
+            return self.retry_interval
+        if hot:
+            delay = self.min_interval
+        else:
+            delay = self.interval / (1 + math.log10(1 + clicks))
+        if failures:
+            # Недоступный адрес: 1, 2, 4, ... базовых интервала
+            delay *= 2 ** (failures - self.dead_after)
+        delay = min(max(delay, self.min_interval), self.max_interval)
+        # Разброс, чтобы ссылки, найденные одним обходом, не проверялись одной пачкой
+        return delay * random.uniform(0.9, 1.1)
+
+    async def follow_changes(self) -> None:
+        """Ставит на проверку новые ссылки и ссылки со смененным адресом, убирает удаленные"""
+        cursor = await redis_client.get(CURSOR_KEY)
+        try:
+            events, cursor = await outbox.read(cursor, limit=self.batch)
+        except outbox.CursorExpired:
+            # Пропущенные ссылки найдет обход БД
+            events, cursor = [], await outbox.head()
+            self._next_discover = 0.0
+        live: Dict[Tuple[Optional[int], str], str] = {}
+        removed = set()
+        for event in events:
+            key = (event["domain_id"], event["short_code"])
+            if event["op"] in ("create", "update") and event["is_active"]:
+                live[key] = event["original_url"]
+                removed.discard(key)
+            else:
+                removed.add(key)
+                live.pop(key, None)
+        if live:
+            keys = list(live)
+            known = await probes.get_many(keys)
+            changed = [key for key, result in zip(keys, known) if result.get("url") != live[key]]
+            # Результат проверки старого адреса больше не актуален
+            removed.update(changed)
+        await probes.forget(removed)
+        if live:
+            await probes.set_targets((domain_id, code, live[(domain_id, code)], None) for domain_id, code in changed)
+            await probes.schedule({key: time.time() for key in changed})
+        await redis_client.set(CURSOR_KEY, cursor)
+
+    async def discover(self) -> int:
+        """
+        Обходит активные ссылки в БД: обновляет адреса и клики, а еще не
+        проверявшиеся ставит в расписание в случайный момент ближайшего интервала
+        """
+        after_id, found = 0, 0
+        while True:
+            async with async_session() as db:
+                rows = await link_crud.get_live_page(db, after_id=after_id, limit=self.batch)
+            if not rows:
+                return found
+            await probes.set_targets((domain_id, code, url, clicks) for _, domain_id, code, url, clicks in rows)
+            now = time.time()
+            await probes.schedule(
+                {(domain_id, code): now + random.uniform(0, self.interval) for _, domain_id, code, _, _ in rows},
+                only_new=True,
+            )
+            found += len(rows)
+            after_id = rows[-1].id
+
+    async def _lookup(self, host: str) -> List[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            addresses = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise BlockedAddress(f"dns: {e.strerror or e}") from None
+        return [sockaddr[0].split("%", 1)[0] for *_, sockaddr in addresses]
+
+    async def _resolve(self, host: str) -> str:
+        """
+        Адрес, с которым транспорт откроет соединение к хосту. Вызывается при
+        каждом новом соединении, в том числе после редиректа на другой хост
+        """
+        addresses = await self._lookup(host)
+        # Пользовательские URL не должны вести проверку во внутреннюю сеть сервиса
+        if not self.allow_private and not all(is_public(address) for address in addresses):
+            raise BlockedAddress("blocked address")
+        return addresses[0]
+
+    @asynccontextmanager
+    async def _host_slot(self, host: str):
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host)
+        async with semaphore, self._slots:
+            yield
+
+    async def _read_title(self, response: "httpx.Response") -> str:
+        body = b""
+        async for chunk in response.aiter_bytes():
+            body += chunk
+            match = _TITLE_RE.search(body)
+            if match or len(body) >= _TITLE_BYTES:
+                break
+        else:
+            match = _TITLE_RE.search(body)
+        if not match:
+            return ""
+        title = match.group(1).decode(response.encoding or "utf-8", errors="replace")
+        return " ".join(html.unescape(title).split())[:300]
+
+    async def probe(self, url: str) -> Dict[str, str]:
+        """Проверяет адрес, следуя редиректам. Поля результата без failures"""
+        import httpx
+
+        started = time.monotonic()
+        status, title, error = 0, "", ""
+        try:
+            for _ in range(_MAX_REDIRECTS + 1):
+                # Адрес хоста проверяет транспорт при открытии соединения (_resolve)
+                host = urlsplit(url).hostname or ""
+                async with self._host_slot(host):
+                    async with self._client.stream("GET", url) as response:
+                        status = response.status_code
+                        if response.is_redirect and "location" in response.headers:
+                            url = urljoin(url, response.headers["location"])
+                            continue
+                        if "html" in response.headers.get("content-type", ""):
+                            title = await self._read_title(response)
+                        break
+            else:
+                error = "too many redirects"
+        except BlockedAddress as e:
+            error = str(e)
+        except httpx.TimeoutException:
+            error = "timeout"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"[:300]
+        return {
+            "status": status,
+            "ok": "1" if not error and (status < 400 or status in _REACHABLE) else "0",
+            "title": title,
+            "final_url": url,
+            "error": error,
+            "latency_ms": int((time.monotonic() - started) * 1000),
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+        }
+
+    async def _probe_link(self, key: Tuple[Optional[int], str], known: Dict[str, str], hot: set) -> float:
+        """Проверяет ссылку и возвращает время следующей проверки"""
+        domain_id, code = key
+        result = await self.probe(known["url"])
+        failures = 0 if result["ok"] == "1" else int(known.get("failures") or 0) + 1
+        result["failures"] = failures
+        failing_since = time.time() if failures >= self.dead_after else None
+        if failures == self.dead_after:
+            logger.warning(f"Адрес ссылки {code} недоступен: {result['status'] or result['error']}")
+        await probes.store(domain_id, code, result, failing_since)
+        return time.time() + self.next_interval(int(known.get("clicks") or 0), failures, key in hot)
+
+    async def probe_due(self) -> int:
+        due = await probes.pop_due(self.batch)
+        if not due:
+            return 0
+        hot = {(item["domain_id"], item["short_code"]) for item in hot_links.top(self.batch) if item["hot"]}
+        known = await probes.get_many(due)
+        # Ссылки без адреса (запись истекла) вернет в расписание обход БД
+        targets = [(key, result) for key, result in zip(due, known) if result.get("url")]
+        self._hosts.clear()
+        next_at = await asyncio.gather(
+            *(self._probe_link(key, result, hot) for key, result in targets), return_exceptions=True
+        )
+        schedule = {}
+        for (key, _), at in zip(targets, next_at):
+            if isinstance(at, Exception):
+                logger.error(f"Ошибка проверки ссылки {key[1]}: {at}")
+                at = time.time() + self.retry_interval
+            schedule[key] = at
+        await probes.schedule(schedule)
+        return len(due)
+
+    async def run_once(self) -> int:
+        await self.follow_changes()
+        now = time.monotonic()
+        if now >= self._next_discover:
+            self._next_discover = now + self.discover_interval
+            await self.discover()
+        return await self.probe_due()
+
+    async def _delay(self) -> float:
+        next_due = await probes.next_due()
+        if next_due is None:
+            return _TICK
+        return min(_TICK, max(next_due - time.time(), 0.01))
+
+    async def _run(self) -> None:
+        # Аренда должна пережить пачку, в которой все проверки упираются в таймаут
+        ttl_ms = int(max(60, self.timeout * (self.batch / self.concurrency + 2)) * 1000)
+        while True:
+            probed = 0
+            delay = _TICK
+            try:
+                if await lease.hold(LEASE_KEY, self._token, ttl_ms):
+                    probed = await self.run_once()
+                    delay = await self._delay()
+            except Exception as e:
+                logger.error(f"Ошибка проверки адресов ссылок: {e}")
+            if probed < self.batch:
+                await asyncio.sleep(delay)
+
+    def open(self) -> None:
+        """Создает HTTP-клиент проверок"""
+        if self._client is not None:
+            return
+        # httpx нужен только проверке адресов - не импортируем его при старте сервиса
+        import httpx
+
+        from app.workers.probe_transport import PinnedTransport
+
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+            keepalive_expiry=30,
+        )
+        self._client = httpx.AsyncClient(
+            headers={"User-Agent": self.user_agent},
+            timeout=httpx.Timeout(self.timeout, pool=None),
+            transport=PinnedTransport(self._resolve, limits=limits),
+            follow_redirects=False,
+            # Прокси из окружения соединялся бы с хостом сам, в обход _resolve
+            trust_env=False,
+        )
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    def start(self) -> None:
+        if redis_client is None:
+            logger.warning("Проверка адресов ссылок требует Valkey и отключена")
+            return
+        self.open()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+probe_worker = ProbeWorker(
+    interval=settings.PROBE_INTERVAL,
+    min_interval=settings.PROBE_MIN_INTERVAL,
+    max_interval=settings.PROBE_MAX_INTERVAL,
+    retry_interval=settings.PROBE_RETRY_INTERVAL,
+    dead_after=settings.PROBE_DEAD_AFTER,
+    concurrency=settings.PROBE_CONCURRENCY,
+    per_host=settings.PROBE_PER_HOST,
+    timeout=settings.PROBE_TIMEOUT,
+    batch=settings.PROBE_BATCH,
+    discover_interval=settings.PROBE_DISCOVER_INTERVAL,
+    allow_private=settings.PROBE_ALLOW_PRIVATE,
+    user_agent=settings.PROBE_USER_AGENT,
+)
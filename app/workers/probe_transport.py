@@ -0,0 +1,57 @@
+"""
+Транспорт httpx для проверки адресов: соединение открывается только с адресом,
+который вернула и одобрила проверка ProbeWorker.
+
+Если проверить адрес хоста, а затем отдать URL httpx, тот разрешит имя еще раз,
+и DNS с коротким TTL успеет ответить внутренним адресом (DNS rebinding). Здесь
+имя разрешается один раз - при открытии соединения, - и сокет открывается
+с тем же адресом. URL запроса не меняется, поэтому Host, SNI и проверка
+сертификата идут по исходному имени, а keep-alive соединения в пуле привязаны
+к имени хоста и адресу, проверенному при их открытии.
+
+Модуль импортирует httpx и httpcore и загружается только при запуске проверки.
+"""
+from typing import Awaitable, Callable, Iterable, Optional
+
+import httpcore
+import httpx
+
+Resolver = Callable[[str], Awaitable[str]]
+
+
+class PinnedBackend(httpcore.AsyncNetworkBackend):
+    """Сетевой бэкенд httpcore, который подключается к адресу из resolve(host)"""
+
+    def __init__(self, resolve: Resolver):
+        self._resolve = resolve
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None,
+                          socket_options: Optional[Iterable] = None) -> httpcore.AsyncNetworkStream:
+        address = await self._resolve(host)
+        return await self._backend.connect_tcp(address, port, timeout=timeout, local_address=local_address,
+                                               socket_options=socket_options)
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None,
+                                  socket_options: Optional[Iterable] = None) -> httpcore.AsyncNetworkStream:
+        raise httpcore.ConnectError("unix sockets are not allowed")
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+class PinnedTransport(httpx.AsyncHTTPTransport):
+    """httpx.AsyncHTTPTransport, открывающий соединения через PinnedBackend"""
+
+    def __init__(self, resolve: Resolver, limits: httpx.Limits = httpx.Limits()):
+        super().__init__(limits=limits)
+        # AsyncHTTPTransport не принимает сетевой бэкенд - пул собирается заново
+        # с теми же параметрами
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            network_backend=PinnedBackend(resolve),
+        )
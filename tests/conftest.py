@@ -0,0 +1,75 @@
+"""
+Общие фикстуры тестов.
+
+Тесты запускаются без Postgres и Valkey: SQLite во временном каталоге и Valkey
+в памяти процесса (fakeredis, подставляется через app.db.redis.use_client),
+зависимости - `pip install -r requirements-dev.txt`. DATABASE_URL и REDIS_URL
+из окружения имеют приоритет, так что те же тесты можно прогнать на настоящих
+Postgres и Valkey:
+
+    DATABASE_URL=postgresql://... REDIS_URL=redis://... python -m pytest
+"""
+import os
+import tempfile
+
+# Настройки читаются при импорте app, поэтому окружение задается до него
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='url_cutter_tests_')}/tests.db")
+os.environ.setdefault("DATABASE_ECHO", "false")
+os.environ.setdefault("INIT_DB_ON_STARTUP", "true")
+os.environ.setdefault("BACKGROUND_WORKERS", "false")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("QR_CACHE_DIR", tempfile.mkdtemp(prefix="url_cutter_qr_"))
+
+import httpx
+import pytest
+from sqlalchemy import update
+
+from app.core.hotlinks import hot_links
+from app.db import base
+from app.db.redis import create_client, redis_client, use_client
+from app.main import app, lifespan
+from app.models.user import User
+
+use_client(create_client(os.getenv("REDIS_URL", "memory://tests")))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def client():
+    """Клиент приложения с чистыми БД и Valkey; фоновые задачи выключены"""
+    async with base.engine.begin() as conn:
+        await conn.run_sync(base.Base.metadata.drop_all)
+    await redis_client.flushdb()
+    hot_links.clear()
+    async with lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            yield client
+
+
+@pytest.fixture
+def register(client):
+    """Регистрирует пользователя и возвращает заголовки авторизации"""
+    async def register(username: str = "alice") -> dict:
+        response = await client.post("/auth/register", json={
+            "email": f"{username}@example.com", "username": username, "password": "secret1",
+        })
+        assert response.status_code == 201, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return register
+
+
+@pytest.fixture
+def superuser(register):
+    """Регистрирует администратора и возвращает заголовки авторизации"""
+    async def superuser(username: str = "admin") -> dict:
+        headers = await register(username)
+        async with base.async_session() as db:
+            await db.execute(update(User).where(User.username == username).values(is_superuser=True))
+            await db.commit()
+        return headers
+    return superuser
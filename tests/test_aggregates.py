@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app.db import base
+from app.models.link import Link
+from app.workers.aggregates import AggregatesWorker
+
+pytestmark = pytest.mark.anyio
+
+
+async def _update(short_code: str, **values) -> None:
+    async with base.async_session() as db:
+        await db.execute(update(Link).where(Link.short_code == short_code).values(**values))
+        await db.commit()
+
+
+async def test_refresh_stats(client, register, superuser):
+    owner = await register()
+    headers = await superuser()
+    assert (await client.get("/admin/stats/summary", headers=headers)).status_code == 503
+
+    codes = {}
+    for name, url, auth in [
+        ("first", "https://www.example.com/1", None),
+        ("second", "https://example.com:8443/2", None),
+        ("owned", "https://other.org/a", owner),
+        ("old", "https://other.org/b", owner),
+    ]:
+        response = await client.post("/links/shorten", json={"original_url": url}, headers=auth or {})
+        assert response.status_code in (200, 201), response.text
+        codes[name] = response.json()["short_code"]
+
+    now = datetime.now(timezone.utc)
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    await _update(codes["first"], clicks=5)
+    await _update(codes["owned"], clicks=7)
+    await _update(codes["second"], clicks=1, expires_at=now - timedelta(minutes=1))
+    await _update(codes["old"], created_at=now - timedelta(hours=3))
+
+    await AggregatesWorker(interval=60, hours=48, top=10).refresh()
+
+    response = await client.get("/admin/stats/summary", headers=headers)
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["refreshed_at"] is not None
+    assert {key: summary[key] for key in ("total", "active", "expired", "anonymous", "clicks")} == {
+        "total": 4, "active": 3, "expired": 1, "anonymous": 2, "clicks": 13,
+    }
+
+    response = await client.get("/admin/stats/created", params={"hours": 6}, headers=headers)
+    assert response.status_code == 200
+    assert [(datetime.fromisoformat(row["hour"]), row["created"]) for row in response.json()["hours"]] == [
+        (hour - timedelta(hours=3), 1), (hour, 3),
+    ]
+
+    response = await client.get("/admin/stats/top-links", params={"limit": 2}, headers=headers)
+    assert response.status_code == 200
+    assert [(row["short_code"], row["clicks"]) for row in response.json()["links"]] == [
+        (codes["owned"], 7), (codes["first"], 5),
+    ]
+
+    response = await client.get("/admin/stats/top-domains", headers=headers)
+    assert response.status_code == 200
+    # Хост без www. и порта
+    assert sorted(response.json()["domains"], key=lambda row: row["host"]) == [
+        {"host": "example.com", "links": 2, "clicks": 6},
+        {"host": "other.org", "links": 2, "clicks": 7},
+    ]
+
+    # Пересчет заменяет снимок целиком
+    await _update(codes["first"], clicks=10)
+    await AggregatesWorker(interval=60, hours=48, top=10).refresh()
+    response = await client.get("/admin/stats/top-links", params={"limit": 1}, headers=headers)
+    assert [(row["short_code"], row["clicks"]) for row in response.json()["links"]] == [(codes["first"], 10)]
+    assert (await client.get("/admin/stats/summary", headers=headers)).json()["clicks"] == 18
+
+
+async def test_stats_admin_only(client, register):
+    assert (await client.get("/admin/stats/summary", headers=await register())).status_code == 403
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.workers.clicks import click_buffer
+
+pytestmark = pytest.mark.anyio
+
+# Обычный прогон и нагрузочный (тысячи одновременных запросов): python -m pytest -m "not slow"
+# пропускает нагрузочные варианты
+SIZES = [50, pytest.param(2000, marks=pytest.mark.slow, id="2000")]
+
+
+async def _clicks(client, short_code: str) -> int:
+    return (await client.get(f"/links/{short_code}/stats")).json()["clicks"]
+
+
+@pytest.mark.parametrize("total", SIZES)
+async def test_concurrent_clicks_are_counted(client, total):
+    code = (await client.post("/links/shorten", json={"original_url": "https://example.com"})).json()["short_code"]
+
+    responses = await asyncio.gather(*(client.get(f"/{code}") for _ in range(total)))
+    assert {response.status_code for response in responses} == {307}
+    # Сверх порога горячей ссылки клики копятся в буфере
+    await click_buffer.flush()
+    assert await _clicks(client, code) == total
+
+
+@pytest.mark.parametrize("links", [10, pytest.param(200, marks=pytest.mark.slow, id="200")])
+async def test_concurrent_clicks_on_many_links(client, links):
+    codes = [
+        (await client.post("/links/shorten", json={"original_url": f"https://example.com/{i}"})).json()["short_code"]
+        for i in range(links)
+    ]
+    clicks = 10
+    responses = await asyncio.gather(*(client.get(f"/{code}") for code in codes for _ in range(clicks)))
+    assert {response.status_code for response in responses} == {307}
+    await click_buffer.flush()
+    assert [await _clicks(client, code) for code in codes] == [clicks] * links
+
+
+async def test_concurrent_clicks_on_hot_link(client):
+    # Больше порога горячей ссылки: часть кликов идет через буфер в памяти
+    total = settings.HOT_LINK_THRESHOLD * 2
+    code = (await client.post("/links/shorten", json={"original_url": "https://example.com"})).json()["short_code"]
+
+    responses = await asyncio.gather(*(client.get(f"/{code}") for _ in range(total)))
+    assert {response.status_code for response in responses} == {307}
+    await click_buffer.flush()
+    assert await _clicks(client, code) == total
+
+
+@pytest.mark.parametrize("total", [100, pytest.param(2000, marks=pytest.mark.slow, id="2000")])
+async def test_concurrent_creates_get_unique_codes(client, total):
+    responses = await asyncio.gather(*(
+        client.post("/links/shorten", json={"original_url": f"https://example.com/{i}"}) for i in range(total)
+    ))
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.json()["short_code"] for response in responses}) == total
+
+
+@pytest.mark.parametrize("total", [20, pytest.param(1000, marks=pytest.mark.slow, id="1000")])
+async def test_concurrent_same_alias(client, total):
+    body = {"original_url": "https://example.com", "custom_alias": "race"}
+    responses = await asyncio.gather(*(client.post("/links/shorten", json=body) for _ in range(total)))
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200] + [400] * (total - 1)
@@ -0,0 +1,130 @@
+import pytest
+from sqlalchemy import select
+
+from app.core import tenants
+from app.core.redirects import RESERVED_CODES
+from app.core.tenants import host_table
+from app.crud import link as link_crud
+from app.db import base
+from app.main import app
+from app.models.link import Link
+
+pytestmark = pytest.mark.anyio
+
+
+def test_every_route_prefix_is_reserved():
+    prefixes = {route.path.split("/")[1] for route in app.routes}
+    prefixes -= {"", "{short_code}"}
+    assert prefixes <= RESERVED_CODES
+
+
+async def test_list_domains_reaches_router(client, register):
+    headers = await register()
+    response = await client.get("/domains", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+
+
+@pytest.mark.parametrize("alias", ["domains", "auth", "admin", "edge", "links", "docs", "Domains"])
+async def test_reserved_alias_is_rejected(client, alias):
+    response = await client.post("/links/shorten", json={"original_url": "https://example.com", "custom_alias": alias})
+    assert response.status_code == 400
+    assert "зарезервирован" in response.json()["detail"]
+
+
+@pytest.fixture
+def txt_records(monkeypatch):
+    """TXT-записи DNS по имени вместо настоящих запросов"""
+    records = {}
+
+    async def lookup_txt(name):
+        return records.get(name, [])
+
+    monkeypatch.setattr(tenants, "lookup_txt", lookup_txt)
+    return records
+
+
+async def test_domain_is_inactive_until_verified(client, register, txt_records):
+    headers = await register()
+    response = await client.post("/domains", json={"host": "go.example.com"}, headers=headers)
+    assert response.status_code == 201, response.text
+    domain = response.json()
+    assert domain["verified_at"] is None
+    assert domain["verification_record"] == "_url-cutter.go.example.com"
+    assert host_table.resolve("go.example.com") is None
+
+    response = await client.post(f"/domains/{domain['id']}/verify", headers=headers)
+    assert response.status_code == 400
+    assert host_table.resolve("go.example.com") is None
+
+    txt_records["_url-cutter.go.example.com"] = ["other", domain["verification_token"]]
+    response = await client.post(f"/domains/{domain['id']}/verify", headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["verified_at"] is not None
+    assert host_table.resolve("go.example.com") == domain["id"]
+
+    response = await client.post(
+        "/links/shorten", json={"original_url": "https://example.com", "custom_alias": "tenant"},
+        headers={**headers, "Host": "go.example.com"},
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["short_url"] == "https://go.example.com/tenant"
+
+
+async def test_claim_does_not_block_real_owner(client, register, txt_records):
+    squatter = await register("mallory")
+    owner = await register("alice")
+    claim = (await client.post("/domains", json={"host": "go.example.com"}, headers=squatter)).json()
+
+    # Заявка без подтверждения не занимает хост
+    response = await client.post("/domains", json={"host": "go.example.com"}, headers=owner)
+    assert response.status_code == 201
+    domain = response.json()
+    txt_records["_url-cutter.go.example.com"] = [domain["verification_token"]]
+    assert (await client.post(f"/domains/{domain['id']}/verify", headers=owner)).status_code == 200
+
+    # Чужой токен не подходит, а сама заявка удалена при подтверждении
+    assert (await client.post(f"/domains/{claim['id']}/verify", headers=squatter)).status_code == 404
+    assert (await client.get("/domains", headers=squatter)).json() == []
+    response = await client.post("/domains", json={"host": "go.example.com"}, headers=squatter)
+    assert response.status_code == 400
+
+
+async def test_domain_with_links_is_not_deleted(client, register, txt_records):
+    headers = await register()
+    domain = (await client.post("/domains", json={"host": "go.example.com"}, headers=headers)).json()
+    async with base.async_session() as db:
+        db.add(Link(original_url="https://example.com", short_code="abc123", domain_id=domain["id"]))
+        await db.commit()
+
+    response = await client.delete(f"/domains/{domain['id']}", headers=headers)
+    assert response.status_code == 400
+    assert [item["id"] for item in (await client.get("/domains", headers=headers)).json()] == [domain["id"]]
+
+    async with base.async_session() as db:
+        await link_crud.remove_by_short_code(db, short_code="abc123", domain_id=domain["id"])
+    assert (await client.delete(f"/domains/{domain['id']}", headers=headers)).status_code == 204
+    assert (await client.get("/domains", headers=headers)).json() == []
+
+
+def test_short_code_keeps_plain_index():
+    # Запросы только по коду (истечение, админка, инструменты) без индекса читали бы всю таблицу
+    indexes = {index.name: index for index in Link.__table__.indexes}
+    assert [column.name for column in indexes["ix_link_short_code"].columns] == ["short_code"]
+    assert not indexes["ix_link_short_code"].unique
+
+
+async def test_bulk_clicks_keep_code_spaces_apart(client):
+    async with base.async_session() as db:
+        db.add_all([
+            Link(original_url="https://example.com/default", short_code="same"),
+            Link(original_url="https://example.com/custom", short_code="same", domain_id=5),
+            Link(original_url="https://example.com/other", short_code="other", domain_id=6),
+        ])
+        await db.commit()
+        await link_crud.add_clicks_bulk(db, {(None, "same"): 3, (5, "same"): 2, (5, "other"): 7})
+    async with base.async_session() as db:
+        rows = (await db.execute(select(Link.domain_id, Link.short_code, Link.clicks))).all()
+    assert sorted(rows, key=lambda row: (row.domain_id or 0, row.short_code)) == [
+        (None, "same", 3), (5, "same", 2), (6, "other", 0),
+    ]
@@ -0,0 +1,160 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.crud.link import LinkChange
+from app.db import base
+from app.db.edge_store import SQLiteLinkStore
+from app.main import app
+from app.models.link import Link
+from app.workers.edge_sync import EdgeSync
+from app.workers.outbox import OutboxRelay
+
+NOW = datetime.now(timezone.utc)
+
+
+def _change(code, url="https://example.com", domain_id=None, is_active=True, expires_at=None, redirect_type=307):
+    return LinkChange(1, domain_id, code, url, expires_at, is_active, NOW, redirect_type)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteLinkStore(str(tmp_path / "edge.db"))
+    store.open()
+    yield store
+    store.close()
+
+
+def test_apply_upserts_and_removes(store):
+    store.apply([
+        _change("abc", "https://example.com/a", redirect_type=308),
+        _change("abc", "https://example.com/custom", domain_id=5),
+        _change("off", is_active=False),
+        _change("old", expires_at=NOW - timedelta(seconds=1)),
+    ], domains=[(5, "go.example.com")], meta={"cursor": "1-0"})
+    target = store.lookup("abc")
+    assert (target.original_url, target.redirect_type) == ("https://example.com/a", 308)
+    assert store.lookup("abc", 5).original_url == "https://example.com/custom"
+    assert store.lookup("off") is None and store.lookup("old") is None
+    assert store.domains() == [(5, "go.example.com")]
+    assert store.get_meta("cursor") == "1-0"
+
+    # Деактивация удаляет ссылку из снимка, домены без domains= не меняются
+    store.apply([_change("abc", is_active=False)])
+    assert store.lookup("abc") is None and store.count() == 1
+    assert store.domains() == [(5, "go.example.com")]
+
+
+def test_lookup_hides_links_expired_after_apply(store):
+    store.apply([_change("soon", expires_at=NOW + timedelta(hours=1))])
+    assert store.lookup("soon").expires_at == NOW + timedelta(hours=1)
+    store._writer.execute("UPDATE links SET expires_at = ?", ((NOW - timedelta(seconds=1)).timestamp(),))
+    assert store.lookup("soon") is None
+
+
+def test_drop_stale_removes_links_missing_from_full_sync(store):
+    store.apply([_change("kept"), _change("gone")], generation=1)
+    store.apply([_change("kept")], generation=2)
+    assert store.drop_stale(2) == 1
+    assert store.lookup("kept") is not None and store.lookup("gone") is None
+
+
+def test_open_migrates_snapshot_without_redirect_type(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE links (
+            domain_id INTEGER NOT NULL, short_code TEXT NOT NULL, original_url TEXT NOT NULL,
+            expires_at REAL, changed_at TEXT NOT NULL, generation INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (domain_id, short_code)
+        ) WITHOUT ROWID;
+    """)
+    conn.execute("INSERT INTO links VALUES (0, 'abc', 'https://example.com', NULL, ?, 1)", (NOW.isoformat(),))
+    conn.commit()
+    conn.close()
+
+    store = SQLiteLinkStore(path)
+    store.open()
+    try:
+        assert store.lookup("abc").redirect_type == 307
+        store.apply([_change("new", redirect_type=301)])
+        assert store.lookup("new").redirect_type == 301
+    finally:
+        store.close()
+
+
+@pytest.fixture
+async def sync(client, store, monkeypatch):
+    """EdgeSync, который ходит в /edge этого же приложения"""
+    monkeypatch.setattr(settings, "EDGE_SYNC_SECRET", "edge-secret")
+    sync = EdgeSync(store, "http://testserver", "edge-secret", interval=0, batch=2, full_interval=3600)
+    sync._client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://testserver", headers={"X-Edge-Token": "edge-secret"},
+    )
+    yield sync
+    await sync._client.aclose()
+
+
+async def _shorten(client, headers, *codes):
+    for code in codes:
+        body = {"original_url": f"https://example.com/{code}", "custom_alias": code}
+        assert (await client.post("/links/shorten", json=body, headers=headers)).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_full_sync_then_follow_then_resync_on_expired_cursor(client, register, store, sync):
+    headers = await register()
+    await _shorten(client, headers, "edge1", "edge2", "edge3")
+    relay = OutboxRelay(interval=1, batch=100, retention_hours=1)
+    await relay.relay_once()
+
+    # Полная синхронизация постранично (batch=2)
+    await sync.sync_once()
+    assert store.count() == 3 and store.get_meta("generation") == "1"
+    assert store.lookup("edge1").original_url == "https://example.com/edge1"
+
+    # Дальше - лента изменений: обновление и удаление
+    await client.put("/links/edge1", json={"original_url": "https://example.com/new"}, headers=headers)
+    await client.delete("/links/edge2", headers=headers)
+    await relay.relay_once()
+    await sync.sync_once()
+    assert store.lookup("edge1").original_url == "https://example.com/new"
+    assert store.lookup("edge2") is None
+    assert store.get_meta("generation") == "1"
+
+    # Ссылка исчезла без события (например, восстановление БД), а курсор устарел
+    async with base.async_session() as db:
+        await db.execute(delete(Link).where(Link.short_code == "edge3"))
+        await db.commit()
+    await _shorten(client, headers, "edge4")
+    await relay.relay_once()
+    store.apply([], meta={"cursor": "1-0"})
+    await sync.sync_once()
+    assert store.lookup("edge4") is None
+    # 410 - следующий шаг перечитывает снимок целиком с новым поколением
+    await sync.sync_once()
+    assert store.get_meta("generation") == "2"
+    assert store.lookup("edge3") is None
+    assert store.lookup("edge4").original_url == "https://example.com/edge4"
+    assert store.count() == 2
+
+
+@pytest.mark.anyio
+async def test_upload_clicks(client, sync):
+    await client.post("/links/shorten", json={"original_url": "https://example.com", "custom_alias": "clicked"})
+    for _ in range(3):
+        sync.add_click("clicked")
+    await sync.upload_clicks()
+    assert sync._clicks == {}
+    assert (await client.get("/links/clicked/stats")).json()["clicks"] == 3
+
+
+@pytest.mark.anyio
+async def test_edge_routes_require_token_and_positive_clicks(client, sync):
+    assert (await client.get("/edge/links/delta")).status_code == 403
+    response = await sync._client.post("/edge/links/clicks", json={"clicks": [[None, "clicked", 0]]})
+    assert response.status_code == 422
@@ -0,0 +1,160 @@
+import argparse
+import gzip
+import io
+import re
+
+import pytest
+
+from app.core.tenants import host_table
+from app.crud import link as link_crud
+from app.tools import import_edge_logs
+from app.tools.import_edge_logs import (
+    DEFAULT_FIELDS, Stats, count_hits, read_ndjson, read_regex, read_w3c, run_import,
+)
+
+W3C_LOG = """#Version: 1.0
+#Fields: date time cs-uri-stem sc-status x-edge-result-type x-host-header
+2026-10-19\t10:00:00\t/abc123\t301\tHit\tshort.example
+2026-10-19\t10:00:01\t/abc123\t301\tMiss\tshort.example
+2026-10-19\t10:00:02\t/abc123\t200\tHit\tshort.example
+2026-10-19\t10:00:03\t/xyz\t308\tHit\tgo.example.org
+2026-10-19\t10:00:04\t/broken
+"""
+
+
+def _count(records):
+    stats = Stats()
+    return count_hits(records, stats), stats
+
+
+def test_read_w3c_maps_columns_from_fields_header():
+    records = list(read_w3c(io.StringIO(W3C_LOG), DEFAULT_FIELDS["w3c"]))
+    assert records[0] == ("/abc123", "301", "Hit", "short.example")
+    assert records[3] == ("/xyz", "308", "Hit", "go.example.org")
+    # Короткая строка - недостающие поля None
+    assert records[4] == ("/broken", None, None, None)
+
+
+def test_read_ndjson_stringifies_values_and_skips_garbage():
+    log = io.StringIO(
+        '{"ClientRequestPath": "/abc", "EdgeResponseStatus": 308, "CacheCacheStatus": "hit"}\n'
+        "\n"
+        "not json\n"
+    )
+    assert list(read_ndjson(log, DEFAULT_FIELDS["ndjson"])) == [
+        ("/abc", "308", "hit", None),
+        (None, None, None, None),
+    ]
+
+
+def test_read_regex_uses_named_groups():
+    pattern = re.compile(r'(?P<host>\S+) "GET (?P<path>\S+)[^"]*" (?P<status>\d+) (?P<cache>\S+)')
+    log = io.StringIO('short.example "GET /abc?x=1 HTTP/1.1" 301 HIT\nsomething else\n')
+    assert list(read_regex(log, pattern)) == [
+        ("/abc?x=1", "301", "HIT", "short.example"),
+        (None, None, None, None),
+    ]
+
+
+def test_count_hits_counts_only_cached_redirects(monkeypatch):
+    monkeypatch.setattr(host_table, "hosts", {b"go.example.org": 7})
+    clicks, stats = _count(read_w3c(io.StringIO(W3C_LOG), DEFAULT_FIELDS["w3c"]))
+    # Промах CDN уже учтен сервисом, 200 - не редирект
+    assert clicks == {(None, "abc123"): 1, (7, "xyz"): 1}
+    assert stats.lines == 5
+
+
+def test_count_hits_normalizes_paths_and_hosts(monkeypatch):
+    monkeypatch.setattr(host_table, "hosts", {b"go.example.org": 7})
+    records = [
+        ("/abc?utm=1", "301", " HIT ", None),
+        ("/%61bc", "308", "hit", "unknown.example"),
+        ("/xyz", "307", "hit", "GO.example.org:443"),
+        ("/a/b", "301", "hit", None),
+        ("/", "301", "hit", None),
+        (None, "301", "hit", None),
+        ("/abc", None, "hit", None),
+    ]
+    clicks, stats = _count(records)
+    assert clicks == {(None, "abc"): 2, (7, "xyz"): 1}
+    assert stats.lines == len(records)
+
+
+def _import_args(*paths):
+    return argparse.Namespace(
+        paths=[str(path) for path in paths], format="w3c", fields=DEFAULT_FIELDS["w3c"],
+        pattern=None, force=False, dry_run=False,
+    )
+
+
+async def _shorten(client, *codes):
+    for code in codes:
+        response = await client.post("/links/shorten", json={
+            "original_url": f"https://example.com/{code}", "custom_alias": code, "redirect_type": 308,
+        })
+        assert response.status_code == 200, response.text
+
+
+async def _clicks(client, code):
+    response = await client.get(f"/links/{code}/stats")
+    assert response.status_code == 200, response.text
+    return response.json()["clicks"]
+
+
+def _hits_log(*codes):
+    lines = "".join(f"2026-10-19\t10:00:00\t/{code}\t308\tHit\tshort.example\n" for code in codes)
+    return "#Fields: date time cs-uri-stem sc-status x-edge-result-type x-host-header\n" + lines
+
+
+@pytest.mark.anyio
+async def test_run_import_adds_clicks_once(client, tmp_path, capsys):
+    await _shorten(client, "abc123")
+    path = tmp_path / "E2ABC.2026-10-19-10.gz"
+    with gzip.open(path, "wt") as file:
+        file.write(W3C_LOG + "2026-10-19\t10:00:05\t/abc123\t308\tRefreshHit\tshort.example\n"
+                             "2026-10-19\t10:00:06\t/abc123\t308\tHit\tshort.example\n")
+    args = _import_args(path)
+    await run_import(args)
+    # Повторный запуск на том же файле его пропускает
+    await run_import(args)
+    assert "пропущено как обработанные 1" in capsys.readouterr().out
+    assert await _clicks(client, "abc123") == 2
+
+
+@pytest.mark.anyio
+async def test_rotated_log_with_same_name_and_size_is_imported(client, tmp_path):
+    await _shorten(client, "aaa111", "bbb222")
+    path = tmp_path / "access.log"
+    path.write_text(_hits_log("aaa111"))
+    await run_import(_import_args(path))
+    # После ротации - тот же путь и размер, но другие строки
+    path.write_text(_hits_log("bbb222"))
+    await run_import(_import_args(path))
+    assert await _clicks(client, "aaa111") == 1
+    assert await _clicks(client, "bbb222") == 1
+
+
+@pytest.mark.anyio
+async def test_rerun_after_crash_resumes_from_next_batch(client, tmp_path, monkeypatch):
+    codes = ["ccc001", "ccc002", "ccc003"]
+    await _shorten(client, *codes)
+    path = tmp_path / "E2ABC.2026-10-19-11"
+    path.write_text(_hits_log(*codes, *codes))
+    monkeypatch.setattr(import_edge_logs, "_APPLY_BATCH", 1)
+
+    add_clicks_bulk = link_crud.add_clicks_bulk
+    applied = []
+
+    async def crash_on_third_batch(db, clicks):
+        if len(applied) == 2:
+            raise RuntimeError("сбой")
+        applied.append(clicks)
+        await add_clicks_bulk(db, clicks)
+
+    monkeypatch.setattr(link_crud, "add_clicks_bulk", crash_on_third_batch)
+    with pytest.raises(RuntimeError):
+        await run_import(_import_args(path))
+    monkeypatch.setattr(link_crud, "add_clicks_bulk", add_clicks_bulk)
+    await run_import(_import_args(path))
+
+    assert [await _clicks(client, code) for code in codes] == [2, 2, 2]
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app.core.config import settings
+from app.db import base
+from app.models.link import Link, LinkArchive
+from app.workers.expiry import expiry_worker
+
+pytestmark = pytest.mark.anyio
+
+
+async def _expire_now(short_code: str) -> None:
+    async with base.async_session() as db:
+        await db.execute(
+            update(Link).where(Link.short_code == short_code)
+            .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        await db.commit()
+
+
+async def _count(model, short_code: str) -> int:
+    async with base.async_session() as db:
+        return (await db.execute(select(func.count()).select_from(model).where(model.short_code == short_code))).scalar()
+
+
+async def test_sweep_deactivates_expired(client):
+    code = (await client.post("/links/shorten", json={"original_url": "https://example.com"})).json()["short_code"]
+    await _expire_now(code)
+    await expiry_worker.sweep()
+    assert (await client.get(f"/{code}")).status_code == 404
+    assert await _count(Link, code) == 1
+    assert await _count(LinkArchive, code) == 0
+
+
+async def test_sweep_archives_expired(client, monkeypatch):
+    monkeypatch.setattr(settings, "LINK_ARCHIVE_EXPIRED", True)
+    expired = (await client.post("/links/shorten", json={"original_url": "https://example.com/1"})).json()["short_code"]
+    alive = (await client.post("/links/shorten", json={"original_url": "https://example.com/2"})).json()["short_code"]
+    await _expire_now(expired)
+    await expiry_worker.sweep()
+
+    assert await _count(Link, expired) == 0
+    assert await _count(LinkArchive, expired) == 1
+    assert await _count(Link, alive) == 1
+    assert (await client.get(f"/{expired}")).status_code == 404
+    assert (await client.get(f"/{alive}")).status_code == 307
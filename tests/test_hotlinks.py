@@ -0,0 +1,58 @@
+import random
+from collections import Counter
+
+from app.core.hotlinks import HotLinkTracker, SpaceSaving
+from app.core.redirects import Redirect
+
+
+def test_exact_counts_below_capacity():
+    sketch = SpaceSaving(10)
+    for item in "abacabad":
+        sketch.offer(item)
+    assert sketch.top(3) == [("a", 4, 0), ("b", 2, 0), ("c", 1, 0)]
+
+
+def test_new_item_replaces_minimum():
+    sketch = SpaceSaving(2)
+    for item in "aaab":
+        sketch.offer(item)
+    # "c" вытесняет "b" (счетчик 1) и наследует его значение как ошибку
+    assert sketch.offer("c") == 1
+    assert "b" not in sketch
+    assert sketch.top(2) == [("a", 3, 0), ("c", 2, 1)]
+
+
+def test_bounds_on_long_tail_stream():
+    rng = random.Random(1)
+    stream = [f"hot{i}" for i in range(5) for _ in range(2000)]
+    stream += [f"tail{rng.randrange(100_000)}" for _ in range(50_000)]
+    rng.shuffle(stream)
+    sketch = SpaceSaving(50)
+    for item in stream:
+        sketch.offer(item)
+
+    truth = Counter(stream)
+    assert len(sketch) == 50
+    for item, count, error in sketch.top(50):
+        assert count - error <= truth[item] <= count
+    # Элементы чаще N/capacity гарантированно отслеживаются
+    assert {f"hot{i}" for i in range(5)} <= {item for item, _, _ in sketch.top(5)}
+
+
+def test_decay_halves_and_forgets():
+    sketch = SpaceSaving(10)
+    for item in "aaaaabbc":
+        sketch.offer(item)
+    sketch.decay()
+    assert sketch.top(10) == [("a", 2, 0), ("b", 1, 0)]
+    assert "c" not in sketch
+    sketch.offer("b")
+    assert sketch.count("b") == 2
+
+
+def test_tracker_marks_hot_after_threshold():
+    tracker = HotLinkTracker(capacity=10, threshold=3, window=60, pin_ttl=30)
+    assert [tracker.record("code") for _ in range(4)] == [False, False, True, True]
+    tracker.pin("code", Redirect("https://example.com", 307, None))
+    assert tracker.get_pinned("code").url == "https://example.com"
+    assert tracker.get_pinned("code", domain_id=1) is None
@@ -0,0 +1,121 @@
+import csv
+import io
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db import base
+from app.models.link_event import LinkEvent
+from app.tools.import_links import Target, read_records, validate_batch
+
+EXPIRES = datetime(2027, 1, 1, tzinfo=timezone.utc)
+
+
+def _validate(records):
+    rejects = io.StringIO()
+    rows = validate_batch(records, EXPIRES, csv.writer(rejects))
+    return rows, [row[:3] for row in csv.reader(io.StringIO(rejects.getvalue()))]
+
+
+def test_read_records_csv_numbers_lines_after_header():
+    stream = io.StringIO("short_code,original_url,clicks\nabc,https://example.com,5\nxyz,https://example.org,\n")
+    assert list(read_records(stream, "csv")) == [
+        (2, {"short_code": "abc", "original_url": "https://example.com", "clicks": "5"}),
+        (3, {"short_code": "xyz", "original_url": "https://example.org", "clicks": ""}),
+    ]
+
+
+def test_read_records_ndjson_skips_blank_and_keeps_garbage_as_empty():
+    stream = io.StringIO('{"short_code": "abc", "clicks": 3}\n\nnot json\n')
+    assert list(read_records(stream, "ndjson")) == [(1, {"short_code": "abc", "clicks": 3}), (3, {})]
+
+
+def test_validate_rejects_bad_codes_and_urls():
+    rows, rejects = _validate([
+        (2, {"short_code": "ok_code-1", "original_url": "https://example.com/a"}),
+        # Не обслуживаются быстрыми редиректами
+        (3, {"short_code": "a.b", "original_url": "https://example.com"}),
+        (4, {"short_code": "a~b", "original_url": "https://example.com"}),
+        (5, {"short_code": "x" * 51, "original_url": "https://example.com"}),
+        (6, {"short_code": "Docs", "original_url": "https://example.com"}),
+        (7, {"short_code": "noscheme", "original_url": "example.com"}),
+        (8, {"short_code": "ftp", "original_url": "ftp://example.com"}),
+        (9, {"original_url": "https://example.com"}),
+    ])
+    assert list(rows) == ["ok_code-1"]
+    assert rejects == [
+        ["3", "short_code", "a.b"], ["4", "short_code", "a~b"], ["5", "short_code", "x" * 51],
+        ["6", "short_code", "Docs"], ["7", "original_url", "noscheme"], ["8", "original_url", "ftp"],
+        ["9", "short_code", ""],
+    ]
+
+
+def test_validate_keeps_first_of_duplicates():
+    rows, rejects = _validate([
+        (1, {"short_code": "dup", "original_url": "https://example.com/first"}),
+        (2, {"short_code": "dup", "original_url": "https://example.com/second"}),
+    ])
+    assert rows["dup"][1] == "https://example.com/first"
+    assert rejects == [["2", "duplicate", "dup"]]
+
+
+def test_validate_parses_times_and_clicks():
+    rows, rejects = _validate([
+        (1, {"short_code": "unix", "original_url": "https://example.com", "created_at": "1760832000",
+             "clicks": "7", "expires_at": 1792368000}),
+        (2, {"short_code": "iso", "original_url": "https://example.com", "created_at": "2026-10-19T10:00:00"}),
+        (3, {"short_code": "neg", "original_url": "https://example.com", "clicks": "-1"}),
+        (4, {"short_code": "nan", "original_url": "https://example.com", "clicks": "many"}),
+        (5, {"short_code": "date", "original_url": "https://example.com", "created_at": "yesterday"}),
+    ])
+    code, url, created_at, clicks, expires_at, redirect_type = rows["unix"]
+    assert created_at == datetime(2025, 10, 19, tzinfo=timezone.utc)
+    assert expires_at == datetime(2026, 10, 19, tzinfo=timezone.utc)
+    assert clicks == 7
+    # Время без пояса - UTC, без expires_at - срок по умолчанию, без clicks - 0
+    assert rows["iso"][2:5] == (datetime(2026, 10, 19, 10, tzinfo=timezone.utc), 0, EXPIRES)
+    assert rejects == [["3", "clicks", "neg"], ["4", "value", "nan"], ["5", "value", "date"]]
+
+
+def test_validate_redirect_type(monkeypatch):
+    monkeypatch.setattr(settings, "REDIRECT_DEFAULT_TYPE", 308)
+    rows, rejects = _validate([
+        (1, {"short_code": "default", "original_url": "https://example.com"}),
+        (2, {"short_code": "own", "original_url": "https://example.com", "redirect_type": "302"}),
+        (3, {"short_code": "bad", "original_url": "https://example.com", "redirect_type": 200}),
+        (4, {"short_code": "word", "original_url": "https://example.com", "redirect_type": "temporary"}),
+    ])
+    # Без redirect_type - тип по умолчанию, как у ссылок из API
+    assert rows["default"][5] == 308
+    assert rows["own"][5] == 302
+    assert rejects == [["3", "redirect_type", "bad"], ["4", "value", "word"]]
+
+
+@pytest.mark.anyio
+async def test_load_sets_redirect_type(client, monkeypatch):
+    if base.engine.dialect.name != "postgresql":
+        pytest.skip("импорт через COPY поддерживается только для PostgreSQL")
+    monkeypatch.setattr(settings, "REDIRECT_DEFAULT_TYPE", 301)
+    rows, _ = _validate([
+        (1, {"short_code": "imported", "original_url": "https://example.com/imported"}),
+        (2, {"short_code": "found", "original_url": "https://example.com/found", "redirect_type": "302"}),
+    ])
+    target = Target(base.engine)
+    await target.open()
+    try:
+        assert await target.load(list(rows.values()), None, None, events=True) == 2
+    finally:
+        await target.close()
+
+    response = await client.get("/imported")
+    assert (response.status_code, response.headers["location"]) == (301, "https://example.com/imported")
+    assert (await client.get("/found")).status_code == 302
+    async with base.async_session() as db:
+        events = (await db.execute(select(LinkEvent.short_code, LinkEvent.redirect_type))).all()
+    assert sorted(events) == [("found", 302), ("imported", 301)]
+
+
+def test_validate_without_rejects_writer():
+    assert validate_batch([(1, {"short_code": "a.b", "original_url": "https://example.com"})], None, None) == {}
@@ -0,0 +1,32 @@
+import pytest
+
+from app.tools.importtime import DEFAULT_BUDGET_MS, LAZY_MODULES, measure, warm_up
+
+# Запас на шум измерения: время импорта на одной и той же машине колеблется на 10-20%
+BUDGET_MARGIN = 1.25
+
+
+@pytest.fixture(scope="module")
+def import_profile():
+    # Импорт как на сервисе: без подмен тестов (memory:// тянул бы fakeredis)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        for name in ("DATABASE_URL", "REDIS_URL", "QR_CACHE_DIR"):
+            monkeypatch.delenv(name, raising=False)
+        warm_up("app.main")
+        # Лучший из пяти запусков: меньше всего зависит от нагрузки на машину
+        return min((measure("app.main") for _ in range(5)), key=lambda profile: profile[0])
+
+
+def test_lazy_modules_not_imported_at_startup(import_profile):
+    _, _, modules = import_profile
+    loaded = sorted({name for name in modules if name.split(".")[0] in LAZY_MODULES})
+    assert loaded == []
+
+
+# Бюджет задан для инстанса сервиса, а не для общей машины с параллельной нагрузкой:
+# тест запускается отдельно, на таком же железе - python -m pytest -m importtime
+@pytest.mark.slow
+@pytest.mark.importtime
+def test_import_time_within_budget(import_profile):
+    total_us, _, _ = import_profile
+    assert total_us / 1000 <= DEFAULT_BUDGET_MS * BUDGET_MARGIN
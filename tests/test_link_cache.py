@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from app.db import base, link_cache
+from app.db.redis import redis_client
+from app.models.link import Link
+from app.workers.expiry import expiry_worker
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_store_keeps_newer_version(client):
+    assert await link_cache.store("cas", "https://example.com/new", 200)
+    # Редирект, прочитавший строку до обновления, не перезаписывает новую версию
+    assert not await link_cache.store("cas", "https://example.com/old", 100)
+    assert (await link_cache.get("cas")).url == "https://example.com/new"
+
+
+async def test_invalidate_blocks_older_store(client):
+    assert await link_cache.store("cas", "https://example.com/old", 100)
+    await link_cache.invalidate("cas", 200)
+    assert await link_cache.get("cas") is None
+    assert not await link_cache.store("cas", "https://example.com/old", 150)
+    assert await link_cache.get("cas") is None
+    assert await link_cache.store("cas", "https://example.com/new", 300)
+    assert (await link_cache.get("cas")).url == "https://example.com/new"
+
+
+async def test_store_carries_redirect_type_and_domain(client):
+    await link_cache.store("typed", "https://example.com", 1, domain_id=7, redirect_type=308)
+    redirect = await link_cache.get("typed", 7)
+    assert (redirect.url, redirect.status) == ("https://example.com", 308)
+    assert await link_cache.get("typed") is None
+
+
+async def test_equal_version_does_not_beat_tombstone(client):
+    # updated_at на SQLite - с точностью до миллисекунды: чтение до изменения может дать ту же версию
+    await link_cache.invalidate("same", 100)
+    assert not await link_cache.store("same", "https://example.com/old", 100)
+    assert await link_cache.get("same") is None
+
+
+async def test_expiry_tombstone_uses_row_version(client):
+    code = (await client.post("/links/shorten", json={"original_url": "https://example.com"})).json()["short_code"]
+    assert (await client.get(f"/{code}")).status_code == 307
+    assert await link_cache.get(code) is not None
+
+    async with base.async_session() as db:
+        await db.execute(
+            update(Link).where(Link.short_code == code).values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        await db.commit()
+    await expiry_worker.sweep()
+
+    async with base.async_session() as db:
+        updated_at = (await db.execute(select(Link.updated_at).where(Link.short_code == code))).scalar_one()
+    assert int(await redis_client.hget(link_cache.key(code), "v")) == link_cache.version_of(updated_at)
+    assert (await client.get(f"/{code}")).status_code == 404
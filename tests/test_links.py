@@ -0,0 +1,138 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_shorten_and_redirect(client):
+    response = await client.post("/links/shorten", json={"original_url": "https://example.com/page"})
+    assert response.status_code == 200, response.text
+    link = response.json()
+    assert link["original_url"] == "https://example.com/page"
+    assert len(link["short_code"]) == 6
+
+    response = await client.get(f"/{link['short_code']}")
+    assert response.status_code == 307
+    assert response.headers["location"] == "https://example.com/page"
+
+    response = await client.get(f"/links/{link['short_code']}/stats")
+    assert response.json()["clicks"] == 1
+
+
+async def test_redirect_unknown_code(client):
+    response = await client.get("/nosuchcode")
+    assert response.status_code == 404
+
+
+async def test_custom_alias_is_unique(client):
+    body = {"original_url": "https://example.com/a", "custom_alias": "mylink"}
+    assert (await client.post("/links/shorten", json=body)).status_code == 200
+    response = await client.post("/links/shorten", json=body)
+    assert response.status_code == 400
+
+
+async def test_update_changes_redirect(client, register):
+    headers = await register()
+    response = await client.post(
+        "/links/shorten", json={"original_url": "https://example.com/old", "custom_alias": "upd"}, headers=headers
+    )
+    assert response.status_code == 200
+    # Первый переход кладет старый URL в кэш редиректов
+    assert (await client.get("/upd")).headers["location"] == "https://example.com/old"
+
+    response = await client.put("/links/upd", json={"original_url": "https://example.com/new"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["original_url"] == "https://example.com/new"
+    assert (await client.get("/upd")).headers["location"] == "https://example.com/new"
+
+
+async def test_update_requires_owner(client, register):
+    owner = await register("alice")
+    other = await register("bob")
+    await client.post("/links/shorten", json={"original_url": "https://example.com", "custom_alias": "own"}, headers=owner)
+
+    response = await client.put("/links/own", json={"original_url": "https://evil.example"}, headers=other)
+    assert response.status_code == 403
+    assert (await client.put("/links/missing", json={"original_url": "https://x.example"}, headers=owner)).status_code == 404
+
+
+async def test_delete(client, register):
+    headers = await register()
+    await client.post("/links/shorten", json={"original_url": "https://example.com", "custom_alias": "gone"}, headers=headers)
+    assert (await client.get("/gone")).status_code == 307
+
+    response = await client.delete("/links/gone", headers=headers)
+    assert response.status_code == 204
+    assert (await client.get("/gone")).status_code == 404
+    assert (await client.get("/links/gone")).status_code == 404
+
+
+async def _shorten_all(client, urls):
+    for url in urls:
+        response = await client.post("/links/shorten", json={"original_url": url})
+        assert response.status_code == 200, response.text
+
+
+async def _search(client, **params):
+    response = await client.get("/links/search", params=params)
+    assert response.status_code == 200, response.text
+    return sorted(link["original_url"] for link in response.json())
+
+
+async def test_search_modes(client):
+    await _shorten_all(client, [
+        "https://example.com/docs/intro",
+        "https://example.com/blog?page=2",
+        "http://other.org/example.com/docs",
+    ])
+    assert await _search(client, original_url="https://example.com/docs/intro") == ["https://example.com/docs/intro"]
+    assert await _search(client, q="HTTPS://EXAMPLE.COM/", mode="prefix") == [
+        "https://example.com/blog?page=2", "https://example.com/docs/intro",
+    ]
+    assert await _search(client, q="/docs", mode="substring") == [
+        "http://other.org/example.com/docs", "https://example.com/docs/intro",
+    ]
+    # Подстрока короче 3 символов отклоняется, без параметров - тоже
+    assert (await client.get("/links/search", params={"q": "ex", "mode": "substring"})).status_code == 400
+    assert (await client.get("/links/search")).status_code == 400
+
+
+async def test_search_by_domain_matches_host_only(client):
+    await _shorten_all(client, [
+        "https://example.com",
+        "http://www.Example.com:8080/a",
+        "https://example.com?x=1",
+        "https://example.com#top",
+        "https://example.com.evil.org/phish",
+        "https://notexample.com/",
+        "https://evil.org/https://example.com/",
+        "https://ex_ample.com/",
+        "https://exXample.com/",
+    ])
+    assert await _search(client, q="https://www.example.com/path", mode="domain") == [
+        "http://www.Example.com:8080/a",
+        "https://example.com",
+        "https://example.com#top",
+        "https://example.com?x=1",
+    ]
+    # "_" в домене - обычный символ, а не шаблон LIKE
+    assert await _search(client, q="ex_ample.com", mode="domain") == ["https://ex_ample.com/"]
+    assert await _search(client, q="exXample.com", mode="domain") == ["https://exXample.com/"]
+
+
+async def test_search_pages_with_next_cursor(client):
+    urls = [f"https://example.com/page/{i}" for i in range(5)]
+    await _shorten_all(client, urls)
+    seen, cursor, pages = [], 0, 0
+    while True:
+        response = await client.get("/links/search", params={
+            "q": "example.com/page", "mode": "substring", "limit": 2, "cursor": cursor,
+        })
+        assert response.status_code == 200
+        seen += [link["original_url"] for link in response.json()]
+        pages += 1
+        if "X-Next-Cursor" not in response.headers:
+            break
+        cursor = int(response.headers["X-Next-Cursor"])
+    assert seen == urls
+    # 2 + 2 + 1: на последней, неполной странице курсора нет
+    assert pages == 3
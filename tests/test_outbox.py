@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.db import base, outbox
+from app.db.redis import redis_client
+from app.models.link_event import LinkEvent
+from app.workers.outbox import OutboxRelay
+
+pytestmark = pytest.mark.anyio
+
+
+def _relay() -> OutboxRelay:
+    return OutboxRelay(interval=1, batch=100, retention_hours=1)
+
+
+async def _events():
+    async with base.async_session() as db:
+        return (await db.execute(select(LinkEvent).order_by(LinkEvent.id))).scalars().all()
+
+
+async def _change_link(client, register) -> str:
+    headers = await register()
+    body = {"original_url": "https://example.com/a", "custom_alias": "outbox"}
+    assert (await client.post("/links/shorten", json=body, headers=headers)).status_code == 200
+    response = await client.put("/links/outbox", json={"original_url": "https://example.com/b"}, headers=headers)
+    assert response.status_code == 200
+    assert (await client.delete("/links/outbox", headers=headers)).status_code == 204
+    return "outbox"
+
+
+def test_published_at_has_only_partial_index():
+    names = {index.name for index in LinkEvent.__table__.indexes}
+    assert names == {"ix_link_event_unpublished"}
+
+
+async def test_changes_write_events_in_transaction(client, register):
+    await _change_link(client, register)
+    events = await _events()
+    assert [(event.op, event.short_code) for event in events] == [
+        ("create", "outbox"), ("update", "outbox"), ("delete", "outbox"),
+    ]
+    assert events[1].original_url == "https://example.com/b"
+    assert all(event.published_at is None for event in events)
+
+
+async def test_relay_publishes_and_marks_events(client, register):
+    await _change_link(client, register)
+    relay = _relay()
+    assert await relay.relay_once() == 3
+    assert all(event.published_at is not None for event in await _events())
+
+    events, cursor = await outbox.read(outbox.START)
+    assert [event["op"] for event in events] == ["create", "update", "delete"]
+    assert events[1]["original_url"] == "https://example.com/b" and events[0]["shard"] == 0
+    # Опубликованное второй раз не уходит
+    assert await relay.relay_once() == 0
+    assert (await outbox.read(cursor))[0] == []
+
+
+async def test_failed_publish_leaves_events_pending(client, register, monkeypatch):
+    await _change_link(client, register)
+    relay = _relay()
+
+    async def broken(events, shard=0):
+        raise ConnectionError("valkey is down")
+
+    monkeypatch.setattr(outbox, "publish", broken)
+    with pytest.raises(ConnectionError):
+        await relay.relay_once()
+    assert all(event.published_at is None for event in await _events())
+    assert await redis_client.xlen(settings.OUTBOX_STREAM) == 0
+
+    monkeypatch.undo()
+    assert await relay.relay_once() == 3
+    assert len((await outbox.read(outbox.START))[0]) == 3
+
+
+async def test_only_lease_holder_relays(client):
+    first, second = _relay(), _relay()
+    assert await first._hold_lease()
+    assert not await second._hold_lease()
+    # Держатель аренды продлевает ее
+    assert await first._hold_lease()
+
+
+async def test_prune_removes_old_published_events(client, register):
+    await _change_link(client, register)
+    relay = _relay()
+    await relay.relay_once()
+    async with base.async_session() as db:
+        old = datetime.now(timezone.utc) - timedelta(hours=2)
+        await db.execute(update(LinkEvent).where(LinkEvent.op == "create").values(published_at=old))
+        await db.commit()
+    await relay.prune()
+    assert [event.op for event in await _events()] == ["update", "delete"]
+
+
+async def test_change_feed_endpoint(client, register, superuser):
+    admin = await superuser()
+    await _change_link(client, register)
+    await _relay().relay_once()
+
+    response = await client.get("/links/changes", params={"since": outbox.START}, headers=admin)
+    assert response.status_code == 200
+    body = response.json()
+    assert [event["op"] for event in body["events"]] == ["create", "update", "delete"]
+    response = await client.get("/links/changes", params={"since": body["cursor"]}, headers=admin)
+    assert response.json() == {"events": [], "cursor": body["cursor"]}
+
+    assert (await client.get("/links/changes", params={"since": "bad"}, headers=admin)).status_code == 400
+    user = await register("bob")
+    assert (await client.get("/links/changes", headers=user)).status_code == 403
+
+
+async def test_change_feed_reports_expired_cursor(client, register, superuser):
+    admin = await superuser()
+    await _change_link(client, register)
+    await _relay().relay_once()
+    first_id = (await redis_client.xrange(settings.OUTBOX_STREAM, count=1))[0][0]
+    # Поток обрезан: события после курсора первой записи вытеснены
+    await redis_client.xtrim(settings.OUTBOX_STREAM, maxlen=1, approximate=False)
+    response = await client.get("/links/changes", params={"since": first_id}, headers=admin)
+    assert response.status_code == 410
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from app.db import base
+from app.models.link import Link, archive_partition_ddl
+from app.tools.partition_links import lookup_query, new_table_indexes
+
+
+def test_new_table_gets_every_model_index():
+    ddl = new_table_indexes()
+    for index in Link.__table__.indexes:
+        assert any(f" {index.name}_new ON link_new " in statement for statement in ddl), index.name
+
+
+def test_new_table_indexes_keep_dialect_options():
+    ddl = "\n".join(new_table_indexes())
+    assert "ix_link_original_url_trgm_new ON link_new USING gin (original_url gin_trgm_ops)" in ddl
+    assert "ix_link_expires_at_new ON link_new (expires_at) WHERE is_active" in ddl
+    assert "UNIQUE INDEX uq_link_default_short_code_new ON link_new (short_code) WHERE domain_id IS NULL" in ddl
+
+
+def test_archive_partition_month_in_utc():
+    # 02:00 1 ноября в UTC+5 - еще октябрь по UTC
+    ddl = archive_partition_ddl(datetime(2026, 11, 1, 2, tzinfo=timezone(timedelta(hours=5))))
+    assert ddl == (
+        "CREATE TABLE IF NOT EXISTS link_archive_2026_10 PARTITION OF link_archive "
+        "FOR VALUES FROM ('2026-10-01 00:00+00') TO ('2026-11-01 00:00+00')"
+    )
+
+
+def test_bench_lookup_uses_redirect_predicates():
+    default_sql, default_params = lookup_query("link_old", None)
+    domain_sql, domain_params = lookup_query("link", 7)
+    assert "domain_id IS NULL" in default_sql and default_params == {}
+    assert "domain_id = :domain" in domain_sql and domain_params == {"domain": 7}
+    for sql in (default_sql, domain_sql):
+        assert "DISTINCT" not in sql and "is_active" in sql
+
+
+@pytest.mark.anyio
+async def test_bench_lookup_finds_link_in_its_code_space(client):
+    async with base.async_session() as db:
+        db.add_all([
+            Link(original_url="https://example.com/default", short_code="bench"),
+            Link(original_url="https://example.com/custom", short_code="bench", domain_id=3),
+        ])
+        await db.commit()
+        for domain_id, url in ((None, "https://example.com/default"), (3, "https://example.com/custom")):
+            sql, params = lookup_query("link", domain_id)
+            rows = (await db.execute(text(sql), {"code": "bench", **params})).all()
+            assert [row[0] for row in rows] == [url]
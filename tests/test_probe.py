@@ -0,0 +1,164 @@
+"""
+Проверка адресов ссылок (ProbeWorker.probe) против локального HTTP-сервера.
+
+Имена хостов *.test в DNS не существуют: их адреса подставляет _lookup, так что
+успешный запрос к такому имени значит, что соединение открыто с адресом из
+проверки, а не с повторно разрешенным именем.
+"""
+import asyncio
+from typing import Dict, List
+
+import pytest
+
+from app.workers import probe
+from app.workers.probe import ProbeWorker
+
+pytestmark = pytest.mark.anyio
+
+
+class StubServer:
+    """HTTP/1.1 сервер на 127.0.0.1: отвечает по таблице путь -> (статус, заголовки, тело)"""
+
+    def __init__(self, routes: Dict[str, tuple]):
+        self.routes = routes
+        self.requests: List[tuple] = []
+        self.port = 0
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *lines = head.decode().split("\r\n")
+                path = request_line.split()[1]
+                headers = dict(line.split(": ", 1) for line in lines if line)
+                self.requests.append((path, headers.get("Host")))
+                status, extra, body = self.routes.get(path, (404, {}, b""))
+                response = [f"HTTP/1.1 {status} X", f"Content-Length: {len(body)}"]
+                response += [f"{name}: {value}" for name, value in extra.items()]
+                writer.write(("\r\n".join(response) + "\r\n\r\n").encode() + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def __aenter__(self) -> "StubServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+
+def make_worker(allow_private: bool) -> ProbeWorker:
+    worker = ProbeWorker(
+        interval=60, min_interval=1, max_interval=600, retry_interval=5, dead_after=3, concurrency=4,
+        per_host=2, timeout=5, batch=10, discover_interval=60, allow_private=allow_private, user_agent="test",
+    )
+    worker.open()
+    return worker
+
+
+class Answers(dict):
+    """Ответы DNS: имя -> список ответов по очереди (последний повторяется)"""
+
+    def __init__(self):
+        super().__init__()
+        self.lookups: List[str] = []
+
+
+@pytest.fixture
+def hosts(monkeypatch):
+    """Подменяет разрешение имен проверки; имена без ответов считаются адресами"""
+    answers = Answers()
+
+    async def lookup(self, host: str) -> List[str]:
+        answers.lookups.append(host)
+        if host not in answers:
+            return [host]
+        queue = answers[host]
+        return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    monkeypatch.setattr(ProbeWorker, "_lookup", lookup)
+    # 127.0.0.1 (stub-сервер) считается публичным, остальная 127/8 - внутренней
+    monkeypatch.setattr(probe, "is_public", lambda address: address == "127.0.0.1")
+    return answers
+
+
+async def test_probe_reads_title_over_pinned_address(hosts):
+    hosts["site.test"] = [["127.0.0.1"]]
+    routes = {"/": (200, {"Content-Type": "text/html"}, b"<html><title> Hello &amp; bye </title></html>")}
+    async with StubServer(routes) as server:
+        worker = make_worker(allow_private=False)
+        try:
+            result = await worker.probe(f"http://site.test:{server.port}/")
+        finally:
+            await worker.stop()
+    assert result["error"] == ""
+    assert result["status"] == 200 and result["ok"] == "1"
+    assert result["title"] == "Hello & bye"
+    # Запрос ушел на проверенный адрес с исходным именем в Host
+    assert server.requests == [("/", f"site.test:{server.port}")]
+
+
+async def test_probe_blocks_private_address(hosts):
+    async with StubServer({"/": (200, {}, b"secret")}) as server:
+        worker = make_worker(allow_private=False)
+        try:
+            result = await worker.probe(f"http://127.0.0.2:{server.port}/")
+            hosts["mixed.test"] = [["127.0.0.1", "10.0.0.1"]]
+            mixed = await worker.probe(f"http://mixed.test:{server.port}/")
+        finally:
+            await worker.stop()
+    assert result["error"] == "blocked address" and result["ok"] == "0"
+    # Имя с публичным и внутренним адресом тоже блокируется
+    assert mixed["error"] == "blocked address"
+    assert server.requests == []
+
+
+async def test_probe_connects_to_checked_address_on_rebinding(hosts):
+    # Первое разрешение имени - публичный адрес, все следующие - внутренний
+    hosts["rebind.test"] = [["127.0.0.1"], ["127.0.0.2"]]
+    async with StubServer({"/": (200, {}, b"ok")}) as server:
+        worker = make_worker(allow_private=False)
+        try:
+            result = await worker.probe(f"http://rebind.test:{server.port}/")
+        finally:
+            await worker.stop()
+    assert result["error"] == "" and result["status"] == 200
+    # Имя разрешено один раз, и соединение открыто именно с этим адресом
+    assert hosts.lookups == ["rebind.test"]
+    assert server.requests == [("/", f"rebind.test:{server.port}")]
+
+
+async def test_probe_rechecks_redirect_target(hosts):
+    hosts["site.test"] = [["127.0.0.1"]]
+    hosts["internal.test"] = [["127.0.0.2"]]
+    async with StubServer({}) as server:
+        server.routes.update({
+            "/start": (302, {"Location": "/next"}, b""),
+            "/next": (302, {"Location": f"http://internal.test:{server.port}/admin"}, b""),
+        })
+        worker = make_worker(allow_private=False)
+        try:
+            result = await worker.probe(f"http://site.test:{server.port}/start")
+        finally:
+            await worker.stop()
+    assert result["error"] == "blocked address"
+    assert result["final_url"] == f"http://internal.test:{server.port}/admin"
+    assert [path for path, _ in server.requests] == ["/start", "/next"]
+    # Хост редиректа проверен при открытии соединения к нему
+    assert hosts.lookups[-1] == "internal.test"
+
+
+async def test_probe_allow_private():
+    async with StubServer({"/": (204, {}, b"")}) as server:
+        worker = make_worker(allow_private=True)
+        try:
+            result = await worker.probe(f"http://127.0.0.1:{server.port}/")
+        finally:
+            await worker.stop()
+    assert result["error"] == "" and result["status"] == 204
@@ -0,0 +1,170 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from app.api.routes import admin
+from app.core import profiling
+from app.core.profiling import (
+    Capture, ProfileStore, ProfilingMiddleware, StackSampler, folded, instrument_valkey,
+)
+from app.db import base
+from app.db.redis import ValkeyClient, create_client
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_valkey_commands_captured_after_swap():
+    client = ValkeyClient(create_client("memory://profiling-first"))
+    client.instrument(instrument_valkey)
+    # Клиент, подставленный после install, замеряется так же
+    client.client = create_client("memory://profiling-second")
+    script = client.register_script("return redis.call('INCR', KEYS[1])")
+
+    capture = Capture(time.perf_counter())
+    token = profiling._capture.set(capture)
+    try:
+        await client.set("key", "value")
+        assert await client.get("key") == "value"
+        assert await script(keys=["counter"]) == 1
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.get("key")
+            pipe.incr("counter")
+            assert await pipe.execute() == ["value", 2]
+    finally:
+        profiling._capture.reset(token)
+
+    commands = [event["commands"] for event in capture.valkey]
+    # Скрипт на новом клиенте: EVALSHA, загрузка после NOSCRIPT и повтор
+    assert commands[:2] == [["SET key"], ["GET key"]]
+    assert [command[0].split()[0] for command in commands[2:-1]] == ["EVALSHA", "SCRIPT", "EVALSHA"]
+    assert commands[-1] == ["GET key", "INCRBY counter"]
+    assert capture.valkey_count == 6
+
+    # Вне профилируемого запроса команды не замеряются
+    await client.get("key")
+    assert capture.valkey_count == len(commands)
+
+
+@pytest.fixture
+def sql_events():
+    # Замеры SQL подключаются install() только при PROFILING_ENABLED
+    event.listen(Engine, "before_cursor_execute", profiling._before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", profiling._after_cursor_execute)
+    yield
+    event.remove(Engine, "before_cursor_execute", profiling._before_cursor_execute)
+    event.remove(Engine, "after_cursor_execute", profiling._after_cursor_execute)
+
+
+@pytest.fixture
+async def profiled(tmp_path, sql_events):
+    """Middleware над приложением с одним SQL-запросом и одной командой Valkey"""
+    valkey = ValkeyClient(create_client("memory://profiling-app"))
+    valkey.instrument(instrument_valkey)
+
+    async def app(scope, receive, send):
+        async with base.async_session() as db:
+            await db.execute(text("SELECT 1"))
+        await valkey.get("key")
+        await asyncio.sleep(0.02)
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    sampler = StackSampler(1)
+    middleware = ProfilingMiddleware(app, sampler=sampler, store=ProfileStore(str(tmp_path), 3))
+    sampler.start()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware),
+                                     base_url="http://testserver") as client:
+            async def request(path: str = "/slow") -> None:
+                response = await client.post(path)
+                assert response.status_code == 201
+                await asyncio.gather(*middleware._pending)
+            yield middleware, request
+    finally:
+        sampler.stop()
+
+
+async def test_sampled_request_saved(profiled):
+    middleware, request = profiled
+    middleware.sample_rate = 1
+    middleware.slow_seconds = 0
+    await request("/sampled")
+
+    [summary] = middleware.store.recent(10)
+    assert summary["reason"] == "sample"
+    assert (summary["method"], summary["path"], summary["status"]) == ("POST", "/sampled", 201)
+    assert summary["duration_ms"] >= 20
+    assert summary["sql_count"] >= 1
+    assert summary["valkey_count"] == 1
+    assert "sql" not in summary and "stacks" not in summary
+
+    profile = middleware.store.load(summary["id"])
+    assert any(event["statement"] == "SELECT 1" for event in profile["sql"])
+    assert profile["valkey"][0]["commands"] == ["GET key"]
+    assert profile["stack_samples"] == sum(profile["stacks"].values())
+
+
+async def test_slow_request_saved(profiled):
+    middleware, request = profiled
+    middleware.sample_rate = 0
+    middleware.slow_seconds = 60
+    await request()
+    assert middleware.store.recent(10) == []
+
+    middleware.slow_seconds = 0.01
+    await request()
+    [summary] = middleware.store.recent(10)
+    assert summary["reason"] == "slow"
+    assert summary["path"] == "/slow"
+
+
+async def test_profiles_rotated(profiled):
+    middleware, request = profiled
+    middleware.sample_rate = 1
+    for number in range(5):
+        await request(f"/{number}")
+
+    # Хранятся последние max_files профилей, новые первыми
+    assert [summary["path"] for summary in middleware.store.recent(10)] == ["/4", "/3", "/2"]
+    assert [summary["path"] for summary in middleware.store.recent(2)] == ["/4", "/3"]
+
+
+def test_profile_store_load(tmp_path):
+    store = ProfileStore(str(tmp_path), 10)
+    store.save({"id": "1-ab", "stacks": {"main;handler": 2, "main": 1}})
+    assert store.load("1-ab")["stacks"] == {"main;handler": 2, "main": 1}
+    assert store.load("2-ab") is None
+    # Идентификатор не превращается в путь вне каталога
+    assert store.load("../1-ab") is None
+    assert folded(store.load("1-ab")) == "main;handler 2\nmain 1\n"
+
+
+async def test_admin_profiles(client, register, superuser, tmp_path, monkeypatch):
+    store = ProfileStore(str(tmp_path), 10)
+    monkeypatch.setattr(admin, "profile_store", store)
+    store.save({"id": "1-aa", "path": "/a", "sql": [], "valkey": [], "stacks": {"main;a": 3}})
+    store.save({"id": "2-bb", "path": "/b", "sql": [], "valkey": [], "stacks": {"main;b": 1}})
+
+    response = await client.get("/admin/profiles", headers=await register())
+    assert response.status_code == 403
+
+    headers = await superuser()
+    response = await client.get("/admin/profiles", params={"limit": 1}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["profiles"] == [{"id": "2-bb", "path": "/b"}]
+
+    response = await client.get("/admin/profiles/1-aa", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["stacks"] == {"main;a": 3}
+
+    response = await client.get("/admin/profiles/1-aa/folded", headers=headers)
+    assert response.status_code == 200
+    assert response.text == "main;a 3\n"
+
+    for profile_id in ("3-cc", "x"):
+        response = await client.get(f"/admin/profiles/{profile_id}", headers=headers)
+        assert response.status_code == 404
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from app.core import qr, rate_limit
+from app.core.config import settings
+from app.core.rate_limit import Rate
+
+pytestmark = pytest.mark.anyio
+
+
+async def _shorten(client) -> str:
+    response = await client.post("/links/shorten", json={"original_url": "https://example.com/qr"})
+    assert response.status_code == 200, response.text
+    return response.json()["short_code"]
+
+
+async def test_qr_renders_and_revalidates(client):
+    code = await _shorten(client)
+    response = await client.get(f"/links/{code}/qr.png", params={"scale": 4, "border": 0})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content.startswith(b"\x89PNG")
+    etag = response.headers["etag"]
+    response = await client.get(f"/links/{code}/qr.png", params={"scale": 4, "border": 0},
+                                headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert (await client.get("/links/missing/qr.svg")).status_code == 404
+
+
+async def test_qr_accepts_only_fixed_parameters(client):
+    code = await _shorten(client)
+    for params in ({"scale": 5}, {"scale": 40}, {"border": 10}, {"border": 1}):
+        response = await client.get(f"/links/{code}/qr.svg", params=params)
+        assert response.status_code == 422, params
+
+
+async def test_qr_is_rate_limited(client, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setitem(rate_limit.RULES, "qr", (Rate.parse("2/minute"), Rate.parse("2/minute")))
+    code = await _shorten(client)
+    statuses = [(await client.get(f"/links/{code}/qr.svg")).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def _put(cache: qr.QRCache, key: str, size: int, mtime: float) -> str:
+    path = cache._path(key, "png")
+    cache._write_file(path, b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_disk_cache_evicts_least_recently_read(tmp_path):
+    cache = qr.QRCache(str(tmp_path), memory_bytes=0, workers=1, disk_bytes=1000)
+    paths = [_put(cache, f"{i:02d}key", 300, 1000 + i) for i in range(4)]
+    # Чтение освежает картинку: она вытесняется последней
+    assert cache._read_file(paths[0]) == b"x" * 300
+    # 1200 байт при пределе 1000: удаляется до 90% предела
+    assert cache._prune() == 1
+    assert [os.path.exists(path) for path in paths] == [True, False, True, True]
+    # В пределах бюджета ничего не удаляется
+    assert cache._prune() == 0
+
+
+async def test_disk_cache_prunes_after_writes(tmp_path):
+    cache = qr.QRCache(str(tmp_path), memory_bytes=0, workers=1, disk_bytes=1000)
+    for i in range(3):
+        _put(cache, f"{i:02d}old", 300, 1000 + i)
+    # Первая запись процесса пересчитывает каталог и удаляет самые старые файлы
+    path = cache._path("99new", "png")
+    await cache._store(path, b"y" * 300)
+    assert os.path.exists(path)
+    sizes = sum(entry.stat().st_size for sub in os.scandir(tmp_path) for entry in os.scandir(sub.path))
+    assert sizes <= 900
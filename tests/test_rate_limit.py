@@ -0,0 +1,86 @@
+import pytest
+
+from app.core import rate_limit
+from app.core.config import settings
+from app.core.rate_limit import Rate, RateLimiter, client_ip
+from app.db.redis import redis_client
+
+
+def _scope(*forwarded: str, peer: str = "10.0.0.1") -> dict:
+    return {
+        "client": (peer, 12345),
+        "headers": [(b"x-forwarded-for", value.encode("latin-1")) for value in forwarded],
+    }
+
+
+def test_client_ip_ignores_forwarded_without_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 0)
+    assert client_ip(_scope("1.2.3.4")) == "10.0.0.1"
+
+
+def test_client_ip_takes_address_added_by_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    # Клиент подставил свои значения, прокси дописал настоящий адрес в конец
+    assert client_ip(_scope("6.6.6.6, 7.7.7.7, 1.2.3.4")) == "1.2.3.4"
+    assert client_ip(_scope("6.6.6.6", "1.2.3.4")) == "1.2.3.4"
+
+
+def test_client_ip_with_several_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_TRUSTED_PROXIES", 2)
+    assert client_ip(_scope("6.6.6.6, 1.2.3.4, 172.16.0.5")) == "1.2.3.4"
+    # Заголовок короче цепочки прокси - запрос пришел не через нее
+    assert client_ip(_scope("1.2.3.4")) == "10.0.0.1"
+
+
+def test_redirects_are_not_limited_by_default():
+    assert rate_limit.RULES["redirect"] == (None, None)
+
+
+@pytest.mark.anyio
+async def test_limiter_rejects_over_limit(client):
+    limiter = RateLimiter(redis_client, batch=1)
+    rate = Rate.parse("3/minute")
+    results = [await limiter.hit("rl:test", rate) for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert 0 < results[-1][1] <= 60
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("algorithm", ["sliding_window", "token_bucket"])
+async def test_sparse_traffic_is_charged_per_request(client, monkeypatch, algorithm):
+    # Запрос раз в 7 секунд при лимите 100/минуту: аренда на 10 разрешений живет 6 секунд,
+    # и каждая истекает почти целиком неизрасходованной
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    limiter = RateLimiter(redis_client, algorithm=algorithm, batch=10)
+    rate = Rate.parse("100/minute")
+    results = []
+    for _ in range(30):
+        results.append(await limiter.hit("rl:sparse", rate))
+        clock.now += 7
+    assert all(allowed for allowed, _ in results)
+    if algorithm == "sliding_window":
+        # В окне - 29 запросов и аренда последнего
+        assert await redis_client.zcard("rl:sparse") == 30 - 1 + 10
+
+
+@pytest.mark.anyio
+async def test_dense_traffic_still_hits_limit(client, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    limiter = RateLimiter(redis_client, batch=10)
+    rate = Rate.parse("100/minute")
+    results = []
+    for _ in range(120):
+        results.append((await limiter.hit("rl:dense", rate))[0])
+        clock.now += 0.1
+    assert results[:100] == [True] * 100
+    assert not any(results[100:])
@@ -0,0 +1,77 @@
+"""RedirectMiddleware отдельно от приложения: хранилище ссылок и приложение за ним подменены"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+import pytest
+from starlette.responses import PlainTextResponse
+
+from app.api.redirect import RedirectMiddleware
+from app.crud.link import RedirectTarget
+
+pytestmark = pytest.mark.anyio
+
+
+class Store:
+    def __init__(self, links: Dict[str, RedirectTarget]):
+        self.links = links
+        self.lookups: List[str] = []
+
+    async def get_redirect_target(self, short_code: str, domain_id: Optional[int] = None):
+        self.lookups.append(short_code)
+        return self.links.get(short_code)
+
+
+@pytest.fixture
+def store():
+    changed_at = datetime(2026, 10, 19, tzinfo=timezone.utc)
+    return Store({
+        "abc123": RedirectTarget("https://example.com/page", changed_at, None),
+        "space": RedirectTarget("https://example.com/a b?q=привет", changed_at, None, 302),
+    })
+
+
+@pytest.fixture
+async def middleware_client(client, store):
+    """Клиент к middleware (client - чистый Valkey); все, что оно пропускает, отвечает 'router'"""
+    middleware = RedirectMiddleware(PlainTextResponse("router"), store=store)
+    transport = httpx.ASGITransport(app=middleware)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as http:
+        yield http
+
+
+async def test_miss_reads_store_once_then_serves_from_cache(middleware_client, store):
+    for _ in range(3):
+        response = await middleware_client.get("/abc123")
+        assert response.status_code == 307
+        assert response.headers["location"] == "https://example.com/page"
+        assert response.headers["cache-control"] == "no-store"
+        assert response.content == b""
+    assert store.lookups == ["abc123"]
+
+
+async def test_location_is_escaped(middleware_client):
+    response = await middleware_client.get("/space")
+    assert response.status_code == 302
+    assert response.headers["location"] == "https://example.com/a%20b?q=%D0%BF%D1%80%D0%B8%D0%B2%D0%B5%D1%82"
+
+
+async def test_unknown_code_is_answered_by_middleware(middleware_client, store):
+    response = await middleware_client.get("/nosuch")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Ссылка не найдена или срок ее действия истек"}
+    assert store.lookups == ["nosuch"]
+
+
+@pytest.mark.parametrize("method, path", [
+    ("GET", "/docs"),
+    ("GET", "/Docs"),
+    ("GET", "/links/abc123"),
+    ("GET", "/a.b"),
+    ("GET", "/" + "a" * 51),
+    ("POST", "/abc123"),
+])
+async def test_other_requests_reach_router(middleware_client, store, method, path):
+    response = await middleware_client.request(method, path)
+    assert response.status_code == 200 and response.text == "router"
+    assert store.lookups == []
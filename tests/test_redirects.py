@@ -0,0 +1,57 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.core.redirects import cache_control
+
+
+@pytest.fixture
+def max_age(monkeypatch):
+    monkeypatch.setattr(settings, "REDIRECT_PERMANENT_MAX_AGE", 3600)
+    return 3600
+
+
+def test_temporary_redirects_are_not_cached(max_age):
+    assert cache_control(302) == "no-store"
+    assert cache_control(307, time.time() + 86400) == "no-store"
+
+
+def test_permanent_redirects_are_cached(max_age):
+    assert cache_control(301) == f"public, max-age={max_age}"
+    assert cache_control(308) == f"public, max-age={max_age}"
+
+
+def test_permanent_max_age_is_clamped_to_expiry(max_age):
+    header = cache_control(308, time.time() + 600)
+    seconds = int(header.rsplit("=", 1)[1])
+    assert header.startswith("public, max-age=") and 598 <= seconds <= 600
+    # Срок ссылки дальше предела - действует REDIRECT_PERMANENT_MAX_AGE
+    assert cache_control(301, time.time() + 10 * max_age) == f"public, max-age={max_age}"
+
+
+def test_expired_permanent_redirect_is_not_cached(max_age):
+    assert cache_control(301, time.time() - 5) == "no-store"
+    assert cache_control(308, time.time() + 0.5) == "no-store"
+
+
+@pytest.mark.anyio
+async def test_redirect_responses_carry_cache_control(client, max_age):
+    expires_at = (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat()
+    links = {}
+    for redirect_type, extra in ((307, {}), (308, {}), (301, {"expires_at": expires_at})):
+        response = await client.post("/links/shorten", json={
+            "original_url": f"https://example.com/{redirect_type}", "redirect_type": redirect_type, **extra,
+        })
+        assert response.status_code == 200, response.text
+        links[redirect_type] = response.json()["short_code"]
+
+    response = await client.get(f"/{links[307]}")
+    assert response.status_code == 307 and response.headers["cache-control"] == "no-store"
+    response = await client.get(f"/{links[308]}")
+    assert response.status_code == 308
+    assert response.headers["cache-control"] == f"public, max-age={max_age}"
+    response = await client.get(f"/{links[301]}")
+    assert response.status_code == 301
+    assert 0 < int(response.headers["cache-control"].rsplit("=", 1)[1]) <= 600
@@ -0,0 +1,30 @@
+import pytest
+
+from app.db import redis
+from app.db.redis import ValkeyClient, create_client
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_use_client_swaps_commands_and_scripts():
+    first, second = create_client("memory://swap-first"), create_client("memory://swap-second")
+    client = ValkeyClient(first)
+    script = client.register_script("return redis.call('INCR', KEYS[1])")
+    assert await script(keys=["counter"]) == 1
+    await client.set("key", "first")
+
+    client.client = second
+    # Скрипт, зарегистрированный до подмены, выполняется уже на новом клиенте
+    assert await script(keys=["counter"]) == 1
+    assert await client.get("key") is None
+    assert await first.get("counter") == "1" and await second.get("counter") == "1"
+
+
+async def test_get_redis_yields_none_once(monkeypatch):
+    monkeypatch.setattr(redis, "redis_client", None)
+    dependency = redis.get_redis()
+    assert await dependency.__anext__() is None
+    with pytest.raises(StopAsyncIteration):
+        await dependency.__anext__()
+    with pytest.raises(RuntimeError):
+        redis.use_client(create_client("memory://"))
@@ -0,0 +1,63 @@
+import pytest
+
+from app.db import link_cache, response_cache
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("path", ["/links/etag", "/links/etag/stats"])
+async def test_etag_answers_not_modified(client, path):
+    await client.post("/links/shorten", json={"original_url": "https://example.com", "custom_alias": "etag"})
+    response = await client.get(path)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    # Второй ответ - из кэша, с тем же ETag
+    response = await client.get(path, headers={"If-None-Match": f'W/"other", {etag}'})
+    assert response.status_code == 304 and response.content == b""
+    assert response.headers["etag"] == etag
+    assert (await client.get(path, headers={"If-None-Match": '"other"'})).status_code == 200
+
+
+async def test_update_and_delete_drop_cached_responses(client, register):
+    headers = await register()
+    await client.post(
+        "/links/shorten", json={"original_url": "https://example.com/old", "custom_alias": "cached"}, headers=headers
+    )
+    old = await client.get("/links/cached", headers=headers)
+    assert old.json()["original_url"] == "https://example.com/old"
+    assert (await client.get("/links/cached/stats", headers=headers)).status_code == 200
+
+    await client.put("/links/cached", json={"original_url": "https://example.com/new"}, headers=headers)
+    response = await client.get("/links/cached", headers={**headers, "If-None-Match": old.headers["etag"]})
+    assert response.status_code == 200
+    assert response.json()["original_url"] == "https://example.com/new"
+
+    assert (await client.delete("/links/cached", headers=headers)).status_code == 204
+    assert (await client.get("/links/cached", headers=headers)).status_code == 404
+    assert (await client.get("/links/cached/stats", headers=headers)).status_code == 404
+
+
+async def test_store_before_invalidate_is_rejected(client):
+    assert await response_cache.store("race", "info", "anon", '"a"', "old", 100)
+    # Промах, прочитавший строку до изменения, пишет ответ уже после инвалидации
+    await link_cache.invalidate("race", 200)
+    assert await response_cache.get("race", "info", "anon") is None
+    assert not await response_cache.store("race", "info", "anon", '"a"', "old", 150)
+    assert not await response_cache.store("race", "info", "anon", '"a"', "old", 200)
+    assert await response_cache.get("race", "info", "anon") is None
+
+    assert await response_cache.store("race", "info", "anon", '"b"', "new", 300)
+    assert await response_cache.store("race", "stats", "anon", '"c"', "stats", 300)
+    assert await response_cache.get("race", "info", "anon") == ('"b"', "new")
+    # Более старая версия не заменяет ответы новой
+    assert not await response_cache.store("race", "info", "7", '"d"', "stale", 250)
+
+
+async def test_newer_version_replaces_all_responses(client):
+    assert await response_cache.store("bump", "info", "anon", '"a"', "v1", 100)
+    assert await response_cache.store("bump", "stats", "anon", '"b"', "v1", 100)
+    assert await response_cache.store("bump", "info", "anon", '"c"', "v2", 200)
+    assert await response_cache.get("bump", "info", "anon") == ('"c"', "v2")
+    assert await response_cache.get("bump", "stats", "anon") is None
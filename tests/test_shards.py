@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import select
+
+from app.crud import link as link_crud
+from app.db import base, shards
+from app.models.link import Link
+from app.schemas.link import LinkCreate
+
+CODES = [f"code{i:02d}" for i in range(20)]
+
+
+def test_jump_hash_moves_keys_only_to_the_new_bucket():
+    keys = range(0, 2 ** 64, 2 ** 64 // 2000)
+    moved = 0
+    for key in keys:
+        before, after = shards.jump_hash(key, 4), shards.jump_hash(key, 5)
+        assert 0 <= before < 4
+        assert after in (before, 4)
+        moved += after != before
+    # Переезжает около 1/5 ключей
+    assert 0.15 < moved / len(keys) < 0.25
+    assert {shards.jump_hash(key, 1) for key in keys} == {0}
+
+
+def test_shard_for_is_deterministic(monkeypatch):
+    monkeypatch.setattr(shards, "session_factories", [None, None])
+    placement = [shards.shard_for(code) for code in CODES]
+    # Размещение зависит только от кода: иначе после перезапуска ссылки "потерялись" бы
+    assert placement == [shards.shard_for(code) for code in CODES]
+    assert set(placement) == {0, 1}
+    assert shards.group_by_shard(CODES, lambda code: code) == {
+        shard_id: [code for code, placed in zip(CODES, placement) if placed == shard_id] for shard_id in (0, 1)
+    }
+
+
+@pytest.fixture
+async def two_shards(tmp_path, monkeypatch):
+    """Два шарда ссылок на SQLite вместо SHARD_DATABASE_URLS"""
+    engines = [base.create_engine(f"sqlite:///{tmp_path}/shard{i}.db") for i in range(2)]
+    monkeypatch.setattr(shards, "SHARDED", True)
+    monkeypatch.setattr(shards, "engines", engines)
+    monkeypatch.setattr(shards, "session_factories", [
+        shards.sessionmaker(engine, class_=base.LazyAsyncSession, expire_on_commit=False) for engine in engines
+    ])
+    await shards.create_tables()
+    yield engines
+    await shards.dispose()
+
+
+async def _codes_in(engine):
+    async with engine.connect() as conn:
+        return set((await conn.execute(select(Link.short_code))).scalars())
+
+
+@pytest.mark.anyio
+async def test_links_are_placed_and_found_by_code(two_shards):
+    async with base.async_session() as db:
+        for code in CODES:
+            await link_crud.create(db, obj_in=LinkCreate(original_url=f"https://example.com/{code}"), custom_short_code=code)
+
+        for shard_id, engine in enumerate(two_shards):
+            assert await _codes_in(engine) == {code for code in CODES if shards.shard_for(code) == shard_id}
+        record = await link_crud.get_record_by_short_code(db, short_code="code07")
+        assert record.original_url == "https://example.com/code07"
+        # Подсчет - во всех шардах
+        assert await link_crud.count_links(db) == len(CODES)
+
+        assert await link_crud.remove_by_short_code(db, short_code="code07") is not None
+        assert await link_crud.get_record_by_short_code(db, short_code="code07") is None
+        assert await link_crud.count_links(db) == len(CODES) - 1
+
+
+@pytest.mark.anyio
+async def test_fan_out_runs_in_each_or_selected_shard(two_shards):
+    async def database(db):
+        return str((await db.connection()).engine.url)
+
+    async with base.async_session() as db:
+        urls = await shards.fan_out(db, database)
+        assert urls == [str(engine.url) for engine in two_shards]
+        assert await shards.fan_out(db, database, [1]) == [str(two_shards[1].url)]
+        assert await shards.per_shard(db, lambda session, shard_id: _shard_id(shard_id)) == [0, 1]
+
+
+async def _shard_id(shard_id):
+    return shard_id